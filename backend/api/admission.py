@@ -0,0 +1,223 @@
+"""Admission control for processing routes.
+
+The scheduler queues work without bound. A burst of requests therefore
+piles up in memory, and latency grows until clients give up. Admission
+control caps, per processing route:
+
+    depth   admitted requests not yet finished (queued + running)
+            ADMISSION_<ROUTE>_MAX_DEPTH, default 32
+    work    depth x the route's estimated service time (moving average
+            of observed ones, excluding scheduler queue wait), in seconds
+            ADMISSION_<ROUTE>_MAX_WORK_SECONDS, default 0 = no limit
+
+<ROUTE> is the route name upper-cased with dashes as underscores, e.g.
+ADMISSION_POTRACE_COLOR_MAX_DEPTH. Excess requests are rejected at once
+with 429 and a Retry-After computed from the route's recent drain rate.
+Depths and rates are reported by stats() for autoscaling.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.api.scheduler import request_queue_wait, send_error
+
+load_dotenv()
+
+# Synchronous processing routes guarded by AdmissionMiddleware: (method,
+# path prefix, route name). Job submissions are admitted by the jobs
+# route itself, as they finish long after the response.
+GUARDED_ROUTES = (
+    ("POST", "/api/background/process", "background"),
+    ("POST", "/api/svg/convert", "silhouette"),
+    ("POST", "/api/color-svg/", "color-svg"),
+    ("POST", "/api/potrace-color/convert", "potrace-color"),
+    ("POST", "/api/compare", "compare"),
+    ("POST", "/api/pipeline/run", "pipeline"),
+)
+ROUTES = tuple(name for _, _, name in GUARDED_ROUTES) + ("jobs",)
+
+# Completions within this many seconds count towards the drain rate.
+DRAIN_WINDOW_SECONDS = 60.0
+# Weight of the newest observation in the service time moving average.
+SERVICE_TIME_ALPHA = 0.2
+MAX_RETRY_AFTER_SECONDS = 600
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, route: str, reason: str, retry_after: int):
+        super().__init__(f"{route} is at capacity ({reason}); retry in {retry_after}s")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request. Release exactly once, when its work is done."""
+
+    def __init__(self, route: "_RouteState"):
+        self._route = route
+        self._start = time.perf_counter()
+        self._released = False
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        """service_seconds: time actually spent working, if known; defaults
+        to the time since admission."""
+        if not self._released:
+            self._released = True
+            if service_seconds is None:
+                service_seconds = time.perf_counter() - self._start
+            self._route.finish(service_seconds)
+
+    def cancel(self) -> None:
+        """Release without recording a completion (the work never ran)."""
+        if not self._released:
+            self._released = True
+            self._route.finish(None)
+
+
+class _RouteState:
+    def __init__(self, name: str, max_depth: int, max_work_seconds: float):
+        self.name = name
+        self.max_depth = max(1, max_depth)
+        self.max_work_seconds = max_work_seconds
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._service_seconds: Optional[float] = None
+        self._completions: deque = deque()
+        self._admitted = 0
+        self._rejected = 0
+
+    def _drain_rate(self, now: float) -> float:
+        """Completions per second over the drain window. Call with the lock held."""
+        while self._completions and now - self._completions[0] > DRAIN_WINDOW_SECONDS:
+            self._completions.popleft()
+        if not self._completions:
+            return 0.0
+        span = max(1.0, min(DRAIN_WINDOW_SECONDS, now - self._completions[0]))
+        return len(self._completions) / span
+
+    def _retry_after(self, now: float, excess: float) -> int:
+        """Seconds until `excess` requests have drained at the recent rate.
+        With no recent completions, fall back to one service time."""
+        rate = self._drain_rate(now)
+        if rate > 0:
+            seconds = excess / rate
+        else:
+            seconds = self._service_seconds or 1.0
+        return int(min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(seconds))))
+
+    def _estimated_work(self, depth: int) -> float:
+        return depth * (self._service_seconds or 0.0)
+
+    def admit(self) -> Ticket:
+        now = time.monotonic()
+        with self._lock:
+            reason = None
+            if self._depth >= self.max_depth:
+                reason = f"{self._depth} requests in progress"
+                excess = self._depth - self.max_depth + 1
+            elif self.max_work_seconds > 0 and self._service_seconds:
+                work = self._estimated_work(self._depth + 1)
+                if work > self.max_work_seconds:
+                    reason = f"~{work:.0f}s of work queued"
+                    excess = (work - self.max_work_seconds) / self._service_seconds
+            if reason is not None:
+                self._rejected += 1
+                raise AdmissionRejected(self.name, reason, self._retry_after(now, excess))
+            self._depth += 1
+            self._admitted += 1
+        return Ticket(self)
+
+    def finish(self, seconds: Optional[float]) -> None:
+        with self._lock:
+            self._depth -= 1
+            if seconds is None:
+                return
+            self._completions.append(time.monotonic())
+            if self._service_seconds is None:
+                self._service_seconds = seconds
+            else:
+                self._service_seconds += SERVICE_TIME_ALPHA * (seconds - self._service_seconds)
+
+    def stats(self) -> Dict[str, float]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "depth": self._depth,
+                "max_depth": self.max_depth,
+                "estimated_work_seconds": round(self._estimated_work(self._depth), 3),
+                "max_work_seconds": self.max_work_seconds,
+                "service_seconds": round(self._service_seconds or 0.0, 3),
+                "drain_per_second": round(self._drain_rate(now), 4),
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+            }
+
+
+class AdmissionController:
+    def __init__(self, limits: Dict[str, Tuple[int, float]]):
+        self._routes = {
+            name: _RouteState(name, depth, work) for name, (depth, work) in limits.items()
+        }
+
+    def admit(self, route: str) -> Ticket:
+        """Admit a request to the route or raise AdmissionRejected."""
+        return self._routes[route].admit()
+
+    def stats(self) -> Dict[str, object]:
+        routes = {name: state.stats() for name, state in self._routes.items()}
+        return {"depth": sum(r["depth"] for r in routes.values()), "routes": routes}
+
+
+def default_limits() -> Dict[str, Tuple[int, float]]:
+    limits = {}
+    for name in ROUTES:
+        env = name.upper().replace("-", "_")
+        limits[name] = (
+            int(os.getenv(f"ADMISSION_{env}_MAX_DEPTH", "32")),
+            float(os.getenv(f"ADMISSION_{env}_MAX_WORK_SECONDS", "0")),
+        )
+    return limits
+
+
+def guarded_route(method: str, path: str) -> Optional[str]:
+    for route_method, prefix, name in GUARDED_ROUTES:
+        if method == route_method and path.startswith(prefix):
+            return name
+    return None
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying admission control to GUARDED_ROUTES. A
+    request's ticket is held until its response (streamed ones included)
+    has been sent completely.
+
+    Must run inside QueueWaitMiddleware, whose per-request wait list is used
+    to take scheduler queue time out of the service time estimate."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        route = None
+        if scope["type"] == "http":
+            route = guarded_route(scope["method"], scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            ticket = self.controller.admit(route)
+        except AdmissionRejected as e:
+            await send_error(send, 429, str(e), {"Retry-After": str(e.retry_after)})
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ticket.release(max(0.0, time.perf_counter() - start - request_queue_wait()))
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,26 +7,53 @@ from fastapi.staticfiles import StaticFiles
 from backend.api.routes import (
     background,
     color_svg,
+    compare,
     crop,
     export,
     images,
+    jobs,
+    pipeline,
     potrace_color,
     svg,
     upload,
 )
+from backend.api import executors
+from backend.api.jobs import job_manager
+from backend.api.routes import admission as admission_routes
 from backend.api.routes import settings
+from backend.api.routes import scheduler as scheduler_routes
+from backend.api.admission import AdmissionMiddleware
+from backend.api.dependencies import admission
+from backend.api.prefork import worker_index
+from backend.api.scheduler import QueueWaitMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-forked workers share the job store; one of them resumes.
+    if worker_index() == 0:
+        resumed = await job_manager.resume()
+        if resumed:
+            print(f"Resuming {resumed} unfinished job(s)")
+    yield
+    executors.shutdown()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="IconForge API", version="0.1.0")
+    app = FastAPI(title="IconForge API", version="0.1.0", lifespan=lifespan)
 
+    # Middleware added first runs innermost: admission runs inside CORS (so
+    # 429s carry CORS headers) and inside QueueWaitMiddleware.
+    app.add_middleware(AdmissionMiddleware, controller=admission)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Queue-Wait", "Location", "Retry-After"],
     )
+    app.add_middleware(QueueWaitMiddleware)
 
     # Register API routes
     app.include_router(upload.router, prefix="/api", tags=["upload"])
@@ -36,9 +64,14 @@ def create_app() -> FastAPI:
     app.include_router(
         potrace_color.router, prefix="/api/potrace-color", tags=["potrace-color"]
     )
+    app.include_router(compare.router, prefix="/api", tags=["compare"])
+    app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+    app.include_router(pipeline.router, prefix="/api/pipeline", tags=["pipeline"])
     app.include_router(export.router, prefix="/api/export", tags=["export"])
     app.include_router(images.router, prefix="/api/images", tags=["images"])
     app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
+    app.include_router(scheduler_routes.router, prefix="/api/scheduler", tags=["scheduler"])
+    app.include_router(admission_routes.router, prefix="/api/admission", tags=["admission"])
 
     # Serve frontend static files (production build)
     dist_dir = Path(__file__).parent.parent.parent.parent / "frontend" / "dist"
@@ -52,7 +85,8 @@ app = create_app()
 
 
 def serve():
-    """Entry point for `iconforge-web` command."""
+    """Entry point for `iconforge-web` command. Single process; for
+    multi-worker serving see backend/api/prefork.py."""
     import uvicorn
 
     print("Starting IconForge Web UI at http://localhost:8000")
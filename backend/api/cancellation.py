@@ -0,0 +1,132 @@
+"""Cancelling processing requests whose result nobody will read.
+
+cancellable() runs a route's work as a task and cancels it when the
+client disconnects, or when POST /api/scheduler/requests/{id}/cancel is
+called for the X-Request-Id the client sent. Cancellation then
+propagates through executors.run: work still queued for a slot is
+dropped and the slot is never taken. Running work has its CancelToken
+cancelled, which (for potrace-color) kills the running Potrace process
+and stops the pipeline at the next stage boundary.
+
+cancellable_stream() does the same for a streamed response body, whose
+work outlives the route handler: the stream's token is cancelled and its
+generator closed as soon as the client leaves or the request is
+cancelled, without waiting for garbage collection.
+"""
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, Generator
+
+from fastapi import HTTPException, Request
+
+from backend.api import executors
+from backend.core.cancel import Cancelled, CancelToken
+
+# How often a waiting request checks whether its client is still there.
+DISCONNECT_POLL_SECONDS = 0.5
+
+# 499 is the de-facto "client closed request" status (nginx). The client
+# never sees it after a disconnect, but an explicit cancel does.
+CLIENT_CLOSED_REQUEST = 499
+
+# X-Request-Id -> task, for explicit cancellation. Event-loop-only.
+_requests: Dict[str, asyncio.Task] = {}
+
+
+async def cancellable(request: Request, work: Awaitable[Any]) -> Any:
+    """Await work, cancelling it if the client disconnects or the request is
+    cancelled explicitly (both end in a 499)."""
+    task = asyncio.ensure_future(work)
+    request_id = request.headers.get("x-request-id")
+    if request_id:
+        _requests[request_id] = task
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                if task.cancelled():
+                    raise HTTPException(
+                        status_code=CLIENT_CLOSED_REQUEST, detail="Request cancelled"
+                    )
+                return task.result()
+            if await request.is_disconnected():
+                raise HTTPException(
+                    status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected"
+                )
+    finally:
+        if request_id and _requests.get(request_id) is task:
+            del _requests[request_id]
+        if not task.done():
+            task.cancel()
+
+
+def cancellable_stream(
+    request: Request,
+    chunks: Generator[str, None, None],
+    cancel: CancelToken,
+    resource: str,
+) -> AsyncIterator[str]:
+    """Stream chunks, a blocking generator, with each chunk produced on the
+    resource class's pool (no scheduler slot: the generator holds its own).
+
+    From this call on, the client disconnecting or the request being
+    cancelled explicitly cancels cancel and closes chunks, running its
+    finally blocks (e.g. a slot release). So does the stream ending or being
+    closed for any other reason. A chunk still being produced then is
+    finished first; chunks raising Cancelled just ends the stream.
+    """
+    lock = threading.Lock()
+    done = object()
+
+    def step():
+        with lock:
+            return next(chunks, done)
+
+    def close():
+        with lock:
+            chunks.close()
+
+    def stop():
+        cancel.cancel()
+        asyncio.ensure_future(executors.run(resource, close, slot=False))
+
+    watcher = asyncio.ensure_future(_watch(request, stop))
+
+    async def stream() -> AsyncIterator[str]:
+        try:
+            while True:
+                chunk = await executors.run(resource, step, slot=False)
+                if chunk is done:
+                    return
+                yield chunk
+        except Cancelled:
+            return
+        finally:
+            watcher.cancel()
+
+    return stream()
+
+
+async def _watch(request: Request, stop) -> None:
+    """Call stop() once the client disconnects, or when this task is
+    cancelled (by cancel_request, or by the stream it guards ending)."""
+    request_id = request.headers.get("x-request-id")
+    task = asyncio.current_task()
+    if request_id:
+        _requests[request_id] = task
+    try:
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    finally:
+        if request_id and _requests.get(request_id) is task:
+            del _requests[request_id]
+        stop()
+
+
+def cancel_request(request_id: str) -> bool:
+    """Cancel an in-flight request by its X-Request-Id. False if unknown."""
+    task = _requests.get(request_id)
+    if task is None or task.done():
+        return False
+    task.cancel()
+    return True
@@ -0,0 +1,93 @@
+"""Single-flight coalescing of identical in-flight conversions.
+
+Double-clicks, retries and several open tabs send the same conversion
+again while the first is still running. Requests are keyed by (engine,
+input file, input content hash, normalized settings). The input file is
+part of the key because outputs are named after it: identical bytes
+under two names are converted, and written, once per name. The first
+request for a key starts the computation as its own task. Identical
+requests arriving before it finishes await that same task and get its
+result (or error) instead of redoing the work. Completed results are not cached; this
+only merges concurrent duplicates.
+"""
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def content_hash(path: Path) -> str:
+    """sha1 of a file's bytes (blocking; run it on an executor)."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_key(settings: Optional[Dict[str, Any]]) -> str:
+    """Canonical form of request settings: key order and None vs {} don't matter."""
+    return json.dumps(settings or {}, sort_keys=True, default=str)
+
+
+class SingleFlight:
+    """Merges concurrent calls with the same key into one computation.
+    Event-loop-only; not thread safe."""
+
+    def __init__(self):
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._waiters: Dict[Tuple, int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def run(
+        self, engine: str, key: Tuple, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return compute()'s result, sharing an in-flight computation of the
+        same engine and key if there is one. The computation is cancelled
+        only once every caller waiting for it has been cancelled."""
+        full_key = (engine,) + tuple(key)
+        stats = self._stats.setdefault(engine, {"computed": 0, "coalesced": 0})
+        task = self._inflight.get(full_key)
+        if task is None:
+            stats["computed"] += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[full_key] = task
+            self._waiters[full_key] = 0
+            task.add_done_callback(lambda done: self._forget(full_key, done))
+        else:
+            stats["coalesced"] += 1
+        self._waiters[full_key] += 1
+        try:
+            # Shielded: one caller going away doesn't cancel the others' result.
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(full_key) is task:
+                self._waiters[full_key] -= 1
+                if self._waiters[full_key] == 0:
+                    # Detach first so a new identical request starts afresh
+                    # instead of joining the cancelled computation.
+                    del self._inflight[full_key]
+                    del self._waiters[full_key]
+                    task.cancel()
+            raise
+
+    def _forget(self, full_key: Tuple, task: asyncio.Task) -> None:
+        if self._inflight.get(full_key) is task:
+            del self._inflight[full_key]
+            del self._waiters[full_key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every caller left.
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        in_flight: Dict[str, int] = {}
+        for full_key in self._inflight:
+            in_flight[full_key[0]] = in_flight.get(full_key[0], 0) + 1
+        return {
+            engine: dict(counts, in_flight=in_flight.get(engine, 0))
+            for engine, counts in self._stats.items()
+        }
+
+
+single_flight = SingleFlight()
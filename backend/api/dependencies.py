@@ -1,10 +1,20 @@
-import threading
+import os
 from pathlib import Path
 from functools import lru_cache
 
+from backend.api.admission import AdmissionController
+from backend.api.admission import default_limits as default_admission_limits
+from backend.api.scheduler import CPU, Scheduler, client_weights, default_limits
+from backend.core.utils import set_concurrent_conversions
 
-# Serialize GPU-bound processing to prevent CUDA OOM
-processing_lock = threading.Lock()
+# Per-resource-class slots for processing work (accelerator / cpu / io). The
+# accelerator class defaults to one slot to prevent CUDA OOM.
+scheduler = Scheduler(default_limits(), client_weights())
+# Converters split their memory budget and CPUs across the cpu slots.
+set_concurrent_conversions(scheduler.limit(CPU))
+
+# Per-route queue depth / estimated work caps in front of the scheduler.
+admission = AdmissionController(default_admission_limits())
 
 # Output subfolder per service output type
 OUTPUT_KINDS = ("background_removed", "silhouette", "color_svg", "webp")
@@ -15,12 +25,14 @@ def get_project_root() -> Path:
     return Path(__file__).parent.parent.parent
 
 
+# INPUT_DIR / OUTPUT_DIR override the folders below, e.g. to point API and
+# standalone job workers on several machines at one shared mount.
 def get_input_dir() -> Path:
-    return get_project_root() / "assets" / "input_images"
+    return Path(os.getenv("INPUT_DIR") or get_project_root() / "assets" / "input_images")
 
 
 def get_output_root() -> Path:
-    return get_project_root() / "output"
+    return Path(os.getenv("OUTPUT_DIR") or get_project_root() / "output")
 
 
 def get_output_subdir(kind: str) -> Path:
@@ -0,0 +1,193 @@
+"""Managed thread pools for blocking route work.
+
+Route handlers are async, so anything that decodes or encodes images, runs
+a subprocess or a model, or waits for a scheduler slot must not run on the
+event loop: one slow conversion would otherwise stall every other request,
+image previews and listings included. Handlers hand that work to run(),
+which executes it on the pool of its resource class (see scheduler.py):
+
+    accelerator  EXECUTOR_ACCELERATOR_THREADS
+    cpu          EXECUTOR_CPU_THREADS
+    io           EXECUTOR_IO_THREADS
+
+Each defaults to twice the class's scheduler slot limit (at least 4), so
+requests beyond the slot limit queue in the scheduler, where their wait
+is measured, rather than invisibly in the pool.
+
+Threads are enough for work that releases the GIL (OpenCV, subprocesses,
+onnxruntime), but VTracer holds it for a whole conversion, which would
+still freeze the event loop. process_pool() is a shared worker-process
+pool (EXECUTOR_PROCESSES, default: the cpu slot limit) for such work,
+called from within run() so the slot accounting stays the same.
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from backend.api.dependencies import scheduler
+from backend.api.scheduler import CPU, RESOURCE_CLASSES
+from backend.core.cancel import CancelToken
+
+load_dotenv()
+
+
+def _pool_size(resource: str) -> int:
+    default = max(4, 2 * scheduler.limit(resource))
+    return max(1, int(os.getenv(f"EXECUTOR_{resource.upper()}_THREADS", str(default))))
+
+
+_pools: Dict[str, ThreadPoolExecutor] = {
+    resource: ThreadPoolExecutor(
+        max_workers=_pool_size(resource), thread_name_prefix=f"iconforge-{resource}"
+    )
+    for resource in RESOURCE_CLASSES
+}
+
+
+async def run(
+    resource: str,
+    fn: Callable[..., Any],
+    *args,
+    slot: bool = True,
+    cancel: Optional[CancelToken] = None,
+    **kwargs,
+) -> Any:
+    """Run fn(*args, **kwargs) on the resource class's pool and await it.
+
+    With slot=True (the default) the call holds a scheduler slot of that
+    class while it runs; queue wait is counted from submission. Use
+    slot=False for quick blocking calls that shouldn't compete for slots
+    (directory listings, availability checks).
+
+    If the awaiting task is cancelled (e.g. the client disconnected), work
+    still queued for its slot is dropped, and cancel, if given, is
+    cancelled so fn can stop at its next check. fn itself can't be
+    interrupted otherwise.
+    """
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+    # Carry the request context (queue-wait accounting) into the worker thread.
+    context = contextvars.copy_context()
+    cancel = cancel if cancel is not None else CancelToken()
+
+    def call():
+        if not slot:
+            return fn(*args, **kwargs)
+        with scheduler.slot(resource, since=submitted, cancel=cancel):
+            return fn(*args, **kwargs)
+
+    try:
+        return await loop.run_in_executor(_pools[resource], context.run, call)
+    except asyncio.CancelledError:
+        cancel.cancel()
+        raise
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _current_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = int(os.getenv("EXECUTOR_PROCESSES", str(scheduler.limit(CPU))))
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def _discard_process_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool, so the next submission builds a new one."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _SharedProcessPool(Executor):
+    """The shared process pool, rebuilt after a worker dies.
+
+    A worker killed mid-task (OOM killer, a native abort) breaks a
+    ProcessPoolExecutor for good: every later submission fails at once.
+    Tasks lost that way are retried once on a new pool; if that one breaks
+    too (the task itself is what kills its worker), they fail with a
+    RuntimeError.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        outer: Future = Future()
+        running: list = []
+
+        def attempt(retries: int) -> None:
+            pool = _current_process_pool()
+            try:
+                inner = pool.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                failed(pool, retries)
+                return
+            running[:] = [inner]
+            inner.add_done_callback(lambda done: finished(pool, retries, done))
+
+        def failed(pool: ProcessPoolExecutor, retries: int) -> None:
+            _discard_process_pool(pool)
+            if outer.cancelled():
+                return
+            if retries > 0:
+                attempt(retries - 1)
+                return
+            outer.set_exception(RuntimeError("Worker process crashed (killed or out of memory)"))
+
+        def finished(pool: ProcessPoolExecutor, retries: int, inner: Future) -> None:
+            if outer.cancelled():
+                return
+            if inner.cancelled():
+                outer.cancel()
+                return
+            error = inner.exception()
+            if isinstance(error, BrokenProcessPool):
+                failed(pool, retries)
+            elif error is not None:
+                outer.set_exception(error)
+            else:
+                outer.set_result(inner.result())
+
+        def cancel_task(done: Future) -> None:
+            # Cancelling the returned future cancels the task if it hasn't started.
+            if done.cancelled() and running:
+                running[0].cancel()
+
+        outer.add_done_callback(cancel_task)
+        attempt(1)
+        return outer
+
+
+_shared_process_pool = _SharedProcessPool()
+
+
+def process_pool() -> Executor:
+    """Shared worker processes for GIL-holding native code, created on first use.
+
+    Workers are spawned rather than forked: the server process already runs
+    many threads by the time this is first called. If a worker dies, the
+    pool is replaced (see _SharedProcessPool).
+    """
+    return _shared_process_pool
+
+
+def shutdown() -> None:
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,515 @@
+"""Job records, and the broker interface standalone workers pull jobs from.
+
+A job store keeps job records (status, progress, result) and, for
+standalone workers (backend/api/worker.py), hands out queued jobs under
+a lease:
+
+    claim(kinds, worker, lease)   take the oldest claimable job of those
+                                  kinds, interactive before batch
+    heartbeat(id, worker, lease)  extend the lease; False once it is lost
+    finish(id, worker, **fields)  record the outcome, if still the owner
+    release(id, worker)           give a job back (worker shutting down)
+    request_cancel(id)            cancel a queued job, flag a running one
+
+A worker that stops heartbeating (crashed, partitioned) loses its lease
+after JOBS_LEASE_SECONDS and the job is dispatched again, up to
+JOBS_MAX_ATTEMPTS times; then it fails. Two implementations, neither
+needing an external service (JOBS_BROKER):
+
+    sqlite      JobStore, one SQLite file (JOBS_DB_PATH). WAL needs shared
+                memory, so API and workers must be on one host.
+    filesystem  FileJobStore, a directory (JOBS_BROKER_PATH) on a shared
+                filesystem (NFS, SMB) that all nodes mount. Claims are
+                atomic renames; leases are file mtimes, so node clocks must
+                agree to well within the lease time.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from backend.api.scheduler import BATCH
+
+load_dotenv()
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    stage TEXT,
+    step INTEGER,
+    total INTEGER,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+# Added for leases; ALTERed into stores created before them.
+_LEASE_COLUMNS = (
+    ("worker", "TEXT"),
+    ("lease_expires", "REAL"),
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("cancel_requested", "INTEGER NOT NULL DEFAULT 0"),
+)
+_JSON_COLUMNS = ("request", "result")
+# Broker bookkeeping, not part of the job record clients see.
+_PRIVATE_COLUMNS = ("lease_expires", "cancel_requested")
+
+
+def max_attempts() -> int:
+    return max(1, int(os.getenv("JOBS_MAX_ATTEMPTS", "3")))
+
+
+def _abandoned(attempts: int) -> str:
+    return f"Abandoned: the worker running it stopped responding ({attempts} attempts)"
+
+
+class JobStore:
+    """SQLite-backed job records and broker. Safe to use from any thread,
+    and from several processes on one host."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in _LEASE_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    def create(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, request, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(request), now, now),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        self._update(job_id, "", (), fields)
+
+    def _update(self, job_id: str, condition: str, args: tuple, fields: Dict[str, Any]) -> bool:
+        fields["updated_at"] = time.time()
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?{condition}",
+                (*fields.values(), job_id, *args),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_dict(row) if row else None
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_row_dict(row) for row in rows]
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        return [_row_dict(row) for row in rows]
+
+    def claim(
+        self, kinds: Iterable[str], worker: str, lease_seconds: float
+    ) -> Optional[Dict[str, Any]]:
+        kinds = list(kinds)
+        marks = ", ".join("?" for _ in kinds)
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two workers can't
+            # both select the same row.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire(now)
+                row = self._conn.execute(
+                    f"SELECT id FROM jobs WHERE kind IN ({marks}) AND (status = ?"
+                    " OR (status = ? AND lease_expires < ?))"
+                    " ORDER BY CASE json_extract(request, '$.priority') WHEN ? THEN 1"
+                    " ELSE 0 END, created_at LIMIT 1",
+                    (*kinds, QUEUED, RUNNING, now, BATCH),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?,"
+                        " attempts = attempts + 1, stage = NULL, step = NULL, total = NULL,"
+                        " error = NULL, updated_at = ? WHERE id = ?",
+                        (RUNNING, worker, now + lease_seconds, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def _expire(self, now: float) -> None:
+        """Settle jobs whose lease ran out that must not run again: cancel
+        requested, or out of attempts. Call inside claim's transaction."""
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?"
+            " AND lease_expires < ? AND cancel_requested = 1",
+            (CANCELLED, now, RUNNING, now),
+        )
+        for row in self._conn.execute(
+            "SELECT id, attempts FROM jobs WHERE status = ? AND lease_expires < ?"
+            " AND attempts >= ?",
+            (RUNNING, now, max_attempts()),
+        ).fetchall():
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (FAILED, _abandoned(row["attempts"]), now, row["id"]),
+            )
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float) -> bool:
+        return self._update(
+            job_id,
+            " AND worker = ? AND status = ?",
+            (worker, RUNNING),
+            {"lease_expires": time.time() + lease_seconds},
+        )
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish(self, job_id: str, worker: str, **fields: Any) -> bool:
+        return self._update(
+            job_id, " AND worker = ? AND status = ?", (worker, RUNNING), fields
+        )
+
+    def release(self, job_id: str, worker: str) -> None:
+        # A job handed back on shutdown doesn't use up one of its attempts.
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL,"
+                " attempts = attempts - 1, stage = NULL, step = NULL, total = NULL,"
+                " updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = ?",
+                (QUEUED, time.time(), job_id, worker, RUNNING),
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued job at once; flag a running one for its worker.
+        Returns the job's status before the request, None if unknown."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT status FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                if row is not None and row["status"] == QUEUED:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                        (CANCELLED, time.time(), job_id),
+                    )
+                elif row is not None and row["status"] == RUNNING:
+                    self._conn.execute(
+                        "UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row["status"] if row is not None else None
+
+
+def _row_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    for column in _JSON_COLUMNS:
+        if job[column] is not None:
+            job[column] = json.loads(job[column])
+    for column in _PRIVATE_COLUMNS:
+        job.pop(column, None)
+    return job
+
+
+class FileJobStore:
+    """Job records and broker in a directory on a shared filesystem:
+
+        jobs/<id>.json    the job record, replaced atomically on update
+        queue/<entry>     claimable jobs; <entry> sorts interactive first,
+                          then by submission time
+        leases/<entry>    claimed jobs; holds the worker id, and its mtime
+                          is the last heartbeat
+        cancel/<id>       cancel requested for a running job
+
+    Moving an entry between queue/ and leases/ is a rename, which is atomic
+    on one filesystem: of several workers claiming it, exactly one wins.
+    A record is only written by its creator, then by the worker holding its
+    lease (or whoever expires that lease), so writes don't conflict.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._dirs = {name: root / name for name in ("jobs", "queue", "leases", "cancel")}
+        for path in self._dirs.values():
+            path.mkdir(parents=True, exist_ok=True)
+
+    def _record_path(self, job_id: str) -> Path:
+        return self._dirs["jobs"] / f"{job_id}.json"
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._record_path(job_id).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        path = self._record_path(job["id"])
+        temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        temp.write_text(json.dumps(job), encoding="utf-8")
+        os.replace(temp, path)
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in job.items() if not key.startswith("_")}
+
+    def create(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        lane = 1 if request.get("priority") == BATCH else 0
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "status": QUEUED,
+            "request": request,
+            "stage": None,
+            "step": None,
+            "total": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "worker": None,
+            "attempts": 0,
+            "_entry": f"{lane}-{time.time_ns():020d}-{kind}-{job_id}",
+        }
+        self._write(job)
+        (self._dirs["queue"] / job["_entry"]).touch()
+        return self._public(job)
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        job = self._read(job_id)
+        if job is not None:
+            job.update(fields, updated_at=time.time())
+            self._write(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._read(job_id)
+        return self._public(job) if job is not None else None
+
+    def _all(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for path in self._dirs["jobs"].glob("*.json"):
+            try:
+                jobs.append(json.loads(path.read_text(encoding="utf-8")))
+            except (FileNotFoundError, ValueError):
+                continue
+        return jobs
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        jobs = sorted(self._all(), key=lambda job: -job["created_at"])
+        return [self._public(job) for job in jobs[:limit]]
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        jobs = [job for job in self._all() if job["status"] in (QUEUED, RUNNING)]
+        return [self._public(job) for job in sorted(jobs, key=lambda job: job["created_at"])]
+
+    @staticmethod
+    def _parse_entry(entry: str):
+        """(kind, job id) of a queue/lease entry name."""
+        kind, job_id = entry.split("-", 2)[2].rsplit("-", 1)
+        return kind, job_id
+
+    def claim(
+        self, kinds: Iterable[str], worker: str, lease_seconds: float
+    ) -> Optional[Dict[str, Any]]:
+        self._expire(lease_seconds)
+        kinds = set(kinds)
+        for entry in sorted(os.listdir(self._dirs["queue"])):
+            if entry.startswith("."):
+                continue  # being expired
+            kind, job_id = self._parse_entry(entry)
+            if kind not in kinds:
+                continue
+            lease = self._dirs["leases"] / entry
+            try:
+                os.rename(self._dirs["queue"] / entry, lease)
+            except FileNotFoundError:
+                continue  # another worker got it
+            lease.write_text(worker, encoding="utf-8")
+            job = self._read(job_id)
+            if job is None:
+                lease.unlink(missing_ok=True)
+                continue
+            job.update(
+                status=RUNNING,
+                worker=worker,
+                attempts=job.get("attempts", 0) + 1,
+                stage=None,
+                step=None,
+                total=None,
+                error=None,
+                updated_at=time.time(),
+            )
+            self._write(job)
+            return self._public(job)
+        return None
+
+    def _expire(self, lease_seconds: float) -> None:
+        """Requeue jobs whose worker stopped heartbeating, or settle them if
+        they were cancelled or are out of attempts."""
+        cutoff = time.time() - lease_seconds
+        for entry in os.listdir(self._dirs["leases"]):
+            lease = self._dirs["leases"] / entry
+            try:
+                stat = lease.stat()
+                # The rename that claimed it sets ctime (on POSIX) before
+                # the claimer gets to write the lease.
+                if max(stat.st_mtime, stat.st_ctime) >= cutoff:
+                    continue
+                # Whoever moves the lease away first handles the expiry.
+                expired = self._dirs["queue"] / f".expired-{entry}"
+                os.rename(lease, expired)
+            except FileNotFoundError:
+                continue
+            _, job_id = self._parse_entry(entry)
+            job = self._read(job_id)
+            cancel = self._dirs["cancel"] / job_id
+            if job is None:
+                expired.unlink(missing_ok=True)
+            elif cancel.exists() or job.get("attempts", 0) >= max_attempts():
+                if cancel.exists():
+                    job.update(status=CANCELLED)
+                else:
+                    job.update(status=FAILED, error=_abandoned(job["attempts"]))
+                job["updated_at"] = time.time()
+                self._write(job)
+                cancel.unlink(missing_ok=True)
+                expired.unlink(missing_ok=True)
+            else:
+                job.update(status=QUEUED, worker=None, updated_at=time.time())
+                self._write(job)
+                os.rename(expired, self._dirs["queue"] / entry)
+
+    def _lease(self, job_id: str, worker: str) -> Optional[Path]:
+        job = self._read(job_id)
+        if job is None:
+            return None
+        lease = self._dirs["leases"] / job["_entry"]
+        try:
+            owner = lease.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        return lease if owner == worker else None
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float) -> bool:
+        lease = self._lease(job_id, worker)
+        if lease is None:
+            return False
+        try:
+            os.utime(lease)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return (self._dirs["cancel"] / job_id).exists()
+
+    def finish(self, job_id: str, worker: str, **fields: Any) -> bool:
+        lease = self._lease(job_id, worker)
+        if lease is None:
+            return False
+        self.update(job_id, **fields)
+        lease.unlink(missing_ok=True)
+        (self._dirs["cancel"] / job_id).unlink(missing_ok=True)
+        return True
+
+    def release(self, job_id: str, worker: str) -> None:
+        lease = self._lease(job_id, worker)
+        if lease is None:
+            return
+        job = self._read(job_id)
+        job.update(
+            status=QUEUED,
+            worker=None,
+            attempts=max(0, job.get("attempts", 1) - 1),
+            stage=None,
+            step=None,
+            total=None,
+            updated_at=time.time(),
+        )
+        self._write(job)
+        try:
+            os.rename(lease, self._dirs["queue"] / lease.name)
+        except FileNotFoundError:
+            pass
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        job = self._read(job_id)
+        if job is None:
+            return None
+        if job["status"] == QUEUED:
+            try:
+                # Taking the entry out of the queue wins against claimers.
+                os.unlink(self._dirs["queue"] / job["_entry"])
+            except FileNotFoundError:
+                pass  # claimed meanwhile: flag it like a running job
+            else:
+                self.update(job_id, status=CANCELLED)
+                return QUEUED
+        if job["status"] in (QUEUED, RUNNING):
+            (self._dirs["cancel"] / job_id).touch()
+        return job["status"]
+
+
+def open_store(default_sqlite_path: Path):
+    """The job store selected by JOBS_BROKER (sqlite or filesystem)."""
+    broker = os.getenv("JOBS_BROKER", "sqlite")
+    if broker == "sqlite":
+        return JobStore(Path(os.getenv("JOBS_DB_PATH", str(default_sqlite_path))))
+    if broker == "filesystem":
+        path = os.getenv("JOBS_BROKER_PATH")
+        if not path:
+            raise RuntimeError("JOBS_BROKER=filesystem needs JOBS_BROKER_PATH")
+        return FileJobStore(Path(path))
+    raise RuntimeError(f"Unknown JOBS_BROKER: {broker}")
@@ -0,0 +1,349 @@
+"""Asynchronous processing jobs.
+
+Long conversions (InSPyReNet, mean-shift potrace-color, ...) can outlast
+proxy timeouts when run inside one HTTP request. Instead, a job is
+submitted, answered with 202 and its id, and run in the background on the
+executor for its resource class. Jobs are kept in a job store (see
+job_store.py; by default SQLite at JOBS_DB_PATH, default
+output/jobs.sqlite3) so their status and results survive a restart. Jobs
+still queued or running when the server stopped are run again on
+startup; every job kind just rewrites its output file.
+
+With JOBS_DISPATCH=broker the API process runs no jobs: it only enqueues
+them, and standalone workers (python -m backend.api.worker, on this or
+other machines) claim and run them. Status and progress are then read
+back from the store.
+
+Runners report per-stage progress (decode, infer, quantize, trace i/n,
+compose, ...). It is recorded on the job row and published to
+Server-Sent Events subscribers as it happens.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.api import executors
+from backend.api.dependencies import get_output_root
+from backend.api.job_store import (  # noqa: F401 (statuses re-exported)
+    CANCELLED,
+    FAILED,
+    FINISHED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    open_store,
+)
+from backend.api.scheduler import IO, tag_request
+from backend.core.cancel import Cancelled, CancelToken
+from backend.core.utils import ProgressCallback
+
+load_dotenv()
+
+# Progress history is kept in memory for late SSE subscribers, for this
+# many most recent jobs. Older (or pre-restart) jobs only replay their
+# final state from the store.
+HISTORY_JOBS = 256
+# How often SSE subscribers re-read the store for jobs that another process
+# (a pre-forked sibling worker, a standalone worker) is running.
+STORE_POLL_SECONDS = 1.0
+# "local": run jobs in this process. "broker": only enqueue them.
+LOCAL = "local"
+BROKER = "broker"
+
+
+def _error_message(e: Exception) -> str:
+    """Same wording as the synchronous routes' error responses."""
+    if isinstance(e, (RuntimeError, ValueError, FileNotFoundError)):
+        return str(e)
+    return f"Processing failed: {e}"
+
+
+@dataclass(frozen=True)
+class JobKind:
+    # Scheduler resource class the job runs in.
+    resource: str
+    # runner(request, progress, cancel) -> result dict; runs in a worker
+    # thread. cancel is a CancelToken the runner may check or pass on.
+    runner: Callable[[Dict[str, Any], ProgressCallback, CancelToken], Dict[str, Any]]
+
+
+class JobManager:
+    def __init__(self, db_path: Path, dispatch: str = LOCAL):
+        if dispatch not in (LOCAL, BROKER):
+            raise ValueError(f"Unknown JOBS_DISPATCH: {dispatch}")
+        self.db_path = db_path
+        self.dispatch = dispatch
+        self._store = None
+        self._store_lock = threading.Lock()
+        self._kinds: Dict[str, JobKind] = {}
+        # Tasks are referenced here so they aren't garbage collected mid-run.
+        self._tasks: set = set()
+        # Ids of the jobs those tasks run.
+        self._local: set = set()
+        # Unfinished jobs' cancel tokens, and the ids cancel() was called for
+        # (as opposed to tasks cancelled by server shutdown, which resume).
+        self._cancels: Dict[str, CancelToken] = {}
+        self._cancel_requested: set = set()
+        # Event-loop-only state: progress history and SSE subscriber queues.
+        self._history: "OrderedDict[str, List[Tuple[str, Dict[str, Any]]]]" = OrderedDict()
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    @property
+    def store(self):
+        with self._store_lock:
+            if self._store is None:
+                self._store = open_store(self.db_path)
+            return self._store
+
+    def register(self, kind: str, resource: str, runner) -> None:
+        self._kinds[kind] = JobKind(resource, runner)
+
+    def kinds(self) -> List[str]:
+        return list(self._kinds)
+
+    def kind(self, name: str) -> JobKind:
+        return self._kinds[name]
+
+    async def submit(
+        self,
+        kind: str,
+        request: Dict[str, Any],
+        on_finish: Optional[Callable[[Optional[float]], None]] = None,
+    ) -> Dict[str, Any]:
+        """Store and start a job. on_finish, if given, is called once the job
+        is finished with the runner's duration in seconds, or None if it was
+        cancelled before it started. In broker mode the job is only stored,
+        for a worker to claim; on_finish is then called once the store
+        reports it finished."""
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = await executors.run(IO, self.store.create, kind, request, slot=False)
+        if self.dispatch == BROKER:
+            if on_finish is not None:
+                task = asyncio.get_running_loop().create_task(self._await_finish(job, on_finish))
+                self._keep(task)
+            return job
+        self._start(job, on_finish)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await executors.run(IO, self.store.get, job_id, slot=False)
+
+    async def recent(self, limit: int) -> List[Dict[str, Any]]:
+        return await executors.run(IO, self.store.recent, limit, slot=False)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. A queued job leaves its queue at
+        once; a running one stops at its runner's next cancellation check
+        (potrace-color also kills its Potrace process). In broker mode the
+        running job's worker sees the request at its next heartbeat. False
+        if the job isn't unfinished in this process (or, in broker mode,
+        in the store)."""
+        if self.dispatch == BROKER:
+            before = await executors.run(IO, self.store.request_cancel, job_id, slot=False)
+            return before in (QUEUED, RUNNING)
+        token = self._cancels.get(job_id)
+        if token is None:
+            return False
+        self._cancel_requested.add(job_id)
+        token.cancel()
+        return True
+
+    async def resume(self) -> int:
+        """Re-run jobs left queued or running by a previous server process.
+        Nothing to do in broker mode: workers pick unfinished jobs up."""
+        if self.dispatch == BROKER:
+            return 0
+        jobs = await executors.run(IO, self.store.unfinished, slot=False)
+        jobs = [job for job in jobs if job["kind"] in self._kinds]
+        for job in jobs:
+            self._start(job)
+        return len(jobs)
+
+    def _start(
+        self,
+        job: Dict[str, Any],
+        on_finish: Optional[Callable[[Optional[float]], None]] = None,
+    ) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(job, on_finish))
+        self._keep(task)
+        self._local.add(job["id"])
+        task.add_done_callback(lambda _: self._local.discard(job["id"]))
+
+    def _keep(self, task: asyncio.Task) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _await_finish(
+        self, job: Dict[str, Any], on_finish: Callable[[Optional[float]], None]
+    ) -> None:
+        """Broker mode: poll a submitted job's row until it is finished, then
+        call on_finish with about how long it ran (to within
+        STORE_POLL_SECONDS), or None if no worker ever claimed it."""
+        started: Optional[float] = None
+        queued_seen = time.time()
+        while job is not None and job["status"] not in FINISHED:
+            await asyncio.sleep(STORE_POLL_SECONDS)
+            now = time.time()
+            try:
+                latest = await self.get(job["id"])
+            except Exception as e:
+                # Broker briefly unreachable: keep the ticket, poll again.
+                print(f"Polling job {job['id']} failed: {e}")
+                continue
+            job = latest
+            if job is None or job["status"] == QUEUED:
+                # Not claimed yet, or handed back by a stopping worker.
+                started, queued_seen = None, now
+            elif job["status"] == RUNNING and started is None:
+                # Claiming sets updated_at; heartbeats only move it later.
+                started = job["updated_at"]
+        if job is None or not job.get("attempts"):
+            on_finish(None)
+        else:
+            on_finish(max(0.0, job["updated_at"] - (started or queued_seen)))
+
+    async def _run(
+        self, job: Dict[str, Any], on_finish: Optional[Callable[[Optional[float]], None]]
+    ) -> None:
+        job_id = job["id"]
+        spec = self._kinds[job["kind"]]
+        loop = asyncio.get_running_loop()
+        store = self.store
+        cancel = CancelToken()
+        self._cancels[job_id] = cancel
+        ran: List[float] = []
+
+        def publish(event: str, data: Dict[str, Any]) -> None:
+            loop.call_soon_threadsafe(self._publish, job_id, event, data)
+
+        def progress(stage: str, step: Optional[int] = None, total: Optional[int] = None) -> None:
+            store.update(job_id, stage=stage, step=step, total=total)
+            publish("progress", {"stage": stage, "step": step, "total": total})
+
+        def work() -> None:
+            # Runs once the resource class slot is held.
+            store.update(job_id, status=RUNNING, stage=None, step=None, total=None, error=None)
+            publish("status", {"status": RUNNING})
+            start = time.perf_counter()
+            try:
+                result = spec.runner(job["request"], progress, cancel)
+            except Cancelled:
+                if job_id not in self._cancel_requested:
+                    # Server shutdown: leave it running, to resume on restart.
+                    return
+                store.update(job_id, status=CANCELLED)
+            except Exception as e:
+                store.update(job_id, status=FAILED, error=_error_message(e))
+            else:
+                store.update(job_id, status=SUCCEEDED, result=result)
+            finally:
+                ran.append(time.perf_counter() - start)
+            publish("done", store.get(job_id))
+
+        # This task runs in its own context: tag it with the submitter's
+        # scheduler lane and identity, also after a restart.
+        tag_request(job["request"].get("priority"), job["request"].get("client"))
+        self._publish(job_id, "status", {"status": QUEUED})
+        try:
+            await executors.run(spec.resource, work, cancel=cancel)
+        except Cancelled:
+            # cancel() while still queued for a slot: the runner never ran.
+            await executors.run(IO, store.update, job_id, status=CANCELLED, slot=False)
+            self._publish(job_id, "done", await self.get(job_id))
+        finally:
+            self._cancels.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
+            if on_finish is not None:
+                on_finish(ran[0] if ran else None)
+
+    def _publish(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        history = self._history.setdefault(job_id, [])
+        self._history.move_to_end(job_id)
+        history.append((event, data))
+        while len(self._history) > HISTORY_JOBS:
+            self._history.popitem(last=False)
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait((event, data))
+
+    async def events(
+        self, job_id: str, keepalive: float = 15.0
+    ) -> AsyncIterator[Optional[Tuple[str, Dict[str, Any]]]]:
+        """Yield a job's (event, data) pairs: everything so far, then live
+        ones, ending with "done". Yields None every keepalive seconds of
+        silence so the caller can keep the connection open."""
+        queue: asyncio.Queue = asyncio.Queue()
+        # Snapshot and subscribe without awaiting in between, so no event
+        # is missed or seen twice.
+        replay = list(self._history.get(job_id, ()))
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            for item in replay:
+                yield item
+                if item[0] == "done":
+                    return
+            job = await self.get(job_id)
+            if job is not None and job["status"] in FINISHED:
+                # Finished without its history kept (e.g. before a restart),
+                # or just now with "done" still on its way to the queue.
+                yield "done", job
+                return
+            if job is not None and job_id not in self._local and not replay:
+                # Run by another process: nothing is published here.
+                async for item in self._follow_store(job, keepalive):
+                    yield item
+                return
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield item
+                if item[0] == "done":
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id, [])
+            if queue in subscribers:
+                subscribers.remove(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    async def _follow_store(
+        self, job: Dict[str, Any], keepalive: float
+    ) -> AsyncIterator[Optional[Tuple[str, Dict[str, Any]]]]:
+        """events() for a job run elsewhere: poll its row and report each
+        change of status or stage, ending with "done"."""
+        last: Optional[Tuple] = None
+        silent = 0.0
+        while True:
+            if job["status"] in FINISHED:
+                yield "done", job
+                return
+            state = (job["status"], job["stage"], job["step"], job["total"])
+            if last is None or state[0] != last[0]:
+                yield "status", {"status": job["status"]}
+            if job["stage"] is not None and (last is None or state[1:] != last[1:]):
+                yield "progress", {key: job[key] for key in ("stage", "step", "total")}
+            if state != last:
+                last, silent = state, 0.0
+            elif silent >= keepalive:
+                yield None
+                silent = 0.0
+            await asyncio.sleep(STORE_POLL_SECONDS)
+            silent += STORE_POLL_SECONDS
+            job = await self.get(job["id"])
+
+
+def _db_path() -> Path:
+    return Path(os.getenv("JOBS_DB_PATH", str(get_output_root() / "jobs.sqlite3")))
+
+
+job_manager = JobManager(_db_path(), os.getenv("JOBS_DISPATCH", LOCAL))
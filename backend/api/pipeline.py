@@ -0,0 +1,368 @@
+"""Declarative pipeline recipes, run as a DAG over many inputs.
+
+A recipe is a JSON list of steps. Each step runs one op on one image:
+the source image ("source", the default input) or the output of an
+image-producing step. The steps thus form a tree rooted at the source:
+
+    {"steps": [
+        {"id": "cutout", "op": "background", "model_name": "bria-rmbg"},
+        {"id": "webp", "op": "webp", "input": "cutout", "quality": 90},
+        {"id": "outline", "op": "silhouette", "input": "cutout"},
+        {"id": "color", "op": "color_svg", "input": "cutout"}
+    ]}
+
+Ops and their parameters (see OPS) mirror the single-step routes:
+
+    crop           x, y, width, height (grid-snapped),  -> image
+                   name (output name suffix)
+    background     model_type, model_name, mode         -> image (saved)
+    webp           quality
+    silhouette     settings
+    color_svg      settings
+    potrace_color  settings, deadline_seconds
+
+Each input is decoded once. Image-producing steps pass their result to
+the steps reading it in memory; the PNG encoding and numpy planes some
+converters want are derived from it once, on first use. Independent
+steps run concurrently, each on its op's scheduler resource class, and
+PIPELINE_MAX_INPUTS inputs (default 4) are in flight at once. Outputs
+get the folders and names the same chain of single-step calls would
+give them; a crop is only kept in memory.
+"""
+import asyncio
+import io
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+
+from backend.api import executors
+from backend.api.dependencies import get_output_subdir, safe_filename
+from backend.api.jobs import _error_message
+from backend.api.scheduler import ACCELERATOR, CPU, IO
+from backend.core.cancel import CancelToken
+from backend.core.image_utils import encode_webp, floor_to_grid, grid_crop_box, snap_image_to_grid
+
+load_dotenv()
+
+# Name of the decoded input image in step "input" fields.
+SOURCE = "source"
+
+# Marks a parameter without a default.
+_REQUIRED = object()
+
+
+class Intermediate:
+    """A decoded image shared by the steps that read it. Thread safe."""
+
+    def __init__(self, image: Image.Image, stem: str):
+        self.image = image
+        # File name stem the image would have on disk, for naming outputs.
+        self.stem = stem
+        self._lock = threading.Lock()
+        self._png: Optional[bytes] = None
+        self._planes: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def png(self) -> bytes:
+        """The image as PNG bytes (fast compression)."""
+        with self._lock:
+            if self._png is None:
+                buf = io.BytesIO()
+                self.image.save(buf, "PNG", compress_level=1)
+                self._png = buf.getvalue()
+            return self._png
+
+    def planes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(rgb, alpha) uint8 arrays, as potrace-color's decode stage makes."""
+        with self._lock:
+            if self._planes is None:
+                rgba = self.image.convert("RGBA")
+                self._planes = np.array(rgba.convert("RGB")), np.array(rgba.getchannel("A"))
+            return self._planes
+
+
+def _crop(src: Intermediate, p: dict, cancel: CancelToken):
+    img = snap_image_to_grid(src.image)
+    x, y, w, h = grid_crop_box(*img.size, p["x"], p["y"], p["width"], p["height"])
+    cropped = img.crop((x, y, x + w, y + h))
+    return Intermediate(cropped, f"{src.stem}_{p['name']}"), {"width": w, "height": h}
+
+
+def _background(src: Intermediate, p: dict, cancel: CancelToken):
+    from backend.background_remover.processor import BackgroundProcessor
+
+    processor = BackgroundProcessor()
+    processor.output_dir = get_output_subdir("background_removed")
+    args = (p["model_type"], p["model_name"], p["mode"])
+    cutout = processor.remove_background(src.image, *args)
+    filename = processor.output_filename(src.stem, *args)
+    cancel.check()
+    cutout.save(processor.output_dir / filename)
+    w, h = cutout.size
+    return (
+        Intermediate(cutout, Path(filename).stem),
+        {"filename": filename, "width": w, "height": h},
+    )
+
+
+def _webp(src: Intermediate, p: dict, cancel: CancelToken):
+    filename = f"{src.stem}.webp"
+    (get_output_subdir("webp") / filename).write_bytes(encode_webp(src.image, p["quality"]))
+    w, h = src.image.size
+    return None, {"filename": filename, "width": floor_to_grid(w), "height": floor_to_grid(h)}
+
+
+def _silhouette(src: Intermediate, p: dict, cancel: CancelToken):
+    from backend.svg_converter.processor import SVGConverter
+
+    converter = SVGConverter()
+    converter.output_dir = get_output_subdir("silhouette")
+    output_path = converter.convert_image(src.image, src.stem, settings=p["settings"])
+    return None, {"filename": output_path.name}
+
+
+def _color_svg(src: Intermediate, p: dict, cancel: CancelToken):
+    from backend.color_svg_converter.processor import ColorSVGConverter
+
+    converter = ColorSVGConverter()
+    converter.output_dir = get_output_subdir("color_svg")
+    svg = converter.convert_bytes(
+        src.png(), "png", settings=p["settings"], pool=executors.process_pool()
+    )
+    return None, {"filename": converter.save_svg(svg, src.stem).name}
+
+
+def _potrace_color(src: Intermediate, p: dict, cancel: CancelToken):
+    from backend.potrace_color_converter.processor import PotraceColorConverter
+
+    converter = PotraceColorConverter()
+    converter.output_dir = get_output_subdir("color_svg")
+    output_path = converter.convert_bytes(
+        src.png(),
+        src.stem,
+        settings=p["settings"],
+        decoded=src.planes(),
+        cancel=cancel,
+        deadline=p["deadline_seconds"],
+    )
+    return None, {"filename": output_path.name, "downgrades": converter.applied_downgrades}
+
+
+@dataclass(frozen=True)
+class Op:
+    # Scheduler resource class the op runs in.
+    resource: str
+    # Parameter names and defaults (_REQUIRED: no default).
+    params: Dict[str, Any]
+    # run(image, params, cancel) -> (output image or None, result dict);
+    # runs in a worker thread.
+    run: Callable[[Intermediate, dict, CancelToken], Tuple[Optional[Intermediate], dict]]
+    # Whether other steps may take this op's output as their input.
+    produces_image: bool = False
+
+
+OPS: Dict[str, Op] = {
+    "crop": Op(
+        IO,
+        {
+            "x": _REQUIRED,
+            "y": _REQUIRED,
+            "width": _REQUIRED,
+            "height": _REQUIRED,
+            "name": "cropped",
+        },
+        _crop,
+        produces_image=True,
+    ),
+    "background": Op(
+        ACCELERATOR,
+        {"model_type": "rembg", "model_name": "bria-rmbg", "mode": "base"},
+        _background,
+        produces_image=True,
+    ),
+    "webp": Op(IO, {"quality": 90}, _webp),
+    "silhouette": Op(CPU, {"settings": None}, _silhouette),
+    "color_svg": Op(CPU, {"settings": None}, _color_svg),
+    "potrace_color": Op(CPU, {"settings": None, "deadline_seconds": None}, _potrace_color),
+}
+
+
+def describe_ops() -> Dict[str, Dict[str, Any]]:
+    return {
+        name: {
+            "params": {k: (None if v is _REQUIRED else v) for k, v in op.params.items()},
+            "produces_image": op.produces_image,
+        }
+        for name, op in OPS.items()
+    }
+
+
+@dataclass(frozen=True)
+class Step:
+    id: str
+    op: str
+    input: str
+    params: Dict[str, Any]
+
+
+def _check_params(step_id: str, op: str, params: Dict[str, Any]) -> None:
+    def fail(message: str):
+        raise ValueError(f"Step {step_id!r}: {message}")
+
+    if op == "crop":
+        for key in ("x", "y", "width", "height"):
+            if not isinstance(params[key], int):
+                fail(f"{key} must be an integer")
+        name = params["name"]
+        if not isinstance(name, str) or not name or name != safe_filename(name):
+            fail("name must be a plain file name part")
+    if op == "webp" and not (isinstance(params["quality"], int) and 1 <= params["quality"] <= 100):
+        fail("quality must be 1-100")
+    if "settings" in params and not isinstance(params["settings"], (dict, type(None))):
+        fail("settings must be an object")
+    deadline = params.get("deadline_seconds")
+    if deadline is not None and (not isinstance(deadline, (int, float)) or deadline <= 0):
+        fail("deadline_seconds must be positive")
+
+
+def parse_recipe(recipe: Any) -> List[Step]:
+    """Validate a recipe and return its steps, each after its input.
+    Raises ValueError describing the first problem found."""
+    if not isinstance(recipe, dict) or not isinstance(recipe.get("steps"), list):
+        raise ValueError('A recipe is an object with a "steps" list')
+    if not recipe["steps"]:
+        raise ValueError("A recipe needs at least one step")
+
+    steps: Dict[str, Step] = {}
+    for raw in recipe["steps"]:
+        if not isinstance(raw, dict):
+            raise ValueError("Each step must be an object")
+        raw = dict(raw)
+        step_id, op_name = raw.pop("id", None), raw.pop("op", None)
+        step_input = raw.pop("input", SOURCE)
+        if not isinstance(step_id, str) or not step_id or step_id == SOURCE:
+            raise ValueError(f'Step ids must be non-empty strings other than "{SOURCE}"')
+        if step_id in steps:
+            raise ValueError(f"Duplicate step id: {step_id!r}")
+        if op_name not in OPS:
+            raise ValueError(f"Step {step_id!r}: op must be one of {list(OPS)}")
+        op = OPS[op_name]
+        unknown = sorted(set(raw) - set(op.params))
+        if unknown:
+            raise ValueError(f"Step {step_id!r}: unknown parameters {unknown} for {op_name}")
+        params = dict(op.params, **raw)
+        missing = sorted(key for key, value in params.items() if value is _REQUIRED)
+        if missing:
+            raise ValueError(f"Step {step_id!r}: missing parameters {missing}")
+        _check_params(step_id, op_name, params)
+        if op_name == "crop":
+            # Crops of one image are told apart (in output names) by name only.
+            for other in steps.values():
+                if (
+                    other.op == op_name
+                    and other.input == step_input
+                    and other.params["name"] == params["name"]
+                ):
+                    raise ValueError(
+                        f"Steps {other.id!r} and {step_id!r} crop the same input; "
+                        "give them different names"
+                    )
+        steps[step_id] = Step(step_id, op_name, step_input, params)
+
+    # Check every input, then order the steps so each comes after its input.
+    ordered: List[Step] = []
+    placed = {SOURCE}
+    for step in steps.values():
+        chain = []
+        while step.id not in placed:
+            if step in chain:
+                raise ValueError(f"Steps form a cycle: {' -> '.join(s.id for s in chain)}")
+            if step.input != SOURCE:
+                parent = steps.get(step.input)
+                if parent is None:
+                    raise ValueError(f"Step {step.id!r}: unknown input {step.input!r}")
+                if not OPS[parent.op].produces_image:
+                    raise ValueError(
+                        f"Step {step.id!r}: input {step.input!r} ({parent.op}) has no image output"
+                    )
+            chain.append(step)
+            if step.input == SOURCE:
+                break
+            step = steps[step.input]
+        for step in reversed(chain):
+            ordered.append(step)
+            placed.add(step.id)
+    return ordered
+
+
+def _decode(image_path: Path) -> Intermediate:
+    with Image.open(image_path) as img:
+        img.load()
+        return Intermediate(img.copy(), image_path.stem)
+
+
+async def run_recipe(steps: List[Step], image_path: Path) -> Dict[str, Any]:
+    """Run a parsed recipe on one image. Returns {"image", "steps": {id:
+    result}}; a failed step's result is {"error"}, and so is that of every
+    step reading its output. If the image can't be read, {"image", "error"}."""
+    try:
+        source = await executors.run(IO, _decode, image_path)
+    except FileNotFoundError:
+        return {"image": image_path.name, "error": f"Image not found: {image_path.name}"}
+    except Exception as e:
+        return {"image": image_path.name, "error": f"Could not read image: {e}"}
+
+    outputs: Dict[str, "asyncio.Future[Optional[Intermediate]]"] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+
+    async def run_step(step: Step) -> Optional[Intermediate]:
+        src = source if step.input == SOURCE else await outputs[step.input]
+        if src is None:
+            results[step.id] = {"error": f"Skipped: step {step.input!r} failed"}
+            return None
+        op = OPS[step.op]
+        cancel = CancelToken()
+        try:
+            image, results[step.id] = await executors.run(
+                op.resource, op.run, src, step.params, cancel, cancel=cancel
+            )
+        except Exception as e:
+            results[step.id] = {"error": _error_message(e)}
+            return None
+        return image
+
+    for step in steps:
+        outputs[step.id] = asyncio.ensure_future(run_step(step))
+    try:
+        await asyncio.gather(*outputs.values())
+    finally:
+        for task in outputs.values():
+            task.cancel()
+    return {"image": image_path.name, "steps": {step.id: results[step.id] for step in steps}}
+
+
+def max_inputs() -> int:
+    return max(1, int(os.getenv("PIPELINE_MAX_INPUTS", "4")))
+
+
+async def run_many(steps: List[Step], image_paths: List[Path]) -> AsyncIterator[Dict[str, Any]]:
+    """Run a parsed recipe on many images, max_inputs() at a time, yielding
+    each image's result as it completes (not in input order)."""
+    limit = asyncio.Semaphore(max_inputs())
+
+    async def one(path: Path) -> Dict[str, Any]:
+        async with limit:
+            return await run_recipe(steps, path)
+
+    tasks = [asyncio.ensure_future(one(path)) for path in image_paths]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
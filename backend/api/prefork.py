@@ -0,0 +1,228 @@
+"""Pre-fork multi-worker serving.
+
+serve() runs one uvicorn process, i.e. one interpreter (and one GIL) per
+host. Plain uvicorn --workers would have every worker load its own copy of
+the background-removal models. serve_prefork() instead loads the selected
+models once in a parent process, binds the listening socket, and forks
+workers that inherit both. The model weights stay in pages shared
+copy-on-write: they are only ever read, and gc.freeze() keeps the
+collector from touching the objects loaded before the fork.
+
+    python -m backend.api.prefork --workers 4
+
+    SERVE_WORKERS         worker processes (default: one per CPU, at most 8)
+    SERVE_PRELOAD_MODELS  models loaded before forking, as for
+                          background_remover.models.parse_specs
+                          (default "rembg:bria-rmbg"; "" loads none)
+    SERVE_PIN_CPUS        1 (default) pins each worker to its own slice of
+                          the CPUs; 0 lets the OS place them
+
+Each worker's thread budget is the size of its CPU slice: it sizes the
+OpenMP/BLAS, OpenCV and torch thread pools, and through cpu_budget() the
+scheduler's cpu slots and the tiling/process pools. Preloaded onnxruntime
+sessions run single-threaded per call, since their thread pools would not
+survive the fork; models loaded after it get the worker's budget.
+
+CUDA state cannot cross a fork either (and GPU memory isn't shared between
+processes anyway), so with a CUDA device present models are not preloaded
+and each worker loads its own on first use. Every other piece of state is
+per worker too: scheduler slots, admission limits, caches. Only worker 0
+resumes unfinished jobs on startup.
+
+POSIX only. Without os.fork this falls back to a single serve() process.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from backend.background_remover import models
+from backend.core.utils import cpu_budget
+
+load_dotenv()
+
+# Thread-count variables read by OpenMP, BLAS and onnxruntime (via rembg)
+# when they start their pools.
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+# Set in each worker: its index, 0..workers-1.
+WORKER_INDEX_ENV = "SERVE_WORKER_INDEX"
+
+
+def worker_index() -> int:
+    """This process's worker index; 0 outside a pre-forked server."""
+    return int(os.getenv(WORKER_INDEX_ENV, "0"))
+
+
+def cpu_slices(cpus: List[int], workers: int) -> List[List[int]]:
+    """Split cpus into workers contiguous slices, as evenly as possible.
+    With more workers than CPUs, workers share CPUs round-robin."""
+    if workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    size, extra = divmod(len(cpus), workers)
+    slices, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(cpus[start:end])
+        start = end
+    return slices
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _preload(specs: str) -> None:
+    wanted = models.parse_specs(specs)
+    if not wanted:
+        return
+    if models.cuda_available():
+        print("CUDA device present: models load in each worker instead of before forking")
+        return
+    # Single-threaded while loading, so no thread pool exists at fork time
+    # (a forked child would inherit the pool's state but not its threads).
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    os.environ.update({name: "1" for name in THREAD_ENV_VARS})
+    try:
+        if "torch" in sys.modules or any(t == "inspyrenet" for t, _ in wanted):
+            import torch
+
+            torch.set_num_threads(1)
+        start = time.perf_counter()
+        loaded = models.preload(wanted)
+        print(f"Preloaded {', '.join(loaded)} in {time.perf_counter() - start:.1f}s")
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _apply_thread_budget(budget: int) -> None:
+    """Size this worker's native thread pools to its CPU budget."""
+    os.environ.update({name: str(budget) for name in THREAD_ENV_VARS})
+    import cv2
+
+    cv2.setNumThreads(budget)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(budget)
+
+
+def _run_worker(index: int, sock: socket.socket, cpus: List[int], pin: bool) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if pin and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    os.environ[WORKER_INDEX_ENV] = str(index)
+    budget = len(cpus)
+    _apply_thread_budget(budget)
+
+    # Imported only now, so module-level pools are sized for this worker.
+    import uvicorn
+
+    from backend.api.app import app
+
+    print(f"Worker {index} (pid {os.getpid()}): cpus {cpus}, {budget} thread(s)")
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    server.run(sockets=[sock])
+
+
+def serve_prefork(workers: int, host: str, port: int, preload: str, pin: bool) -> None:
+    if not hasattr(os, "fork"):
+        print("Pre-fork serving needs os.fork; starting a single process instead")
+        from backend.api.app import serve
+
+        serve()
+        return
+
+    _preload(preload)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    slices = cpu_slices(_available_cpus(), workers)
+
+    # Keep everything loaded so far out of the collector's reach, so
+    # collections in the workers don't write to (and un-share) its pages.
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(index, sock, slices[index], pin)
+            except BaseException:
+                import traceback
+
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Serving on http://{host}:{port} with {workers} worker(s)")
+    for index in range(workers):
+        spawn(index)
+
+    # Supervise: replace workers that die, until asked to stop.
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+        time.sleep(1)
+        spawn(index)
+    sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked workers.")
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("SERVE_WORKERS", min(8, cpu_budget())))
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--preload", default=os.getenv("SERVE_PRELOAD_MODELS", "rembg:bria-rmbg")
+    )
+    parser.add_argument(
+        "--no-pin", action="store_true", default=os.getenv("SERVE_PIN_CPUS", "1") == "0"
+    )
+    args = parser.parse_args()
+    serve_prefork(max(1, args.workers), args.host, args.port, args.preload, not args.no_pin)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from backend.api.dependencies import admission
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def admission_stats():
+    """Total and per-route queue depth, estimated queued work, drain rate and
+    admitted / rejected counts, for autoscaling."""
+    return admission.stats()
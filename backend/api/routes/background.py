@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from PIL import Image
 
@@ -6,8 +6,11 @@ from backend.api.dependencies import (
     get_input_dir,
     get_output_subdir,
     safe_filename,
-    processing_lock,
 )
+from backend.api import executors
+from backend.api.cancellation import cancellable
+from backend.api.coalesce import content_hash, single_flight
+from backend.api.scheduler import ACCELERATOR, IO
 
 router = APIRouter()
 
@@ -22,16 +25,21 @@ class ProcessRequest(BaseModel):
 @router.get("/models")
 async def list_models():
     """List available background removal models."""
-    import rembg.sessions
 
-    return {
-        "rembg": list(rembg.sessions.sessions_names),
-        "inspyrenet": ["base", "fast"],
-    }
+    def models():
+        import rembg.sessions
+
+        return {
+            "rembg": list(rembg.sessions.sessions_names),
+            "inspyrenet": ["base", "fast"],
+        }
+
+    # The first rembg import is slow; keep it off the event loop.
+    return await executors.run(IO, models, slot=False)
 
 
 @router.post("/process")
-async def process_background(req: ProcessRequest):
+async def process_background(req: ProcessRequest, request: Request):
     """Remove background from an image."""
     filename = safe_filename(req.image)
 
@@ -39,13 +47,13 @@ async def process_background(req: ProcessRequest):
     if not image_path.exists():
         raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
 
-    with processing_lock:
+    def process():
         try:
             from backend.background_remover.processor import BackgroundProcessor
 
             processor = BackgroundProcessor()
             processor.output_dir = get_output_subdir("background_removed")
-            output_path = processor.process(
+            return processor.process(
                 image_path,
                 model_type=req.model_type,
                 model_name=req.model_name,
@@ -56,7 +64,23 @@ async def process_background(req: ProcessRequest):
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Processing failed: {e}")
 
-    img = Image.open(output_path)
-    w, h = img.size
+    # Identical concurrent requests (double-clicks, retries) share one run.
+    # Only the parameters the chosen model type reads are part of the key.
+    digest = await executors.run(IO, content_hash, image_path, slot=False)
+    variant = req.mode if req.model_type == "inspyrenet" else req.model_name
+    output_path = await cancellable(
+        request,
+        single_flight.run(
+            "background",
+            (str(image_path.resolve()), digest, req.model_type, variant),
+            lambda: executors.run(ACCELERATOR, process),
+        ),
+    )
+
+    def size():
+        with Image.open(output_path) as img:
+            return img.size
+
+    w, h = await executors.run(IO, size, slot=False)
 
     return {"filename": output_path.name, "width": w, "height": h}
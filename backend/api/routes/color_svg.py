@@ -1,13 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import json
 
 from backend.api.dependencies import (
     get_input_dir,
     get_output_subdir,
     safe_filename,
-    processing_lock,
+    scheduler,
 )
+from backend.api import executors
+from backend.api.cancellation import cancellable
+from backend.api.coalesce import content_hash, settings_key, single_flight
+from backend.api.scheduler import BATCH, CPU, IO, request_tags, tag_request
 
 router = APIRouter()
 
@@ -17,6 +24,18 @@ class ConvertRequest(BaseModel):
     settings: Optional[dict] = None
 
 
+class AutoTuneRequest(BaseModel):
+    image: str
+    max_paths: Optional[int] = None
+    max_bytes: Optional[int] = None
+    settings: Optional[dict] = None
+
+
+class BatchConvertRequest(BaseModel):
+    images: list[str]
+    settings: Optional[dict] = None
+
+
 @router.get("/check-vtracer")
 async def check_vtracer():
     """Check if vtracer is importable."""
@@ -26,7 +45,7 @@ async def check_vtracer():
 
 
 @router.post("/convert")
-async def convert_to_color_svg(req: ConvertRequest):
+async def convert_to_color_svg(req: ConvertRequest, request: Request):
     """Convert an image to a colored multi-path SVG via VTracer. Sources from
     the input folder first, then the background-removed outputs."""
     filename = safe_filename(req.image)
@@ -36,16 +55,124 @@ async def convert_to_color_svg(req: ConvertRequest):
     if not image_path.exists():
         raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
 
-    with processing_lock:
+    def convert():
         try:
             from backend.color_svg_converter.processor import ColorSVGConverter
 
             converter = ColorSVGConverter()
             converter.output_dir = get_output_subdir("color_svg")
-            output_path = converter.convert(image_path, settings=req.settings)
+            return converter.convert(
+                image_path, settings=req.settings, pool=executors.process_pool()
+            )
         except RuntimeError as e:
             raise HTTPException(status_code=500, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Conversion failed: {e}")
 
+    # Identical concurrent requests (double-clicks, retries) share one run.
+    digest = await executors.run(IO, content_hash, image_path, slot=False)
+    key = (str(image_path.resolve()), digest, settings_key(req.settings))
+    output_path = await cancellable(
+        request, single_flight.run("color_svg", key, lambda: executors.run(CPU, convert))
+    )
     return {"filename": output_path.name}
+
+
+@router.post("/auto-tune")
+async def auto_tune_color_svg(req: AutoTuneRequest, request: Request):
+    """Search filter_speckle / color_precision / layer_difference /
+    path_precision for the highest-fidelity SVG within max_paths and/or
+    max_bytes, and save it like /convert. Returns the chosen settings so they
+    can be applied via /api/settings/color-svg."""
+    if req.max_paths is None and req.max_bytes is None:
+        raise HTTPException(status_code=400, detail="Provide max_paths and/or max_bytes")
+    filename = safe_filename(req.image)
+    image_path = get_input_dir() / filename
+    if not image_path.exists():
+        image_path = get_output_subdir("background_removed") / filename
+    if not image_path.exists():
+        raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
+
+    def tune():
+        # Besides the slot run() holds, take the cpu slots that are free now
+        # and score that many candidates at once in the shared pool.
+        extra = scheduler.acquire_free(CPU, scheduler.limit(CPU) - 1)
+        try:
+            from backend.color_svg_converter.processor import ColorSVGConverter
+
+            converter = ColorSVGConverter()
+            converter.output_dir = get_output_subdir("color_svg")
+            result = converter.auto_tune(
+                image_path,
+                max_paths=req.max_paths,
+                max_bytes=req.max_bytes,
+                settings=req.settings,
+                max_workers=1 + len(extra),
+                pool=executors.process_pool(),
+            )
+            output_path = converter.save_svg(result.pop("svg"), image_path.stem)
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Auto-tune failed: {e}")
+        finally:
+            for slot in extra:
+                slot.release()
+        return {"filename": output_path.name, **result}
+
+    return await cancellable(request, executors.run(CPU, tune))
+
+
+@router.post("/convert-batch")
+async def convert_batch_to_color_svg(req: BatchConvertRequest):
+    """Convert many images in the shared VTracer process pool. Each file
+    holds one cpu scheduler slot while it converts, so a batch uses as many
+    processes as it gets slots. Streams NDJSON: one {"image", "filename"}
+    or {"image", "error"} line per input as it completes. Missing or
+    failing inputs are reported per file and don't abort the batch."""
+    if not req.images:
+        raise HTTPException(status_code=400, detail="No images provided")
+
+    image_paths = []
+    for name in req.images:
+        filename = safe_filename(name)
+        image_path = get_input_dir() / filename
+        if not image_path.exists():
+            image_path = get_output_subdir("background_removed") / filename
+        # Missing files are passed through and reported as per-file errors.
+        image_paths.append(image_path)
+
+    from backend.color_svg_converter.processor import ColorSVGConverter
+
+    if not ColorSVGConverter.check_vtracer():
+        raise HTTPException(status_code=500, detail="vtracer is not installed")
+
+    converter = ColorSVGConverter()
+    converter.output_dir = get_output_subdir("color_svg")
+
+    def convert(image_path):
+        try:
+            output_path = converter.convert(
+                image_path, settings=req.settings, pool=executors.process_pool()
+            )
+        except Exception as e:
+            return {"image": image_path.name, "error": str(e)}
+        return {"image": image_path.name, "filename": output_path.name}
+
+    # Bulk work goes in the batch lane unless the client asked for a priority.
+    priority, client = request_tags()
+
+    async def body():
+        tag_request(priority or BATCH, client)
+        tasks = [
+            asyncio.ensure_future(executors.run(CPU, convert, path)) for path in image_paths
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client gone: drop the files still queued for a slot.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
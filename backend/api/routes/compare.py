@@ -0,0 +1,174 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from typing import Optional
+from PIL import Image
+import numpy as np
+import asyncio
+import threading
+import time
+import io
+
+from backend.api.dependencies import (
+    get_input_dir,
+    get_output_subdir,
+    safe_filename,
+)
+from backend.api import executors
+from backend.api.cancellation import cancellable
+from backend.api.scheduler import CPU
+from backend.core.cancel import Cancelled, CancelToken
+from backend.core.svg_metrics import svg_metrics
+
+router = APIRouter()
+
+ENGINES = ("silhouette", "vtracer", "potrace_color")
+
+# Running per-engine totals across compare calls, for cost data in production.
+_stats_lock = threading.Lock()
+_engine_stats: dict = {}
+
+
+class CompareRequest(BaseModel):
+    image: str
+    engines: list[str] = list(ENGINES)
+    # Per-engine overrides, e.g. {"vtracer": {"filter_speckle": 8}}
+    settings: Optional[dict[str, dict]] = None
+
+
+def _run_engine(
+    engine: str, image_path, data: bytes, image: Image.Image, decoded, overrides, cancel
+):
+    """Run one engine on the shared decoded input and save its SVG like the
+    engine's own /convert route. Returns the output path."""
+    if engine == "silhouette":
+        from backend.svg_converter.processor import SVGConverter
+
+        converter = SVGConverter()
+        converter.output_dir = get_output_subdir("silhouette")
+        return converter.convert_image(
+            image, image_path.stem, dict(converter.settings, **overrides)
+        )
+    if engine == "vtracer":
+        from backend.color_svg_converter.processor import ColorSVGConverter
+
+        converter = ColorSVGConverter()
+        converter.output_dir = get_output_subdir("color_svg")
+        # VTracer decodes natively from the original file; no Python decode.
+        return converter.convert(image_path, overrides, pool=executors.process_pool())
+
+    from backend.potrace_color_converter.processor import PotraceColorConverter
+
+    converter = PotraceColorConverter()
+    converter.output_dir = get_output_subdir("color_svg")
+    return converter.convert_bytes(
+        data, image_path.stem, overrides, decoded=decoded, cancel=cancel
+    )
+
+
+def _timed_engine(engine: str, *args) -> dict:
+    start = time.perf_counter()
+    try:
+        output_path = _run_engine(engine, *args)
+    except Cancelled:
+        raise
+    except Exception as e:
+        return {"engine": engine, "error": str(e), "seconds": round(time.perf_counter() - start, 3)}
+    seconds = time.perf_counter() - start
+    return {
+        "engine": engine,
+        "filename": output_path.name,
+        "seconds": round(seconds, 3),
+        **svg_metrics(output_path.read_text(encoding="utf-8")),
+    }
+
+
+def _record(result: dict) -> None:
+    with _stats_lock:
+        stats = _engine_stats.setdefault(
+            result["engine"],
+            {"runs": 0, "errors": 0, "seconds": 0.0, "paths": 0, "nodes": 0, "bytes": 0},
+        )
+        if "error" in result:
+            stats["errors"] += 1
+            return
+        stats["runs"] += 1
+        for key in ("seconds", "paths", "nodes", "bytes"):
+            stats[key] += result[key]
+
+
+@router.post("/compare")
+async def compare_engines(req: CompareRequest, request: Request):
+    """Run the selected engines on one image concurrently and report each
+    result's wall time, path count, node count and byte size. The input is
+    read and decoded once and shared by all engines; each engine then holds
+    its own cpu scheduler slot. Outputs are saved as each engine's /convert
+    would. One engine failing doesn't fail the rest."""
+    engines = list(dict.fromkeys(req.engines))
+    unknown = [e for e in engines if e not in ENGINES]
+    if not engines or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"engines must be a non-empty subset of {list(ENGINES)}",
+        )
+
+    filename = safe_filename(req.image)
+    image_path = get_input_dir() / filename
+    if not image_path.exists():
+        image_path = get_output_subdir("background_removed") / filename
+    if not image_path.exists():
+        raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
+
+    overrides = req.settings or {}
+
+    def decode():
+        data = image_path.read_bytes()
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                image = img.convert("RGBA")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not decode image: {e}")
+        decoded = None
+        if "potrace_color" in engines:
+            decoded = (np.array(image.convert("RGB")), np.array(image.getchannel("A")))
+        return data, image, decoded
+
+    async def run_all():
+        start = time.perf_counter()
+        data, image, decoded = await executors.run(CPU, decode)
+        decode_seconds = time.perf_counter() - start
+
+        def engine_run(engine):
+            cancel = CancelToken()
+            args = (image_path, data, image, decoded, overrides.get(engine) or {}, cancel)
+            return executors.run(CPU, _timed_engine, engine, *args, cancel=cancel)
+
+        results = await asyncio.gather(*(engine_run(engine) for engine in engines))
+        return results, decode_seconds, time.perf_counter() - start
+
+    results, decode_seconds, total_seconds = await cancellable(request, run_all())
+    for result in results:
+        _record(result)
+
+    return {
+        "results": results,
+        "decode_seconds": round(decode_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+    }
+
+
+@router.get("/compare/stats")
+async def compare_stats():
+    """Per-engine run counts and mean cost over all /compare calls since start."""
+    with _stats_lock:
+        out = {}
+        for engine, stats in _engine_stats.items():
+            runs = stats["runs"]
+            out[engine] = {
+                "runs": runs,
+                "errors": stats["errors"],
+                **{
+                    f"mean_{key}": round(stats[key] / runs, 3) if runs else None
+                    for key in ("seconds", "paths", "nodes", "bytes")
+                },
+            }
+        return out
@@ -2,8 +2,10 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from PIL import Image
 
+from backend.api import executors
 from backend.api.dependencies import get_input_dir, safe_filename
-from backend.core.image_utils import ensure_file_on_grid, floor_to_grid
+from backend.api.scheduler import IO
+from backend.core.image_utils import ensure_file_on_grid, grid_crop_box
 
 router = APIRouter()
 
@@ -26,27 +28,22 @@ async def crop_image(req: CropRequest):
     if not input_path.exists():
         raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
 
-    img_w, img_h = ensure_file_on_grid(input_path)
-
-    x = max(0, floor_to_grid(req.x))
-    y = max(0, floor_to_grid(req.y))
-    w = floor_to_grid(req.width)
-    h = floor_to_grid(req.height)
-    if x + w > img_w:
-        w = floor_to_grid(img_w - x)
-    if y + h > img_h:
-        h = floor_to_grid(img_h - y)
-    if w < 8 or h < 8:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Crop region too small after grid snap ({w}x{h})",
-        )
-
-    with Image.open(input_path) as img:
-        cropped = img.crop((x, y, x + w, y + h))
-        output_filename = f"{input_path.stem}_cropped.png"
-        output_path = get_input_dir() / output_filename
-        cropped.save(output_path)
+    img_w, img_h = await executors.run(IO, ensure_file_on_grid, input_path)
+
+    try:
+        x, y, w, h = grid_crop_box(img_w, img_h, req.x, req.y, req.width, req.height)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    output_filename = f"{input_path.stem}_cropped.png"
+    output_path = get_input_dir() / output_filename
+
+    def save_crop():
+        with Image.open(input_path) as img:
+            cropped = img.crop((x, y, x + w, y + h))
+            cropped.save(output_path)
+
+    await executors.run(IO, save_crop)
 
     return {
         "filename": output_filename,
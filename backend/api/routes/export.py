@@ -11,6 +11,9 @@ from backend.api.dependencies import (
     get_output_subdir,
     safe_filename,
 )
+from backend.api import executors
+from backend.api.scheduler import IO
+from backend.core.image_utils import encode_webp
 
 router = APIRouter()
 
@@ -26,16 +29,8 @@ class BatchZipRequest(BaseModel):
 
 def _to_webp_bytes(image_path: Path, quality: int) -> bytes:
     """Encode an image as WebP, flooring dimensions to multiples of 8."""
-    img = Image.open(image_path)
-    w, h = img.size
-    new_w = (w // 8) * 8
-    new_h = (h // 8) * 8
-    if new_w != w or new_h != h:
-        img = img.resize((new_w, new_h), Image.LANCZOS)
-
-    buf = io.BytesIO()
-    img.save(buf, "WEBP", quality=quality)
-    return buf.getvalue()
+    with Image.open(image_path) as img:
+        return encode_webp(img, quality)
 
 
 @router.post("/webp")
@@ -52,18 +47,21 @@ async def export_webp(req: WebPExportRequest):
     if not image_path.exists():
         raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
 
-    try:
-        webp_bytes = _to_webp_bytes(image_path, req.quality)
+    def export():
+        try:
+            webp_bytes = _to_webp_bytes(image_path, req.quality)
+
+            webp_filename = f"{Path(filename).stem}.webp"
+            webp_path = get_output_subdir("webp") / webp_filename
+            webp_path.write_bytes(webp_bytes)
 
-        webp_filename = f"{Path(filename).stem}.webp"
-        webp_path = get_output_subdir("webp") / webp_filename
-        webp_path.write_bytes(webp_bytes)
+            with Image.open(webp_path) as img:
+                w, h = img.size
+            return {"filename": webp_filename, "width": w, "height": h}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"WebP export failed: {e}")
 
-        with Image.open(webp_path) as img:
-            w, h = img.size
-        return {"filename": webp_filename, "width": w, "height": h}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"WebP export failed: {e}")
+    return await executors.run(IO, export)
 
 
 @router.post("/zip")
@@ -73,20 +71,22 @@ async def export_zip(req: BatchZipRequest):
         raise HTTPException(status_code=400, detail="No images provided")
 
     webp_dir = get_output_subdir("webp")
-    buffer = io.BytesIO()
-
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for name in req.images:
-            filename = safe_filename(name)
-            file_path = webp_dir / filename
-            if not file_path.exists():
-                raise HTTPException(
-                    status_code=404, detail=f"Image not found: {filename}"
-                )
-            zf.write(file_path, arcname=filename)
+
+    def build_zip():
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name in req.images:
+                filename = safe_filename(name)
+                file_path = webp_dir / filename
+                if not file_path.exists():
+                    raise HTTPException(
+                        status_code=404, detail=f"Image not found: {filename}"
+                    )
+                zf.write(file_path, arcname=filename)
+        return buffer.getvalue()
 
     return Response(
-        content=buffer.getvalue(),
+        content=await executors.run(IO, build_zip),
         media_type="application/zip",
         headers={
             "Content-Disposition": 'attachment; filename="iconforge_export.zip"'
@@ -2,12 +2,14 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 from PIL import Image
 
+from backend.api import executors
 from backend.api.dependencies import (
     OUTPUT_KINDS,
     get_input_dir,
     get_output_subdir,
     safe_filename,
 )
+from backend.api.scheduler import IO
 
 router = APIRouter()
 
@@ -24,7 +26,7 @@ def _resolve_dir(directory: str):
 @router.get("/{directory}")
 async def list_images(directory: str):
     """List images in a directory (input or one of the output kinds)."""
-    return _list_images(_resolve_dir(directory))
+    return await executors.run(IO, _list_images, _resolve_dir(directory), slot=False)
 
 
 @router.get("/{directory}/{filename}")
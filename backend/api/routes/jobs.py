@@ -0,0 +1,212 @@
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from pathlib import Path
+from typing import Optional
+import json
+
+from backend.api.admission import AdmissionRejected
+from backend.api.dependencies import (
+    admission,
+    get_input_dir,
+    get_output_subdir,
+    safe_filename,
+)
+from backend.api import executors
+from backend.api.jobs import FINISHED, job_manager
+from backend.api.scheduler import ACCELERATOR, CPU, IO, request_tags
+
+router = APIRouter()
+
+
+class JobRequest(BaseModel):
+    # "background", "silhouette", "color_svg" or "potrace_color"
+    kind: str
+    image: str
+    settings: Optional[dict] = None
+    # background only, as for /api/background/process
+    model_type: str = "rembg"
+    model_name: str = "bria-rmbg"
+    mode: str = "base"
+    # potrace_color only: seconds the job may take once it starts running
+    deadline_seconds: Optional[float] = None
+
+
+# Where each job kind looks for its source image, in order; the same
+# lookup as the kind's synchronous route.
+_SOURCES = {
+    "background": ("input",),
+    "silhouette": ("background_removed", "input"),
+    "color_svg": ("input", "background_removed"),
+    "potrace_color": ("input", "background_removed"),
+}
+
+
+def _locate(kind: str, name: str) -> Path:
+    filename = safe_filename(name)
+    for source in _SOURCES[kind]:
+        folder = get_input_dir() if source == "input" else get_output_subdir(source)
+        if (folder / filename).exists():
+            return folder / filename
+    raise FileNotFoundError(f"Image not found: {filename}")
+
+
+def _run_background(req: dict, progress, cancel) -> dict:
+    from backend.background_remover.processor import BackgroundProcessor
+
+    processor = BackgroundProcessor()
+    processor.output_dir = get_output_subdir("background_removed")
+    output_path = processor.process(
+        _locate("background", req["image"]),
+        model_type=req["model_type"],
+        model_name=req["model_name"],
+        mode=req["mode"],
+        progress=progress,
+    )
+    return {"filename": output_path.name}
+
+
+def _run_silhouette(req: dict, progress, cancel) -> dict:
+    from backend.svg_converter.processor import SVGConverter
+
+    converter = SVGConverter()
+    converter.output_dir = get_output_subdir("silhouette")
+    output_path = converter.convert(
+        _locate("silhouette", req["image"]), settings=req["settings"], progress=progress
+    )
+    return {"filename": output_path.name}
+
+
+def _run_color_svg(req: dict, progress, cancel) -> dict:
+    from backend.color_svg_converter.processor import ColorSVGConverter
+
+    converter = ColorSVGConverter()
+    converter.output_dir = get_output_subdir("color_svg")
+    output_path = converter.convert(
+        _locate("color_svg", req["image"]),
+        settings=req["settings"],
+        pool=executors.process_pool(),
+        progress=progress,
+    )
+    return {"filename": output_path.name}
+
+
+def _run_potrace_color(req: dict, progress, cancel) -> dict:
+    from backend.potrace_color_converter.processor import PotraceColorConverter
+
+    converter = PotraceColorConverter()
+    converter.output_dir = get_output_subdir("color_svg")
+    output_path = converter.convert(
+        _locate("potrace_color", req["image"]),
+        settings=req["settings"],
+        progress=progress,
+        cancel=cancel,
+        deadline=req.get("deadline_seconds"),
+    )
+    return {"filename": output_path.name, "downgrades": converter.applied_downgrades}
+
+
+job_manager.register("background", ACCELERATOR, _run_background)
+job_manager.register("silhouette", CPU, _run_silhouette)
+job_manager.register("color_svg", CPU, _run_color_svg)
+job_manager.register("potrace_color", CPU, _run_potrace_color)
+
+
+@router.post("", status_code=202)
+async def submit_job(req: JobRequest, response: Response):
+    """Queue a background-removal or conversion job and return immediately
+    with its record (status "queued"). Poll GET /api/jobs/{id} or follow
+    GET /api/jobs/{id}/events for progress; the result holds the output
+    filename as the synchronous route would return it.
+
+    Unfinished jobs count towards the "jobs" admission limits; beyond them
+    the submission is rejected with 429 and Retry-After."""
+    if req.kind not in job_manager.kinds():
+        raise HTTPException(
+            status_code=400, detail=f"kind must be one of {job_manager.kinds()}"
+        )
+    if req.deadline_seconds is not None and req.deadline_seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be positive")
+    try:
+        await executors.run(IO, _locate, req.kind, req.image, slot=False)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        ticket = admission.admit("jobs")
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        )
+    try:
+        # Keep the scheduler tags with the job so they survive a restart.
+        priority, client = request_tags()
+        request = dict(req.model_dump(), priority=priority, client=client)
+
+        def on_finish(seconds):
+            # None: cancelled before it ran, so no service time to record.
+            ticket.cancel() if seconds is None else ticket.release(seconds)
+
+        job = await job_manager.submit(req.kind, request, on_finish=on_finish)
+    except BaseException:
+        ticket.cancel()
+        raise
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    return job
+
+
+@router.get("")
+async def list_jobs(limit: int = 50):
+    """Most recent jobs first."""
+    return await job_manager.recent(max(1, min(limit, 500)))
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Job status, current stage (with step/total for per-layer tracing),
+    result on success or error on failure."""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job. Queued jobs end at once; running
+    ones at their next stage boundary (potrace-color kills its Potrace
+    process immediately). The "done" event then reports status
+    "cancelled". Returns the job record as of now."""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if not await job_manager.cancel(job_id):
+        if job["status"] in FINISHED:
+            raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+        # Pre-forked workers only cancel the jobs they run themselves.
+        raise HTTPException(status_code=409, detail="Job is running in another worker process")
+    return await job_manager.get(job_id)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of a job: "status" and "progress" events
+    ({"stage", "step", "total"}) as they happen, ending with a "done" event
+    carrying the final job record. Events so far are replayed first, so
+    subscribing late is fine."""
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    async def stream():
+        async for item in job_manager.events(job_id):
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            event, data = item
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import json
+
+from backend.api.dependencies import (
+    get_input_dir,
+    get_output_subdir,
+    safe_filename,
+)
+from backend.api.pipeline import describe_ops, parse_recipe, run_many
+from backend.api.scheduler import BATCH, request_tags, tag_request
+
+router = APIRouter()
+
+
+class PipelineRequest(BaseModel):
+    recipe: dict
+    images: list[str]
+
+
+@router.get("/ops")
+async def list_ops():
+    """Recipe ops with their parameters' defaults (null where required)."""
+    return describe_ops()
+
+
+@router.post("/run")
+async def run_pipeline(req: PipelineRequest):
+    """Run a recipe (see backend/api/pipeline.py) on every image. Streams
+    NDJSON: one {"image", "steps": {step id: result}} line per input as it
+    completes, or {"image", "error"} if the input can't be read. A failing
+    step fails only itself and the steps reading its output."""
+    if not req.images:
+        raise HTTPException(status_code=400, detail="No images provided")
+    try:
+        steps = parse_recipe(req.recipe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    image_paths = []
+    for name in req.images:
+        filename = safe_filename(name)
+        image_path = get_input_dir() / filename
+        if not image_path.exists():
+            image_path = get_output_subdir("background_removed") / filename
+        # Missing files are passed through and reported as per-file errors.
+        image_paths.append(image_path)
+
+    # Bulk work goes in the batch lane unless the client asked for a priority.
+    priority, client = request_tags()
+
+    async def body():
+        tag_request(priority or BATCH, client)
+        async for result in run_many(steps, image_paths):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
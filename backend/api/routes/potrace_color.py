@@ -1,13 +1,22 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from pathlib import Path
 from typing import Optional
+import time
 
 from backend.api.dependencies import (
     get_input_dir,
     get_output_subdir,
     safe_filename,
-    processing_lock,
+    scheduler,
 )
+from backend.api import executors
+from backend.api.cancellation import cancellable, cancellable_stream
+from backend.api.coalesce import content_hash, settings_key, single_flight
+from backend.api.scheduler import CPU, IO, request_tags
+from backend.core.cancel import CancelToken
+from backend.potrace_color_converter.memory_budget import MemoryBudgetExceeded
 
 router = APIRouter()
 
@@ -15,6 +24,29 @@ router = APIRouter()
 class ConvertRequest(BaseModel):
     image: str
     settings: Optional[dict] = None
+    # Seconds the caller can wait, counted from when the request is received.
+    # Settings are downgraded to fit; see cost_model.fit_to_deadline.
+    deadline_seconds: Optional[float] = None
+
+
+def _resolve_image(name: str) -> Path:
+    """Find a source image in the input folder, then the background-removed outputs."""
+    filename = safe_filename(name)
+    image_path = get_input_dir() / filename
+    if not image_path.exists():
+        image_path = get_output_subdir("background_removed") / filename
+    if not image_path.exists():
+        raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
+    return image_path
+
+
+def _remaining(req: ConvertRequest, received: float) -> Optional[float]:
+    """What is left of the request's deadline, if it has one."""
+    if req.deadline_seconds is None:
+        return None
+    if req.deadline_seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be positive")
+    return max(0.0, req.deadline_seconds - (time.perf_counter() - received))
 
 
 @router.get("/check")
@@ -22,31 +54,148 @@ async def check_potrace_color():
     """Check if Potrace is available for the color-precision engine."""
     from backend.potrace_color_converter.processor import PotraceColorConverter
 
-    return {"available": PotraceColorConverter().check_potrace()}
+    converter = PotraceColorConverter()
+    return {"available": await executors.run(IO, converter.check_potrace, slot=False)}
+
+
+@router.get("/cost-model")
+async def potrace_color_cost_model():
+    """Per-stage seconds-per-unit rates used to fit conversions to deadlines."""
+    from backend.potrace_color_converter.cost_model import cost_model
+
+    return cost_model.stats()
+
+
+@router.get("/cache-stats")
+async def potrace_color_cache_stats():
+    """Hit/miss counters and size of the shared pipeline stage cache."""
+    from backend.potrace_color_converter.stage_cache import stage_cache
+
+    return stage_cache.stats()
 
 
 @router.post("/convert")
-async def convert_to_potrace_color(req: ConvertRequest):
+async def convert_to_potrace_color(req: ConvertRequest, request: Request):
     """Convert an image to a layered color SVG via AA-aware preprocessing +
     per-color Potrace tracing. Sources from the input folder first, then the
-    background-removed outputs."""
-    filename = safe_filename(req.image)
-    image_path = get_input_dir() / filename
-    if not image_path.exists():
-        image_path = get_output_subdir("background_removed") / filename
-    if not image_path.exists():
-        raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
+    background-removed outputs. Stops (killing Potrace) if the client
+    disconnects or the request is cancelled.
+
+    With deadline_seconds, settings are downgraded to what the cost model
+    estimates can finish in the time left once a CPU slot is free; the
+    changes are listed in downgrades."""
+    received = time.perf_counter()
+    _remaining(req, received)
+    image_path = _resolve_image(req.image)
+    cancel = CancelToken()
+
+    def convert():
+        try:
+            from backend.potrace_color_converter.processor import PotraceColorConverter
+
+            converter = PotraceColorConverter()
+            converter.output_dir = get_output_subdir("color_svg")
+            output_path = converter.convert(
+                image_path,
+                settings=req.settings,
+                cancel=cancel,
+                deadline=_remaining(req, received),
+            )
+        except MemoryBudgetExceeded as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Conversion failed: {e}")
+        return {
+            "filename": output_path.name,
+            "downgrades": converter.applied_downgrades,
+            "estimated_seconds": converter.estimated_seconds,
+        }
+
+    # Identical concurrent requests (double-clicks, retries) share one run.
+    digest = await executors.run(IO, content_hash, image_path, slot=False)
+    key = (
+        str(image_path.resolve()),
+        digest,
+        settings_key(req.settings),
+        req.deadline_seconds,
+    )
+    return await cancellable(
+        request,
+        single_flight.run(
+            "potrace_color", key, lambda: executors.run(CPU, convert, cancel=cancel)
+        ),
+    )
+
 
-    with processing_lock:
+@router.post("/convert-stream")
+async def convert_to_potrace_color_stream(req: ConvertRequest, request: Request):
+    """Streaming variant of /convert. Responds with the SVG itself over a
+    chunked response: the header immediately, then each color layer as soon
+    as it is traced (largest area first), so the client can render a
+    progressive preview. The finished file is saved like /convert; its name
+    is returned in the X-Output-Filename header. If the client disconnects
+    or the request is cancelled, queued or running work stops (killing
+    Potrace) and the stream ends early."""
+    received = time.perf_counter()
+    _remaining(req, received)
+    image_path = _resolve_image(req.image)
+    cancel = CancelToken()
+    priority, client = request_tags()
+
+    def start():
+        slot = scheduler.acquire(CPU, priority=priority, client=client, cancel=cancel)
         try:
             from backend.potrace_color_converter.processor import PotraceColorConverter
 
             converter = PotraceColorConverter()
             converter.output_dir = get_output_subdir("color_svg")
-            output_path = converter.convert(image_path, settings=req.settings)
+            output_path, chunks = converter.convert_stream(
+                image_path,
+                settings=req.settings,
+                deadline=_remaining(req, received),
+                cancel=cancel,
+            )
+        except MemoryBudgetExceeded as e:
+            slot.release()
+            raise HTTPException(status_code=413, detail=str(e))
         except RuntimeError as e:
+            slot.release()
             raise HTTPException(status_code=500, detail=str(e))
         except Exception as e:
+            slot.release()
             raise HTTPException(status_code=500, detail=f"Conversion failed: {e}")
 
-    return {"filename": output_path.name}
+        def body():
+            # The slot is held until the last layer is sent, or the stream
+            # is closed early.
+            try:
+                yield ""
+                yield from chunks
+            finally:
+                slot.release()
+
+        # Prime the generator past its empty first chunk, so its finally (the
+        # slot release) runs even if it is closed before streaming starts.
+        stream = body()
+        next(stream)
+        if cancel.cancelled:
+            stream.close()
+            cancel.check()
+        return converter, output_path, stream
+
+    # Waiting for the slot and validation both block; the layers themselves
+    # are produced on the cpu pool as the response is iterated.
+    converter, output_path, stream = await cancellable(
+        request, executors.run(CPU, start, slot=False, cancel=cancel)
+    )
+
+    return StreamingResponse(
+        cancellable_stream(request, stream, cancel, CPU),
+        media_type="image/svg+xml",
+        headers={
+            "X-Output-Filename": output_path.name,
+            "X-Downgrades": "; ".join(converter.applied_downgrades),
+        },
+    )
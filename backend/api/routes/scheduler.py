@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+
+from backend.api.cancellation import cancel_request
+from backend.api.coalesce import single_flight
+from backend.api.dependencies import scheduler
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def scheduler_stats():
+    """Per resource class: slot limit, active and queued requests, and queue
+    wait statistics since start, overall and per priority lane."""
+    return scheduler.stats()
+
+
+@router.get("/coalescing")
+async def coalescing_stats():
+    """Per engine: conversions computed, identical concurrent requests that
+    shared one of them (coalesced hits), and computations in flight."""
+    return single_flight.stats()
+
+
+@router.post("/requests/{request_id}/cancel")
+async def cancel_processing_request(request_id: str):
+    """Cancel an in-flight processing request by the X-Request-Id header it
+    was sent with. The request then ends with status 499."""
+    if not cancel_request(request_id):
+        raise HTTPException(status_code=404, detail=f"No request in flight: {request_id}")
+    return {"cancelled": request_id}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
 
@@ -6,8 +6,11 @@ from backend.api.dependencies import (
     get_input_dir,
     get_output_subdir,
     safe_filename,
-    processing_lock,
 )
+from backend.api import executors
+from backend.api.cancellation import cancellable
+from backend.api.coalesce import content_hash, settings_key, single_flight
+from backend.api.scheduler import CPU, IO
 
 router = APIRouter()
 
@@ -23,11 +26,11 @@ async def check_potrace():
     from backend.svg_converter.processor import SVGConverter
 
     converter = SVGConverter()
-    return {"available": converter._check_potrace()}
+    return {"available": await executors.run(IO, converter._check_potrace, slot=False)}
 
 
 @router.post("/convert")
-async def convert_to_svg(req: ConvertRequest):
+async def convert_to_svg(req: ConvertRequest, request: Request):
     """Convert an image with alpha to an SVG silhouette. Sources from the
     background-removed outputs first, then the input folder."""
     filename = safe_filename(req.image)
@@ -37,16 +40,22 @@ async def convert_to_svg(req: ConvertRequest):
     if not image_path.exists():
         raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
 
-    with processing_lock:
+    def convert():
         try:
             from backend.svg_converter.processor import SVGConverter
 
             converter = SVGConverter()
             converter.output_dir = get_output_subdir("silhouette")
-            output_path = converter.convert(image_path, settings=req.settings)
+            return converter.convert(image_path, settings=req.settings)
         except RuntimeError as e:
             raise HTTPException(status_code=500, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Conversion failed: {e}")
 
+    # Identical concurrent requests (double-clicks, retries) share one run.
+    digest = await executors.run(IO, content_hash, image_path, slot=False)
+    key = (str(image_path.resolve()), digest, settings_key(req.settings))
+    output_path = await cancellable(
+        request, single_flight.run("silhouette", key, lambda: executors.run(CPU, convert))
+    )
     return {"filename": output_path.name}
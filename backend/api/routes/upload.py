@@ -1,12 +1,27 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
+from pathlib import Path
 from PIL import Image
+from typing import Callable, List, Tuple
+import asyncio
 import io
+import json
+import os
+import threading
+import zipfile
 
+from backend.api import executors
 from backend.api.dependencies import get_input_dir, safe_filename
+from backend.api.scheduler import BATCH, IO, request_tags, tag_request
 from backend.core.image_utils import snap_image_to_grid
 
 router = APIRouter()
 
+# Largest file (or zip member, uncompressed) a bulk upload accepts.
+MAX_FILE_BYTES = int(float(os.getenv("UPLOAD_MAX_FILE_MB", "64")) * 1024 * 1024)
+# Files of one bulk upload decoded at a time (each also needs an io slot).
+BULK_CONCURRENCY = max(1, int(os.getenv("UPLOAD_BULK_CONCURRENCY", "8")))
+
 
 @router.post("/upload")
 async def upload_image(file: UploadFile = File(...)):
@@ -22,17 +37,128 @@ async def upload_image(file: UploadFile = File(...)):
 
     contents = await file.read()
 
+    def save():
+        try:
+            img = Image.open(io.BytesIO(contents))
+            img.load()
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+
+        try:
+            img = snap_image_to_grid(img)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        img.save(file_path)
+        return img.size
+
+    w, h = await executors.run(IO, save)
+    return {"filename": filename, "width": w, "height": h}
+
+
+def _is_zip(file: UploadFile) -> bool:
+    name = (file.filename or "").lower()
+    return name.endswith(".zip") or file.content_type in (
+        "application/zip",
+        "application/x-zip-compressed",
+    )
+
+
+def _zip_entries(file: UploadFile) -> List[Tuple[str, Callable[[], bytes]]]:
+    """(name, reader) for each image in an uploaded zip. Directories,
+    hidden files (macOS metadata included) and files without an image
+    extension are left out. Readers share the archive, so they take turns."""
+    archive = zipfile.ZipFile(file.file)
+    lock = threading.Lock()
+    extensions = Image.registered_extensions()
+    entries = []
+    for info in archive.infolist():
+        name = Path(info.filename).name
+        if info.is_dir() or name.startswith(".") or "__MACOSX/" in info.filename:
+            continue
+        if Path(name).suffix.lower() not in extensions:
+            continue
+
+        def read(info=info) -> bytes:
+            if info.file_size > MAX_FILE_BYTES:
+                raise ValueError(f"File too large (over {MAX_FILE_BYTES // 2**20} MB)")
+            with lock:
+                return archive.read(info)
+
+        entries.append((info.filename, read))
+    return entries
+
+
+def _file_entry(file: UploadFile) -> Tuple[str, Callable[[], bytes]]:
+    def read() -> bytes:
+        if file.size is not None and file.size > MAX_FILE_BYTES:
+            raise ValueError(f"File too large (over {MAX_FILE_BYTES // 2**20} MB)")
+        file.file.seek(0)
+        return file.file.read()
+
+    return file.filename or "upload.png", read
+
+
+def _ingest(filename: str, read: Callable[[], bytes]) -> dict:
+    """Decode, grid-snap and save one bulk upload file, as upload_image does."""
     try:
-        img = Image.open(io.BytesIO(contents))
+        img = Image.open(io.BytesIO(read()))
         img.load()
+    except ValueError:
+        raise
     except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image file")
+        raise ValueError("Invalid image file")
+    img = snap_image_to_grid(img)
+    img.save(get_input_dir() / filename)
+    return {"filename": filename, "width": img.width, "height": img.height}
 
-    try:
-        img = snap_image_to_grid(img)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
 
-    img.save(file_path)
-    w, h = img.size
-    return {"filename": filename, "width": w, "height": h}
+@router.post("/upload/bulk")
+async def upload_images(files: List[UploadFile] = File(...)):
+    """Upload many images at once, as image files and/or zip archives of
+    them. Each is decoded, grid-snapped and saved like /upload, several at
+    a time. Streams NDJSON: one {"image", "filename", "width", "height"}
+    or {"image", "error"} line per file as it completes. A bad file only
+    fails its own line; so does a second file with the same name."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    get_input_dir().mkdir(parents=True, exist_ok=True)
+
+    entries: List[Tuple[str, Callable[[], bytes]]] = []
+    for file in files:
+        if not _is_zip(file):
+            entries.append(_file_entry(file))
+            continue
+        try:
+            entries += await executors.run(IO, _zip_entries, file, slot=False)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"Invalid zip file: {file.filename}")
+
+    # Bulk work goes in the batch lane unless the client asked for a priority.
+    priority, client = request_tags()
+
+    async def body():
+        tag_request(priority or BATCH, client)
+        limit = asyncio.Semaphore(BULK_CONCURRENCY)
+        seen = set()
+
+        async def one(name: str, read: Callable[[], bytes]) -> dict:
+            filename = safe_filename(name)
+            if filename in seen:
+                return {"image": name, "error": f"Duplicate file name: {filename}"}
+            seen.add(filename)
+            async with limit:
+                try:
+                    return {"image": name, **await executors.run(IO, _ingest, filename, read)}
+                except Exception as e:
+                    return {"image": name, "error": str(e)}
+
+        tasks = [asyncio.ensure_future(one(name, read)) for name, read in entries]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
@@ -0,0 +1,401 @@
+"""Resource-class scheduler for processing work.
+
+Replaces the single global processing lock. Work is split into resource
+classes, each with its own concurrency limit and FIFO queue, so a long CPU
+vectorization no longer blocks background removal on the GPU (or the
+other way round):
+
+    accelerator  model inference (rembg / InSPyReNet)      SCHEDULER_ACCELERATOR_SLOTS, default 1
+    cpu          Potrace / VTracer vectorization            SCHEDULER_CPU_SLOTS, default min(4, CPUs)
+    io           light decode / encode / file work          SCHEDULER_IO_SLOTS, default 8
+
+Within a class, waiting requests are ordered by priority lane, then by
+weighted fair queuing across clients:
+
+    interactive   the default; always served before any queued batch work
+    batch         bulk work (e.g. /api/color-svg/convert-batch); only
+                  runs when no interactive request is waiting
+
+Each lane uses start-time fair queuing over client identities. A client's
+requests are spaced 1/weight apart in virtual time, so one client queueing
+hundreds of requests can't starve others in the same lane. Weights come
+from SCHEDULER_CLIENT_WEIGHTS ("name=weight,..."); the default is 1.
+Running work is never interrupted; "preempt" means jumping the queue.
+
+Requests are tagged by the X-Priority and X-Client-Id headers (client
+address if absent) via QueueWaitMiddleware, and jobs keep their tags.
+Time spent queued is recorded per request and per lane. It is returned
+in the X-Queue-Wait response header (seconds, summed over all slots the
+request took).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.core.cancel import CancelToken
+from backend.core.utils import cpu_budget
+
+load_dotenv()
+
+ACCELERATOR = "accelerator"
+CPU = "cpu"
+IO = "io"
+RESOURCE_CLASSES = (ACCELERATOR, CPU, IO)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Highest priority first.
+PRIORITIES = (INTERACTIVE, BATCH)
+DEFAULT_CLIENT = "anonymous"
+
+# Per-request list of queue waits, installed by QueueWaitMiddleware. Slots
+# append to the list (not replace the var), so waits recorded in worker
+# threads or child tasks that copied the context are still seen.
+_request_waits: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "request_waits", default=None
+)
+
+
+# Per-request (or per-job) priority lane and client identity; None means
+# not given, i.e. the caller's default.
+_request_priority: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_priority", default=None
+)
+_request_client: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_client", default=None
+)
+
+
+def tag_request(priority: Optional[str] = None, client: Optional[str] = None) -> None:
+    """Set the current context's priority lane and/or client identity."""
+    if priority is not None:
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {list(PRIORITIES)}")
+        _request_priority.set(priority)
+    if client is not None:
+        _request_client.set(client)
+
+
+def request_tags() -> Tuple[Optional[str], Optional[str]]:
+    """The current context's (priority, client), None where not tagged."""
+    return _request_priority.get(), _request_client.get()
+
+
+def request_queue_wait() -> float:
+    """Seconds the current request has spent waiting for slots so far."""
+    return sum(_request_waits.get() or ())
+
+
+class Slot:
+    """A held slot in a resource class. Release exactly once."""
+
+    def __init__(self, pool: "_ResourcePool", wait_seconds: float):
+        self._pool = pool
+        self.resource = pool.name
+        self.wait_seconds = wait_seconds
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._pool.release()
+
+
+class _Waiter:
+    __slots__ = ("priority", "client", "start_tag", "seq")
+
+    def __init__(self, priority: str, client: str, start_tag: float, seq: int):
+        self.priority = priority
+        self.client = client
+        self.start_tag = start_tag
+        self.seq = seq
+
+
+class _WaitStats:
+    def __init__(self):
+        self.acquired = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, wait: float) -> None:
+        self.acquired += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "acquired": self.acquired,
+            "mean_wait_seconds": round(self.total / self.acquired, 4) if self.acquired else 0.0,
+            "max_wait_seconds": round(self.max, 4),
+        }
+
+
+class _ResourcePool:
+    """Counting slot pool. Waiters are served by priority lane, then by
+    start-time fair queuing across clients within the lane."""
+
+    def __init__(self, name: str, limit: int, weights: Dict[str, float]):
+        self.name = name
+        self.limit = max(1, limit)
+        self._weights = weights
+        self._active = 0
+        self._waiting: List[_Waiter] = []
+        self._seq = 0
+        # Per lane: virtual time, and each client's last finish tag.
+        self._virtual = {p: 0.0 for p in PRIORITIES}
+        self._finish: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITIES}
+        self._cond = threading.Condition()
+        self._stats = _WaitStats()
+        self._lane_stats = {p: _WaitStats() for p in PRIORITIES}
+
+    def _enqueue(self, priority: str, client: str) -> _Waiter:
+        # Call with the condition held.
+        finish = self._finish[priority]
+        start_tag = max(self._virtual[priority], finish.get(client, 0.0))
+        finish[client] = start_tag + 1.0 / self._weights.get(client, 1.0)
+        self._seq += 1
+        waiter = _Waiter(priority, client, start_tag, self._seq)
+        self._waiting.append(waiter)
+        return waiter
+
+    def _next(self) -> _Waiter:
+        # Call with the condition held and at least one waiter.
+        return min(
+            self._waiting,
+            key=lambda w: (PRIORITIES.index(w.priority), w.start_tag, w.seq),
+        )
+
+    def _wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def acquire(
+        self,
+        priority: str,
+        client: str,
+        since: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Slot:
+        start = time.perf_counter() if since is None else since
+        unregister = cancel.add_callback(self._wake) if cancel is not None else None
+        try:
+            return self._acquire(priority, client, start, cancel)
+        finally:
+            if unregister is not None:
+                unregister()
+
+    def _acquire(
+        self, priority: str, client: str, start: float, cancel: Optional[CancelToken]
+    ) -> Slot:
+        with self._cond:
+            waiter = self._enqueue(priority, client)
+            while self._active >= self.limit or self._next() is not waiter:
+                if cancel is not None and cancel.cancelled:
+                    # Leave the queue without ever taking a slot.
+                    self._waiting.remove(waiter)
+                    self._cond.notify_all()
+                    cancel.check()
+                self._cond.wait()
+            self._waiting.remove(waiter)
+            self._active += 1
+            self._virtual[priority] = waiter.start_tag
+            if not any(w.priority == priority for w in self._waiting):
+                # Lane drained: forget finish tags so returning clients
+                # don't carry debt from an earlier busy period.
+                self._finish[priority].clear()
+            wait = time.perf_counter() - start
+            self._stats.add(wait)
+            self._lane_stats[priority].add(wait)
+            # The next waiter may also fit if more than one slot is free.
+            self._cond.notify_all()
+        return Slot(self, wait)
+
+    def acquire_free(self, priority: str, most: int) -> List[Slot]:
+        """Take up to most slots that are free now, without waiting. None
+        while anyone is queued: this never jumps the queue."""
+        with self._cond:
+            if self._waiting:
+                return []
+            count = max(0, min(most, self.limit - self._active))
+            self._active += count
+            for _ in range(count):
+                self._stats.add(0.0)
+                self._lane_stats[priority].add(0.0)
+        return [Slot(self, 0.0) for _ in range(count)]
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            lanes = {}
+            for priority in PRIORITIES:
+                queued = [w for w in self._waiting if w.priority == priority]
+                lanes[priority] = {
+                    "queued": len(queued),
+                    "queued_clients": len({w.client for w in queued}),
+                    **self._lane_stats[priority].as_dict(),
+                }
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "queued": len(self._waiting),
+                **self._stats.as_dict(),
+                "lanes": lanes,
+            }
+
+
+class Scheduler:
+    def __init__(self, limits: Dict[str, int], weights: Optional[Dict[str, float]] = None):
+        weights = weights or {}
+        self._pools = {
+            name: _ResourcePool(name, limit, weights) for name, limit in limits.items()
+        }
+
+    def acquire(
+        self,
+        resource: str,
+        since: Optional[float] = None,
+        priority: Optional[str] = None,
+        client: Optional[str] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Slot:
+        """Block until this request's turn for a slot in the resource class.
+        The caller must release() the returned slot; prefer slot() where a
+        with-block fits.
+
+        since: time.perf_counter() value the request started queueing at, if
+        earlier than this call (e.g. when it was submitted to an executor).
+        priority, client: override the request's tags (see tag_request);
+        untagged requests are interactive and anonymous.
+        cancel: if cancelled while waiting, leave the queue and raise Cancelled.
+        """
+        pool = self._pools.get(resource)
+        if pool is None:
+            raise ValueError(f"Unknown resource class: {resource}")
+        priority = priority or _request_priority.get() or INTERACTIVE
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {list(PRIORITIES)}")
+        client = client or _request_client.get() or DEFAULT_CLIENT
+        held = pool.acquire(priority, client, since, cancel)
+        waits = _request_waits.get()
+        if waits is not None:
+            waits.append(held.wait_seconds)
+        return held
+
+    def acquire_free(
+        self, resource: str, most: int, priority: Optional[str] = None
+    ) -> List[Slot]:
+        """Take up to most more slots of the resource class, only those
+        free right now and only if nobody is queued for one. For work that
+        can use extra parallelism but shouldn't wait for it. The caller must
+        release() each returned slot."""
+        priority = priority or _request_priority.get() or INTERACTIVE
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {list(PRIORITIES)}")
+        return self._pools[resource].acquire_free(priority, most)
+
+    @contextmanager
+    def slot(
+        self,
+        resource: str,
+        since: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Iterator[Slot]:
+        held = self.acquire(resource, since, cancel=cancel)
+        try:
+            yield held
+        finally:
+            held.release()
+
+    def limit(self, resource: str) -> int:
+        return self._pools[resource].limit
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+
+def _limit(env: str, default: int) -> int:
+    return int(os.getenv(env, str(default)))
+
+
+def client_weights() -> Dict[str, float]:
+    """Parse SCHEDULER_CLIENT_WEIGHTS, e.g. "wizard=4,nightly=1"."""
+    weights = {}
+    for item in os.getenv("SCHEDULER_CLIENT_WEIGHTS", "").split(","):
+        if "=" in item:
+            name, weight = item.split("=", 1)
+            weights[name.strip()] = max(0.01, float(weight))
+    return weights
+
+
+def default_limits() -> Dict[str, int]:
+    return {
+        ACCELERATOR: _limit("SCHEDULER_ACCELERATOR_SLOTS", 1),
+        CPU: _limit("SCHEDULER_CPU_SLOTS", min(4, cpu_budget())),
+        IO: _limit("SCHEDULER_IO_SLOTS", 8),
+    }
+
+
+class QueueWaitMiddleware:
+    """ASGI middleware tagging each HTTP request with its priority lane
+    (X-Priority) and client identity (X-Client-Id, else the client address),
+    and adding X-Queue-Wait (seconds spent waiting for scheduler slots) to
+    every response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        priority = headers.get(b"x-priority", b"").decode("latin-1").strip().lower() or None
+        if priority is not None and priority not in PRIORITIES:
+            await send_error(send, 400, f"X-Priority must be one of {list(PRIORITIES)}")
+            return
+        client = headers.get(b"x-client-id", b"").decode("latin-1").strip() or None
+        if client is None and scope.get("client"):
+            client = scope["client"][0]
+
+        waits: List[float] = []
+        token = _request_waits.set(waits)
+        priority_token = _request_priority.set(priority)
+        client_token = _request_client.set(client)
+
+        async def send_with_wait(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-queue-wait", f"{sum(waits):.4f}".encode("ascii")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_wait)
+        finally:
+            _request_client.reset(client_token)
+            _request_priority.reset(priority_token)
+            _request_waits.reset(token)
+
+
+async def send_error(send, status: int, detail: str, headers: Dict[str, str] = None) -> None:
+    """Send a FastAPI-style {"detail": ...} error response from ASGI middleware."""
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    raw_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("ascii")),
+    ]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
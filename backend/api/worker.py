@@ -0,0 +1,207 @@
+"""Standalone job worker.
+
+With JOBS_DISPATCH=broker the API only enqueues jobs in the job store
+(see job_store.py). Workers run them:
+
+    python -m backend.api.worker [--kinds potrace_color,color_svg]
+
+A worker claims jobs under a lease of JOBS_LEASE_SECONDS (default 60) and
+heartbeats every third of it. Each job runs in a slot of its resource
+class's scheduler (SCHEDULER_*_SLOTS), so one worker per machine is
+enough. The worker claims up to JOBS_WORKER_PREFETCH more jobs per class
+than it has slots (default: as many as it has slots). These wait for a
+slot in the worker's scheduler, ordered by the priority lane and client
+stored with each job, as in the API. The broker only orders claims
+interactive first, then oldest first. Input images and outputs are
+looked up as by the API, so API and workers must share INPUT_DIR and
+OUTPUT_DIR.
+
+A cancel request reaches a running job at its next heartbeat. On SIGTERM
+or SIGINT the worker cancels its running jobs and hands them back to the
+queue; if it dies instead, its leases run out and the jobs are claimed
+again by another worker (up to JOBS_MAX_ATTEMPTS runs in all).
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from backend.api.dependencies import scheduler
+from backend.api.job_store import CANCELLED, FAILED, SUCCEEDED
+from backend.api.jobs import _error_message, job_manager
+from backend.api.scheduler import RESOURCE_CLASSES
+from backend.core.cancel import Cancelled, CancelToken
+
+load_dotenv()
+
+# Seconds between claim attempts while the queue is empty.
+IDLE_POLL_SECONDS = 1.0
+
+
+def lease_seconds() -> float:
+    return float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+
+
+def prefetch(resource: str) -> int:
+    default = scheduler.limit(resource)
+    return max(0, int(os.getenv("JOBS_WORKER_PREFETCH", str(default))))
+
+
+class _Running:
+    """A job this worker holds, and why its token was cancelled."""
+
+    def __init__(self):
+        self.cancel = CancelToken()
+        # "lost": the lease ran out or was taken over; "cancel": cancel
+        # requested; "shutdown": the worker is stopping.
+        self.reason: Optional[str] = None
+
+    def stop(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+        self.cancel.cancel()
+
+
+class Worker:
+    def __init__(self, kinds: List[str], worker_id: Optional[str] = None):
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        )
+        self.store = job_manager.store
+        self.lease = lease_seconds()
+        # Kinds this worker runs, by the resource class they run in.
+        self.kinds: Dict[str, List[str]] = {}
+        for kind in kinds:
+            self.kinds.setdefault(job_manager.kind(kind).resource, []).append(kind)
+        self._running: Dict[str, _Running] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        threads = [threading.Thread(target=self._heartbeat, daemon=True)]
+        for resource in RESOURCE_CLASSES:
+            if resource not in self.kinds:
+                continue
+            for _ in range(scheduler.limit(resource) + prefetch(resource)):
+                threads.append(threading.Thread(target=self._loop, args=(resource,)))
+        print(
+            f"Worker {self.worker_id}: "
+            + ", ".join(
+                f"{resource} x{scheduler.limit(resource)} ({', '.join(kinds)})"
+                for resource, kinds in self.kinds.items()
+            )
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads[1:]:
+            thread.join()
+
+    def stop(self) -> None:
+        """Stop claiming; cancel running jobs and hand them back."""
+        self._stopping.set()
+        with self._lock:
+            running = list(self._running.values())
+        for job in running:
+            job.stop("shutdown")
+
+    def _loop(self, resource: str) -> None:
+        kinds = self.kinds[resource]
+        while not self._stopping.is_set():
+            job = self.store.claim(kinds, self.worker_id, self.lease)
+            if job is None:
+                self._stopping.wait(IDLE_POLL_SECONDS)
+                continue
+            self._execute(job)
+
+    def _execute(self, job: dict) -> None:
+        job_id = job["id"]
+        running = _Running()
+        with self._lock:
+            self._running[job_id] = running
+        if self._stopping.is_set():
+            running.stop("shutdown")
+
+        def progress(stage: str, step: Optional[int] = None, total: Optional[int] = None) -> None:
+            if running.reason != "lost":
+                self.store.update(job_id, stage=stage, step=step, total=total)
+
+        spec = job_manager.kind(job["kind"])
+        request = job["request"]
+        outcome: Dict[str, object]
+        try:
+            slot = scheduler.acquire(
+                spec.resource,
+                priority=request.get("priority"),
+                client=request.get("client"),
+                cancel=running.cancel,
+            )
+            try:
+                result = spec.runner(request, progress, running.cancel)
+            finally:
+                slot.release()
+        except Cancelled:
+            outcome = {"status": CANCELLED}
+        except Exception as e:
+            outcome = {"status": FAILED, "error": _error_message(e)}
+        else:
+            outcome = {"status": SUCCEEDED, "result": result}
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+
+        if running.reason == "lost":
+            # Someone else owns the job now; leave its record alone.
+            print(f"Lost the lease on job {job_id}")
+        elif running.reason == "shutdown" and outcome["status"] == CANCELLED:
+            self.store.release(job_id, self.worker_id)
+        else:
+            self.store.finish(job_id, self.worker_id, **outcome)
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(self.lease / 3)
+            with self._lock:
+                running = list(self._running.items())
+            for job_id, job in running:
+                try:
+                    if not self.store.heartbeat(job_id, self.worker_id, self.lease):
+                        job.stop("lost")
+                    elif self.store.cancel_requested(job_id):
+                        job.stop("cancel")
+                except Exception as e:
+                    # Broker briefly unreachable: retry next beat. The lease
+                    # outlasts two missed beats.
+                    print(f"Heartbeat for job {job_id} failed: {e}")
+
+
+def main() -> None:
+    """Run a worker until SIGTERM or SIGINT."""
+    # Registers the job kinds' runners.
+    import backend.api.routes.jobs  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Run queued jobs from the job broker.")
+    parser.add_argument(
+        "--kinds",
+        default=os.getenv("JOBS_WORKER_KINDS", ""),
+        help="comma-separated job kinds to run (default: all)",
+    )
+    args = parser.parse_args()
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()] or job_manager.kinds()
+    unknown = sorted(set(kinds) - set(job_manager.kinds()))
+    if unknown:
+        parser.error(f"unknown job kinds {unknown}; expected some of {job_manager.kinds()}")
+
+    worker = Worker(kinds)
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Process-wide cache of loaded background-removal models.
+
+Loading is the expensive part of a background removal: rembg reads and
+initialises an ONNX session, and InSPyReNet JIT-traces its network. Each
+model is loaded once per process on first use and reused afterwards.
+preload() loads a list of models up front, so a pre-forked server (see
+backend/api/prefork.py) can load them once in its parent and share the
+weights with every worker.
+"""
+import ctypes
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+# _lock guards the two dicts only; a model loads under its own key's lock,
+# so loading one model doesn't block requests for models already loaded.
+_lock = threading.Lock()
+_models: Dict[Tuple[str, str], Any] = {}
+_load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+
+def _load(model_type: str, name: str) -> Any:
+    if model_type == "rembg":
+        import rembg
+
+        return rembg.new_session(name)
+    if model_type == "inspyrenet":
+        from transparent_background import Remover
+
+        return Remover(mode=name, jit=True)
+    raise ValueError(f"Unknown model_type: {model_type}")
+
+
+def get_model(model_type: str, name: str) -> Any:
+    """The rembg session (name = model name) or InSPyReNet Remover (name =
+    mode) for a model, loading it on first use."""
+    key = (model_type, name)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    # Concurrent first requests for the same model wait for one load instead
+    # of each loading a copy.
+    with load_lock:
+        with _lock:
+            model = _models.get(key)
+        if model is None:
+            model = _load(model_type, name)
+            with _lock:
+                _models[key] = model
+        return model
+
+
+def parse_specs(specs: str) -> List[Tuple[str, str]]:
+    """Parse "rembg:bria-rmbg,inspyrenet:base" into (model_type, name) pairs."""
+    parsed = []
+    for item in specs.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model_type, _, name = item.partition(":")
+        if model_type not in ("rembg", "inspyrenet") or not name:
+            raise ValueError(
+                f"Invalid model spec {item!r}; expected rembg:<model> or inspyrenet:<mode>"
+            )
+        parsed.append((model_type, name))
+    return parsed
+
+
+def preload(models: Iterable[Tuple[str, str]]) -> List[str]:
+    """Load models now. Returns the ones loaded, as "type:name"."""
+    loaded = []
+    for model_type, name in models:
+        get_model(model_type, name)
+        loaded.append(f"{model_type}:{name}")
+    return loaded
+
+
+def loaded() -> List[str]:
+    with _lock:
+        return [f"{model_type}:{name}" for model_type, name in _models]
+
+
+def cuda_available() -> bool:
+    """Whether a CUDA device is present and visible, so either backend would
+    put models on it. CUDA state does not survive fork, so such models must
+    be loaded after forking.
+
+    Devices are counted through NVML, which creates no CUDA context in this
+    process. onnxruntime-gpu's provider list is no guide: it names
+    CUDAExecutionProvider whether or not the host has a GPU.
+    """
+    visible = os.getenv("CUDA_VISIBLE_DEVICES")
+    if visible is not None and visible.strip() in ("", "-1"):
+        return False
+    return _nvml_device_count() > 0
+
+
+def _nvml_device_count() -> int:
+    """Number of NVIDIA GPUs per the driver's NVML library; 0 without one."""
+    try:
+        nvml = ctypes.CDLL("nvml.dll" if os.name == "nt" else "libnvidia-ml.so.1")
+    except OSError:
+        return 0
+    if nvml.nvmlInit_v2() != 0:
+        return 0
+    try:
+        count = ctypes.c_uint(0)
+        if nvml.nvmlDeviceGetCount_v2(ctypes.byref(count)) != 0:
+            return 0
+        return count.value
+    finally:
+        nvml.nvmlShutdown()
@@ -8,7 +8,8 @@ import numpy as np
 import rembg.sessions
 from transparent_background import Remover
 from typing import Optional
-from backend.core.utils import loading_animation
+from backend.background_remover.models import get_model
+from backend.core.utils import ProgressCallback, loading_animation, progress_or_noop
 
 warnings.filterwarnings("ignore", category=UserWarning, module="torch")
 warnings.filterwarnings("ignore", category=UserWarning, module="transparent_background")
@@ -178,7 +179,14 @@ class BackgroundProcessor:
             print(f"Error: Model not available locally. {e}")
             print("Choose a different model or download this model first.")
 
-    def process(self, image_path: Path, model_type: str, model_name: str = "bria-rmbg", mode: str = "base") -> Path:
+    def process(
+        self,
+        image_path: Path,
+        model_type: str,
+        model_name: str = "bria-rmbg",
+        mode: str = "base",
+        progress: Optional[ProgressCallback] = None,
+    ) -> Path:
         """Programmatic API for background removal. Returns output file path.
 
         Args:
@@ -186,41 +194,60 @@ class BackgroundProcessor:
             model_type: "rembg" or "inspyrenet"
             model_name: rembg model name (ignored for inspyrenet)
             mode: "base" or "fast" (only for inspyrenet)
+            progress: Optional hook called as each stage starts (decode, infer, save)
         """
+        progress = progress_or_noop(progress)
+        if model_type not in ("rembg", "inspyrenet"):
+            raise ValueError(f"Unknown model_type: {model_type}")
+        progress("decode")
+        with Image.open(image_path) as input_image:
+            input_image.load()
+            progress("infer")
+            output_image = self.remove_background(input_image, model_type, model_name, mode)
+
+        progress("save")
+        output_path = self.output_dir / self.output_filename(
+            image_path.stem, model_type, model_name, mode
+        )
+        output_image.save(output_path)
+        return output_path
+
+    def remove_background(
+        self,
+        image: Image.Image,
+        model_type: str,
+        model_name: str = "bria-rmbg",
+        mode: str = "base",
+    ) -> Image.Image:
+        """Same as process, for an already-decoded image. Returns the RGBA
+        cutout without saving it."""
         if model_type == "rembg":
-            input_image = Image.open(image_path)
-            session = rembg.new_session(model_name)
-            result = rembg.remove(input_image, session=session)
+            session = get_model("rembg", model_name)
+            result = rembg.remove(image, session=session)
 
             if isinstance(result, Image.Image):
-                output_image = result
-            else:
-                output_image = (
-                    Image.fromarray(result)
-                    if isinstance(result, np.ndarray)
-                    else Image.open(io.BytesIO(result))
-                )
-
-            output_filename = f"{image_path.stem}_rembg_{model_name}.png"
-            output_path = self.output_dir / output_filename
-            output_image.save(output_path)
-            return output_path
+                return result
+            return (
+                Image.fromarray(result)
+                if isinstance(result, np.ndarray)
+                else Image.open(io.BytesIO(result))
+            )
 
         elif model_type == "inspyrenet":
-            input_image = Image.open(image_path).convert("RGB")
-            input_array = np.array(input_image)
-            remover = Remover(mode=mode, jit=True)
-            output_array = remover.process(input_array, type="rgba")
-            output_image = Image.fromarray(output_array)
-
-            output_filename = f"{image_path.stem}_inspyrenet_{mode}.png"
-            output_path = self.output_dir / output_filename
-            output_image.save(output_path)
-            return output_path
+            input_array = np.array(image.convert("RGB"))
+            remover = get_model("inspyrenet", mode)
+            return Image.fromarray(remover.process(input_array, type="rgba"))
 
         else:
             raise ValueError(f"Unknown model_type: {model_type}")
 
+    @staticmethod
+    def output_filename(stem: str, model_type: str, model_name: str, mode: str) -> str:
+        """Name process() saves a cutout of <stem> under."""
+        if model_type == "rembg":
+            return f"{stem}_rembg_{model_name}.png"
+        return f"{stem}_inspyrenet_{mode}.png"
+
     def _process_with_inspyrenet(self, image_path: Path):
         """Process image using InSPyReNet (transparent-background) - locally installed"""
         print("\n=== InSPyReNet Options ===")
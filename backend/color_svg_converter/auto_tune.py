@@ -0,0 +1,275 @@
+"""Budget-driven search over VTracer parameters.
+
+Finds high-fidelity ColorSVGSettings whose output stays under a path count
+and/or byte budget. The full grid is far too large to convert exhaustively,
+so the search is a greedy descent: starting from the highest-fidelity
+settings, every one-step downgrade of a single parameter is converted
+concurrently and the one that cuts the output most per unit of fidelity lost
+is kept. The descent runs on a cheap downscaled preview; the settings it
+visits are then converted at full size, highest fidelity first, until one
+meets the budget.
+"""
+import io
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from backend.core.utils import cpu_budget
+
+# Search grid, each list ordered from highest to lowest fidelity.
+FILTER_SPECKLE = [2, 4, 8, 16, 32, 64]
+COLOR_PRECISION = [8, 7, 6, 5, 4, 3]
+LAYER_DIFFERENCE = [8, 16, 32, 64, 128]
+PATH_PRECISION = [8, 4, 2]
+
+# Relative importance of each parameter to visual fidelity. Color palette
+# parameters dominate; path_precision only affects sub-pixel accuracy.
+_WEIGHTS = {
+    "color_precision": 3.0,
+    "layer_difference": 3.0,
+    "filter_speckle": 2.0,
+    "path_precision": 1.0,
+}
+_GRID = {
+    "filter_speckle": FILTER_SPECKLE,
+    "color_precision": COLOR_PRECISION,
+    "layer_difference": LAYER_DIFFERENCE,
+    "path_precision": PATH_PRECISION,
+}
+
+PREVIEW_MAX_SIDE = 256
+# Preview numbers are only an estimate of full-size output: full-size checks
+# start once the preview is within this factor of the budget, and the
+# descent keeps going until it is this factor under it.
+PREVIEW_MARGIN = 1.5
+MAX_FULL_EVALUATIONS = 12
+
+
+def fidelity(candidate: Dict[str, Any]) -> float:
+    """Score in [0, 1]: 1 = every parameter at its highest-fidelity grid value."""
+    total = 0.0
+    for name, weight in _WEIGHTS.items():
+        values = _GRID[name]
+        rank = values.index(candidate[name]) if candidate[name] in values else 0
+        total += weight * (1.0 - rank / (len(values) - 1))
+    return total / sum(_WEIGHTS.values())
+
+
+def count_paths(svg: str) -> int:
+    return svg.count("<path")
+
+
+def _measure(job: Tuple[bytes, Dict[str, Any]]) -> Tuple[bool, int, int, str]:
+    """Worker: convert and measure. Returns (ok, paths, bytes, svg or error)."""
+    from backend.color_svg_converter.processor import _vtracer_svg
+
+    data, settings = job
+    try:
+        svg = _vtracer_svg(data, "png", settings)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException as e:
+        return False, 0, 0, str(e) or type(e).__name__
+    return True, count_paths(svg), len(svg.encode("utf-8")), svg
+
+
+def _png_bytes(image: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, "PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def _overshoot(paths: int, size: int, max_paths: Optional[int], max_bytes: Optional[int]) -> float:
+    """Largest ratio of a measurement to its budget (<= 1.0 means it fits)."""
+    ratios = []
+    if max_paths is not None:
+        ratios.append(paths / max(1, max_paths))
+    if max_bytes is not None:
+        ratios.append(size / max(1, max_bytes))
+    return max(ratios)
+
+
+def _measure_all(
+    pool: Executor, jobs: List[Tuple[bytes, Dict[str, Any]]], workers: int
+) -> List[Tuple[bool, int, int, str]]:
+    """_measure each job, at most `workers` at a time."""
+    results: List[Tuple[bool, int, int, str]] = []
+    for start in range(0, len(jobs), workers):
+        results += pool.map(_measure, jobs[start : start + workers])
+    return results
+
+
+def _downgrades(candidate: Dict[str, Any], searched: List[str]) -> List[Dict[str, Any]]:
+    """All candidates one grid step lower in fidelity on a single parameter."""
+    steps = []
+    for name in searched:
+        values = _GRID[name]
+        rank = values.index(candidate[name])
+        if rank + 1 < len(values):
+            steps.append(dict(candidate, **{name: values[rank + 1]}))
+    return steps
+
+
+def auto_tune(
+    image: Image.Image,
+    base_settings: Dict[str, Any],
+    max_paths: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    pool: Optional[Executor] = None,
+) -> Dict[str, Any]:
+    """Search VTracer settings for the highest-fidelity result within budget.
+
+    Args:
+        image: Source image (converted to RGBA).
+        base_settings: Complete VTracer settings; the searched parameters are
+            overridden, everything else (mode, hierarchical, ...) is kept.
+        max_paths: Maximum number of <path> elements, or None.
+        max_bytes: Maximum SVG size in bytes, or None.
+        max_workers: Conversions run at once; defaults to one per CPU.
+        pool: Optional process pool to convert in. Without one, a pool of
+            max_workers spawned (not forked) processes is started for the
+            call.
+
+    Returns:
+        Dict with "svg", "settings" (the full chosen settings), "paths",
+        "bytes", "fidelity", "met_budget" and "evaluated" (preview, full)
+        counts. When nothing meets the budget, the smallest full-size result
+        seen is returned with met_budget False.
+    """
+    if max_paths is None and max_bytes is None:
+        raise ValueError("auto_tune needs max_paths and/or max_bytes")
+
+    image = image.convert("RGBA")
+    full_data = _png_bytes(image)
+    scale = min(1.0, PREVIEW_MAX_SIDE / max(image.size))
+    preview = image
+    if scale < 1.0:
+        # Not LANCZOS: its ringing around hard edges turns into hundreds of
+        # spurious fragment paths on flat-color artwork.
+        preview = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.BILINEAR,
+        )
+    preview_data = _png_bytes(preview)
+
+    # path_precision doesn't change the shapes, only the byte size, so it is
+    # only searched when there is a byte budget.
+    searched = ["filter_speckle", "color_precision", "layer_difference"]
+    start = dict(base_settings, **{name: values[0] for name, values in _GRID.items()})
+    if max_bytes is not None:
+        searched.append("path_precision")
+    else:
+        start["path_precision"] = base_settings["path_precision"]
+
+    def preview_job(candidate: Dict[str, Any]) -> Tuple[bytes, Dict[str, Any]]:
+        # filter_speckle is an area in pixels, so it shrinks with the preview.
+        speckle = max(1, round(candidate["filter_speckle"] * scale * scale))
+        return preview_data, dict(candidate, filter_speckle=speckle)
+
+    def preview_overshoot(paths: int, size: int) -> float:
+        # Byte size scales roughly with outline length, i.e. linearly.
+        return _overshoot(paths, round(size / scale), max_paths, max_bytes)
+
+    workers = max_workers or cpu_budget()
+    preview_evaluated = 0
+    full_evaluated = 0
+    best_fallback = None
+    own_pool = pool is None
+    if own_pool:
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    try:
+        ok, paths, size, error = pool.submit(_measure, preview_job(start)).result()
+        preview_evaluated += 1
+        if not ok:
+            raise RuntimeError(f"VTracer conversion failed: {error}")
+        # trail: settings visited by the descent with their preview overshoot.
+        trail = [(start, preview_overshoot(paths, size))]
+        checked = 0
+        # Full-size overshoot / preview overshoot, learned from full checks.
+        bias = 1.0
+
+        while True:
+            # 1. Greedy descent on the preview until the (bias-corrected)
+            # estimate fits.
+            goal = 1.0 / bias
+            current, current_over = trail[-1]
+            while current_over > goal:
+                steps = _downgrades(current, searched)
+                if not steps:
+                    break
+                results = _measure_all(pool, [preview_job(c) for c in steps], workers)
+                preview_evaluated += len(steps)
+                fitting, best = None, None
+                for candidate, (ok, paths, size, _) in zip(steps, results):
+                    if not ok:
+                        continue
+                    over = preview_overshoot(paths, size)
+                    if over <= goal:
+                        if fitting is None or fidelity(candidate) > fidelity(fitting[0]):
+                            fitting = (candidate, over)
+                        continue
+                    lost = max(1e-6, fidelity(current) - fidelity(candidate))
+                    gain = (current_over - over) / lost
+                    if best is None or gain > best[0]:
+                        best = (gain, candidate, over)
+                if fitting is not None:
+                    current, current_over = fitting
+                elif best is not None:
+                    _, current, current_over = best
+                else:
+                    break
+                trail.append((current, current_over))
+
+            # 2. Full-size check of the unchecked trail, highest fidelity
+            # first, starting where the preview estimate gets close.
+            pending = [
+                i for i in range(checked, len(trail))
+                if trail[i][1] * bias <= PREVIEW_MARGIN or i == len(trail) - 1
+            ]
+            pending = pending[: MAX_FULL_EVALUATIONS - full_evaluated]
+            last_over = None
+            for batch_start in range(0, len(pending), workers):
+                batch = pending[batch_start : batch_start + workers]
+                results = _measure_all(pool, [(full_data, trail[i][0]) for i in batch], workers)
+                full_evaluated += len(batch)
+                for i, (ok, paths, size, svg) in zip(batch, results):
+                    if not ok:
+                        continue
+                    candidate = trail[i][0]
+                    over = _overshoot(paths, size, max_paths, max_bytes)
+                    result = {
+                        "svg": svg,
+                        "settings": candidate,
+                        "paths": paths,
+                        "bytes": size,
+                        "fidelity": round(fidelity(candidate), 3),
+                        "met_budget": over <= 1.0,
+                        "evaluated": {"preview": preview_evaluated, "full": full_evaluated},
+                    }
+                    if result["met_budget"]:
+                        return result
+                    if best_fallback is None or size < best_fallback["bytes"]:
+                        best_fallback = result
+                    last_over = (over, trail[i][1])
+            checked = len(trail)
+
+            exhausted = not _downgrades(trail[-1][0], searched)
+            if exhausted or full_evaluated >= MAX_FULL_EVALUATIONS or last_over is None:
+                break
+            # The preview underestimated full-size output: recalibrate and
+            # keep descending from the last visited settings.
+            full_over, preview_over = last_over
+            bias = max(bias * 1.25, full_over / max(1e-6, preview_over))
+    finally:
+        if own_pool:
+            pool.shutdown(cancel_futures=True)
+
+    if best_fallback is None:
+        raise RuntimeError("VTracer conversion failed for every candidate")
+    best_fallback["evaluated"] = {"preview": preview_evaluated, "full": full_evaluated}
+    return best_fallback
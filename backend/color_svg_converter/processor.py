@@ -1,5 +1,14 @@
+import io
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from backend.core.utils import ProgressCallback, cpu_budget, progress_or_noop
 
 try:
     import vtracer
@@ -8,6 +17,10 @@ except ImportError:
     _VTRACER_AVAILABLE = False
 
 
+# Longest side of the thumbnail the pre-pass palette is fitted on.
+_PALETTE_FIT_SIDE = 256
+
+
 class ColorSVGConverter:
     def __init__(self):
         self.project_root = Path(__file__).parent.parent.parent
@@ -37,18 +50,77 @@ class ColorSVGConverter:
                 "length_threshold": 4.0,
                 "splice_threshold": 45,
                 "path_precision": 8,
+                "palette_colors": 0,
+                "palette_merge_distance": 10,
             }
 
     @staticmethod
     def check_vtracer() -> bool:
         return _VTRACER_AVAILABLE
 
-    def convert(self, image_path: Path, settings: Optional[dict] = None) -> Path:
+    def convert(
+        self,
+        image_path: Path,
+        settings: Optional[dict] = None,
+        pool: Optional[Executor] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Path:
         """Convert an image to a colored multi-path SVG via VTracer.
 
         Args:
             image_path: Path to the source image (typically a background-removed PNG).
             settings: Optional override dict of VTracer parameters.
+            pool: Optional process pool to run VTracer in. VTracer holds the
+                GIL for the whole conversion, so servers use this to keep
+                their other threads responsive.
+            progress: Optional hook called as each stage starts (trace, save).
+                VTracer decodes, quantizes and traces in one native call.
+        """
+        progress = progress_or_noop(progress)
+        if pool is None:
+            progress("trace")
+            svg = self.convert_bytes(
+                image_path.read_bytes(), image_path.suffix.lstrip(".") or "png", settings
+            )
+            progress("save")
+            return self.save_svg(svg, image_path.stem)
+
+        if not _VTRACER_AVAILABLE:
+            raise RuntimeError(
+                "vtracer is not installed. Run `uv add vtracer` to enable color SVG conversion."
+            )
+        active = dict(self.settings)
+        if settings:
+            active.update(settings)
+        progress("trace")
+        ok, payload = pool.submit(_convert_worker, str(image_path), active).result()
+        if not ok:
+            raise RuntimeError(payload)
+        progress("save")
+        return self.save_svg(payload, image_path.stem)
+
+    def convert_many(
+        self,
+        image_paths: Iterable[Path],
+        settings: Optional[dict] = None,
+        max_workers: Optional[int] = None,
+        pool: Optional[Executor] = None,
+    ) -> Iterator[dict]:
+        """Convert many images across a process pool, yielding per-file results
+        as they complete (not in input order).
+
+        Each result is {"image": name, "filename": output name} on success or
+        {"image": name, "error": message} on failure; one bad input never
+        aborts the rest of the batch. Closing the iterator early cancels the
+        conversions not yet started.
+
+        Args:
+            image_paths: Source images.
+            settings: Optional override dict of VTracer parameters.
+            max_workers: Conversions in flight at once; defaults to one per CPU.
+            pool: Optional process pool to run them in. Without one, a pool
+                of max_workers spawned (not forked) processes is started
+                for the call.
         """
         if not _VTRACER_AVAILABLE:
             raise RuntimeError(
@@ -59,24 +131,239 @@ class ColorSVGConverter:
         if settings:
             active.update(settings)
 
-        output_path = self.output_dir / f"{image_path.stem}_color_vector.svg"
+        paths = list(image_paths)
+        if not paths:
+            return
+        workers = min(max_workers or cpu_budget(), len(paths))
+        own_pool = pool is None
+        if own_pool:
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        queued = iter(paths)
+        futures: Dict[Future, Path] = {}
+
+        def fill() -> None:
+            # At most `workers` submitted at a time, so a shared pool isn't
+            # flooded and an early close has little to cancel.
+            while len(futures) < workers:
+                path = next(queued, None)
+                if path is None:
+                    return
+                futures[pool.submit(_convert_worker, str(path), active)] = path
 
         try:
-            vtracer.convert_image_to_svg_py(
-                str(image_path),
-                str(output_path),
-                colormode=active["colormode"],
-                hierarchical=active["hierarchical"],
-                mode=active["mode"],
-                filter_speckle=int(active["filter_speckle"]),
-                color_precision=int(active["color_precision"]),
-                layer_difference=int(active["layer_difference"]),
-                corner_threshold=int(active["corner_threshold"]),
-                length_threshold=float(active["length_threshold"]),
-                splice_threshold=int(active["splice_threshold"]),
-                path_precision=int(active["path_precision"]),
-            )
+            fill()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield self._batch_result(futures.pop(future), future)
+                fill()
+        finally:
+            # Also runs on GeneratorExit (client gone): drop what hasn't started.
+            for future in futures:
+                future.cancel()
+            if own_pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _batch_result(self, path: Path, future: Future) -> dict:
+        try:
+            ok, payload = future.result()
+        except BrokenProcessPool:
+            ok, payload = False, "Worker process crashed"
         except Exception as e:
-            raise RuntimeError(f"VTracer conversion failed: {e}")
+            ok, payload = False, str(e)
+        if not ok:
+            return {"image": path.name, "error": payload}
+        try:
+            output_path = self.save_svg(payload, path.stem)
+        except OSError as e:
+            return {"image": path.name, "error": f"Could not save SVG: {e}"}
+        return {"image": path.name, "filename": output_path.name}
+
+    def auto_tune(
+        self,
+        image_path: Path,
+        max_paths: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        settings: Optional[dict] = None,
+        max_workers: Optional[int] = None,
+        pool: Optional[Executor] = None,
+    ) -> dict:
+        """Find the highest-fidelity VTracer settings whose SVG stays within a
+        path-count and/or byte budget (see auto_tune.auto_tune).
+
+        Returns a dict with the SVG text ("svg"), the chosen "settings",
+        "paths", "bytes", "fidelity", "met_budget" and "evaluated". Nothing
+        is written to disk; use save_svg to persist the result.
+        """
+        if not _VTRACER_AVAILABLE:
+            raise RuntimeError(
+                "vtracer is not installed. Run `uv add vtracer` to enable color SVG conversion."
+            )
+        from backend.color_svg_converter.auto_tune import auto_tune
+
+        active = dict(self.settings)
+        if settings:
+            active.update(settings)
 
+        with Image.open(image_path) as img:
+            return auto_tune(img, active, max_paths, max_bytes, max_workers, pool)
+
+    def convert_bytes(
+        self,
+        data: bytes,
+        img_format: str = "png",
+        settings: Optional[dict] = None,
+        pool: Optional[Executor] = None,
+    ) -> str:
+        """Convert an encoded image (PNG/JPEG/WebP... bytes) to SVG text, in memory.
+
+        Args:
+            data: Encoded image bytes.
+            img_format: Format hint for VTracer's decoder, e.g. "png", "jpg".
+            settings: Optional override dict of VTracer parameters.
+            pool: Optional process pool to run VTracer in, as for convert.
+        """
+        if not _VTRACER_AVAILABLE:
+            raise RuntimeError(
+                "vtracer is not installed. Run `uv add vtracer` to enable color SVG conversion."
+            )
+
+        active = dict(self.settings)
+        if settings:
+            active.update(settings)
+
+        if pool is None:
+            return _vtracer_svg(data, img_format, active)
+        ok, payload = pool.submit(_convert_bytes_worker, data, img_format, active).result()
+        if not ok:
+            raise RuntimeError(payload)
+        return payload
+
+    def convert_image(
+        self,
+        image: Union[Image.Image, np.ndarray],
+        settings: Optional[dict] = None,
+        pool: Optional[Executor] = None,
+    ) -> str:
+        """Convert an already-decoded image (PIL image or HxWx3/4 uint8 array)
+        to SVG text, in memory.
+
+        VTracer's raw-pixel entry point wants a Python list of per-pixel
+        tuples, which is several times slower than handing it a quickly
+        encoded PNG, so the buffer is PNG-encoded (low compression) in memory.
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        buf = io.BytesIO()
+        image.convert("RGBA").save(buf, "PNG", compress_level=1)
+        return self.convert_bytes(buf.getvalue(), "png", settings, pool)
+
+    def save_svg(self, svg: str, stem: str) -> Path:
+        """Persist SVG text to the output directory as <stem>_color_vector.svg."""
+        output_path = self.output_dir / f"{stem}_color_vector.svg"
+        output_path.write_text(svg, encoding="utf-8")
         return output_path
+
+
+def _convert_worker(image_path: str, settings: dict) -> Tuple[bool, str]:
+    """Process-pool entry point for convert_many. Returns (ok, svg or error).
+
+    Errors are returned rather than raised: VTracer panics surface as
+    BaseException subclasses that don't always pickle cleanly.
+    """
+    path = Path(image_path)
+    if not path.exists():
+        return False, f"Image not found: {path.name}"
+    try:
+        data = path.read_bytes()
+    except OSError as e:
+        return False, str(e)
+    return _convert_bytes_worker(data, path.suffix.lstrip(".") or "png", settings)
+
+
+def _convert_bytes_worker(data: bytes, img_format: str, settings: dict) -> Tuple[bool, str]:
+    """Process-pool entry point for encoded bytes; same contract as _convert_worker."""
+    try:
+        return True, _vtracer_svg(data, img_format, settings)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException as e:
+        return False, str(e) or type(e).__name__
+
+
+def _quantize_palette(data: bytes, n_colors: int, merge_distance: float) -> bytes:
+    """Snap opaque pixels to an n_colors Lab k-means palette (with near-duplicate
+    colors merged) and return the result re-encoded as PNG. Alpha is kept.
+
+    K-means over every pixel costs several times the VTracer run itself, so
+    the palette is fitted on a nearest-neighbour thumbnail (no blended
+    colors) and full-size pixels are mapped to it through a 5-bit RGB bucket
+    -> nearest-palette-color lookup table.
+    """
+    import cv2
+
+    from backend.potrace_color_converter.preprocess import (
+        merge_similar_colors,
+        quantize_lab,
+    )
+
+    with Image.open(io.BytesIO(data)) as img:
+        rgba = np.array(img.convert("RGBA"))
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    opaque = rgba[:, :, 3] > 0
+    step = max(1, -(-max(rgb.shape[:2]) // _PALETTE_FIT_SIDE))
+    thumb_rgb = np.ascontiguousarray(rgb[::step, ::step])
+    thumb_opaque = opaque[::step, ::step]
+    if not thumb_opaque.any():
+        return data
+
+    labels, centers = quantize_lab(thumb_rgb, thumb_opaque, min(n_colors, int(thumb_opaque.sum())))
+    _, centers = merge_similar_colors(labels, centers, merge_distance)
+
+    # Nearest palette color (in Lab) for the center of every RGB bucket.
+    levels = (np.arange(32, dtype=np.uint8) << 3) + 4
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1)
+    grid_lab = cv2.cvtColor(grid.reshape(1, -1, 3), cv2.COLOR_RGB2LAB).reshape(-1, 1, 3)
+    centers_lab = cv2.cvtColor(centers.reshape(1, -1, 3), cv2.COLOR_RGB2LAB).reshape(1, -1, 3)
+    dists = ((grid_lab.astype(np.float32) - centers_lab.astype(np.float32)) ** 2).sum(axis=2)
+    lut = centers[np.argmin(dists, axis=1)]
+
+    pixels = rgb[opaque]
+    codes = (pixels[:, 0].astype(np.int32) >> 3) << 10
+    codes |= (pixels[:, 1].astype(np.int32) >> 3) << 5
+    codes |= pixels[:, 2] >> 3
+    rgba[:, :, :3][opaque] = lut[codes]
+
+    buf = io.BytesIO()
+    Image.fromarray(rgba).save(buf, "PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def _vtracer_svg(data: bytes, img_format: str, active: dict) -> str:
+    """Run VTracer on encoded image bytes with a complete settings dict,
+    applying the palette pre-pass first when palette_colors is set."""
+    n_colors = int(active.get("palette_colors", 0))
+    if n_colors > 0:
+        data = _quantize_palette(
+            data, n_colors, float(active.get("palette_merge_distance", 10))
+        )
+        img_format = "png"
+    try:
+        return vtracer.convert_raw_image_to_svg(
+            data,
+            img_format=img_format.lower(),
+            colormode=active["colormode"],
+            hierarchical=active["hierarchical"],
+            mode=active["mode"],
+            filter_speckle=int(active["filter_speckle"]),
+            color_precision=int(active["color_precision"]),
+            layer_difference=int(active["layer_difference"]),
+            corner_threshold=int(active["corner_threshold"]),
+            length_threshold=float(active["length_threshold"]),
+            splice_threshold=int(active["splice_threshold"]),
+            path_precision=int(active["path_precision"]),
+        )
+    except Exception as e:
+        raise RuntimeError(f"VTracer conversion failed: {e}")
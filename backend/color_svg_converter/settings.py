@@ -62,6 +62,16 @@ class ColorSVGSettings:
                 "description": "Decimal precision for path coordinates. Higher = more accurate, larger file.",
                 "range": [1, 16],
             },
+            "palette_colors": {
+                "value": 0,
+                "description": "Pre-quantize opaque pixels to this many colors (k-means in Lab) before tracing. Collapses anti-aliasing shades into fewer layers. 0 = off.",
+                "range": [0, 64],
+            },
+            "palette_merge_distance": {
+                "value": 10,
+                "description": "With palette_colors, merge palette colors closer than this (Lab distance, roughly delta-E). 0 = no merging.",
+                "range": [0, 50],
+            },
         }
 
         self.current_settings = self._load_settings()
@@ -0,0 +1,99 @@
+"""Cooperative cancellation for long-running conversions.
+
+A CancelToken is handed to the work; the work calls check() between
+stages, and runs its subprocesses through run_process() so cancel() can
+kill them at once instead of waiting for the next stage boundary.
+"""
+import subprocess
+import threading
+from typing import Callable, List, Optional, Sequence
+
+
+class Cancelled(Exception):
+    """Raised inside work whose CancelToken was cancelled."""
+
+
+class CancelToken:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._processes: List[subprocess.Popen] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Cancel the work: kill its running subprocesses and run callbacks.
+        Safe to call from any thread, more than once."""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks = list(self._callbacks)
+            processes = list(self._processes)
+        for process in processes:
+            _kill(process)
+        for callback in callbacks:
+            callback()
+
+    def check(self) -> None:
+        if self._cancelled:
+            raise Cancelled("Cancelled")
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Call callback on cancel (at once if already cancelled). Returns a
+        function that unregisters it."""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove(self._callbacks, callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, items: list, item) -> None:
+        with self._lock:
+            if item in items:
+                items.remove(item)
+
+    def _track(self, process: subprocess.Popen) -> bool:
+        """Register a running process; False (and killed) if already cancelled."""
+        with self._lock:
+            if not self._cancelled:
+                self._processes.append(process)
+                return True
+        _kill(process)
+        return False
+
+
+def _kill(process: subprocess.Popen) -> None:
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+def run_process(
+    cmd: Sequence[str], timeout: float, cancel: Optional[CancelToken] = None
+) -> subprocess.CompletedProcess:
+    """subprocess.run(cmd, capture_output=True, text=True, timeout=timeout),
+    except that cancel, if given, kills the process and raises Cancelled."""
+    if cancel is None:
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+    cancel.check()
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    cancel._track(process)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill(process)
+        process.communicate()
+        raise
+    finally:
+        cancel._remove(cancel._processes, process)
+    cancel.check()
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
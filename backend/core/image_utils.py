@@ -1,3 +1,4 @@
+import io
 from pathlib import Path
 from PIL import Image
 
@@ -23,6 +24,38 @@ def snap_image_to_grid(img: Image.Image, grid: int = GRID) -> Image.Image:
     return img.resize((tw, th), Image.LANCZOS)
 
 
+def grid_crop_box(
+    img_w: int, img_h: int, x: int, y: int, width: int, height: int, grid: int = GRID
+) -> tuple[int, int, int, int]:
+    """Snap a crop region to the grid and clip it to a grid-aligned image.
+
+    Returns (x, y, w, h); raises ValueError if under one grid cell remains.
+    """
+    x = max(0, floor_to_grid(x, grid))
+    y = max(0, floor_to_grid(y, grid))
+    w = floor_to_grid(width, grid)
+    h = floor_to_grid(height, grid)
+    if x + w > img_w:
+        w = floor_to_grid(img_w - x, grid)
+    if y + h > img_h:
+        h = floor_to_grid(img_h - y, grid)
+    if w < grid or h < grid:
+        raise ValueError(f"Crop region too small after grid snap ({w}x{h})")
+    return x, y, w, h
+
+
+def encode_webp(img: Image.Image, quality: int, grid: int = GRID) -> bytes:
+    """Encode an image as WebP, flooring dimensions to multiples of `grid`."""
+    w, h = img.size
+    new_w, new_h = floor_to_grid(w, grid), floor_to_grid(h, grid)
+    if new_w != w or new_h != h:
+        img = img.resize((new_w, new_h), Image.LANCZOS)
+
+    buf = io.BytesIO()
+    img.save(buf, "WEBP", quality=quality)
+    return buf.getvalue()
+
+
 def ensure_file_on_grid(path: Path, grid: int = GRID) -> tuple[int, int]:
     """Open the file at `path`, snap it to the grid if needed, save in place.
 
@@ -0,0 +1,37 @@
+import re
+from typing import Dict
+
+_PATH_RE = re.compile(r"<path\b[^>]*?\sd=\"([^\"]*)\"", re.S)
+_TOKEN_RE = re.compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+# Numbers per segment for each path command; repeated argument groups after
+# one command letter are implicit extra segments.
+_SEGMENT_ARGS = {"m": 2, "l": 2, "t": 2, "h": 1, "v": 1, "c": 6, "s": 4, "q": 4, "a": 7}
+
+
+def count_nodes(d: str) -> int:
+    """Number of anchor points (segment end points) in a path's d attribute."""
+    nodes = 0
+    per_segment = 0
+    args = 0
+    for token in _TOKEN_RE.findall(d):
+        if token.isalpha():
+            if per_segment:
+                nodes += args // per_segment
+            per_segment = _SEGMENT_ARGS.get(token.lower(), 0)
+            args = 0
+        else:
+            args += 1
+    if per_segment:
+        nodes += args // per_segment
+    return nodes
+
+
+def svg_metrics(svg: str) -> Dict[str, int]:
+    """Size and complexity of an SVG document: paths, nodes and bytes."""
+    paths = _PATH_RE.findall(svg)
+    return {
+        "paths": len(paths),
+        "nodes": sum(count_nodes(d) for d in paths),
+        "bytes": len(svg.encode("utf-8")),
+    }
@@ -1,6 +1,47 @@
+import os
 import sys
 import time
-from typing import Optional
+from typing import Callable, Optional
+
+# Optional per-stage progress hook for long conversions, called as
+# progress(stage) or progress(stage, step, total), e.g. ("trace", 3, 8).
+ProgressCallback = Callable[..., None]
+
+
+def _no_progress(*args) -> None:
+    pass
+
+
+def progress_or_noop(progress: Optional[ProgressCallback]) -> ProgressCallback:
+    return progress if progress is not None else _no_progress
+
+
+def cpu_budget() -> int:
+    """CPUs this process may run on: its affinity mask where the platform
+    has one (a pinned server worker sees only its own slice), else all."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+# CPU-heavy conversions this process runs at once. The API sets it to its
+# scheduler's cpu slot count; standalone (CLI) use runs one at a time.
+_concurrent_conversions = 1
+
+
+def set_concurrent_conversions(count: int) -> None:
+    global _concurrent_conversions
+    _concurrent_conversions = max(1, count)
+
+
+def concurrent_conversions() -> int:
+    return _concurrent_conversions
+
+
+def cpu_share() -> int:
+    """CPUs one conversion may use: its even share of cpu_budget() among the
+    conversions running at once, at least one."""
+    return max(1, cpu_budget() // _concurrent_conversions)
 
 
 def loading_animation(duration: int, message: Optional[str] = None) -> None:
@@ -0,0 +1,205 @@
+"""Runtime estimate for the potrace-color pipeline, learned from measured
+stage timings, and a settings downgrade path that fits a conversion into a
+deadline.
+
+Each stage costs seconds-per-unit x units, where units is the stage's
+dominant size driver:
+
+    decode               source pixels
+    upscale              upscaled pixels
+    smooth:bilateral     pixels at the smoothing resolution
+    smooth:mean_shift    pixels at the smoothing resolution x spatial radius
+    quantize:kmeans      upscaled pixels x n_colors
+    quantize:median_cut  upscaled pixels
+    merge                upscaled pixels
+    masks                upscaled pixels x n_colors
+    trace                upscaled pixels per layer (n_colors layers at most)
+
+The rates start from priors measured on a single desktop core and are
+replaced by a moving average of the timings the converter observes, so the
+model adapts to the host. Cached stages are not discounted: the estimate is
+for a cold run and errs on the high side.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.potrace_color_converter.preprocess import source_spatial_radius
+
+# Seconds per unit before anything has been measured on this host.
+PRIOR_RATES = {
+    "decode": 2e-8,
+    "upscale": 4e-8,
+    "smooth:bilateral": 1.2e-7,
+    "smooth:mean_shift": 2.5e-7,
+    "quantize:kmeans": 2.5e-7,
+    "quantize:median_cut": 7e-8,
+    "merge": 1e-9,
+    "masks": 3e-9,
+    "trace": 5e-8,
+}
+# Weight of the newest observation in a stage's moving average.
+RATE_ALPHA = 0.3
+# Timings of stages smaller than this are dominated by overhead; skip them.
+MIN_OBSERVED_UNITS = 10_000
+
+
+class CostModel:
+    """Per-stage seconds-per-unit rates. Thread safe."""
+
+    def __init__(self, priors: Dict[str, float]):
+        self._priors = dict(priors)
+        self._rates: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def rate(self, stage: str) -> float:
+        with self._lock:
+            return self._rates.get(stage, self._priors.get(stage, 0.0))
+
+    def observe(self, stage: str, units: float, seconds: float) -> None:
+        """Record that a stage took `seconds` for `units` units of work."""
+        if units < MIN_OBSERVED_UNITS:
+            return
+        rate = seconds / units
+        with self._lock:
+            if stage in self._rates:
+                self._rates[stage] += RATE_ALPHA * (rate - self._rates[stage])
+            else:
+                # The first measurement replaces the prior outright: priors
+                # come from other hardware.
+                self._rates[stage] = rate
+            self._samples[stage] = self._samples.get(stage, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                stage: {
+                    "seconds_per_unit": self._rates.get(stage, prior),
+                    "samples": self._samples.get(stage, 0),
+                }
+                for stage, prior in self._priors.items()
+            }
+
+
+def stage_costs(
+    width: int, height: int, settings: Dict[str, Any]
+) -> Dict[str, Tuple[str, float]]:
+    """Map each pipeline stage (as named in progress reports) to its cost
+    model key and unit count for a width x height source image."""
+    upscale = max(1, int(settings.get("upscale_factor", 3)))
+    n_colors = int(settings.get("n_colors", 8))
+    smoothing = str(settings.get("smoothing", "mean_shift"))
+    quantizer = str(settings.get("quantizer", "kmeans"))
+    source = float(width * height)
+    upscaled = source * upscale * upscale
+
+    costs = {
+        "decode": ("decode", source),
+        "upscale": ("upscale", upscaled),
+        "merge": ("merge", upscaled),
+        "masks": ("masks", upscaled * n_colors),
+        "trace": ("trace", upscaled * n_colors),
+    }
+    if smoothing != "none":
+        spatial_radius = int(settings.get("smooth_spatial_radius", 15))
+        if str(settings.get("smooth_resolution", "upscaled")) == "source":
+            pixels = source
+            spatial_radius = source_spatial_radius(spatial_radius, upscale)
+        else:
+            pixels = upscaled
+        units = pixels * spatial_radius if smoothing == "mean_shift" else pixels
+        costs["smooth"] = (f"smooth:{smoothing}", units)
+    if quantizer == "kmeans":
+        costs["quantize"] = ("quantize:kmeans", upscaled * n_colors)
+    else:
+        costs["quantize"] = (f"quantize:{quantizer}", upscaled)
+    return costs
+
+
+def estimate_seconds(
+    width: int, height: int, settings: Dict[str, Any], model: Optional[CostModel] = None
+) -> float:
+    """Estimated wall time of a cold conversion, in seconds."""
+    model = model or cost_model
+    return sum(
+        model.rate(stage) * units
+        for stage, units in stage_costs(width, height, settings).values()
+    )
+
+
+def _lower(key: str, floor: int):
+    def step(s: Dict[str, Any]) -> Optional[int]:
+        value = int(s[key])
+        return value - 1 if value > floor else None
+
+    return step
+
+
+def _replace(key: str, old: str, new: str):
+    def step(s: Dict[str, Any]) -> Optional[str]:
+        return new if s[key] == old else None
+
+    return step
+
+
+def _smooth_at_source(s: Dict[str, Any]) -> Optional[str]:
+    if s["smoothing"] == "none" or int(s["upscale_factor"]) <= 1:
+        return None
+    return "source" if s["smooth_resolution"] == "upscaled" else None
+
+
+# Downgrade steps, smallest quality loss first. Each returns the next value
+# for its setting, or None once it no longer applies; a step is repeated
+# until the estimate fits or the step runs out.
+_LADDER = (
+    ("smooth_resolution", _smooth_at_source),
+    ("smoothing", _replace("smoothing", "mean_shift", "bilateral")),
+    ("upscale_factor", _lower("upscale_factor", 2)),
+    ("quantizer", _replace("quantizer", "kmeans", "median_cut")),
+    ("upscale_factor", _lower("upscale_factor", 1)),
+    ("smoothing", _replace("smoothing", "bilateral", "none")),
+    ("n_colors", _lower("n_colors", 4)),
+)
+
+
+def fit_to_deadline(
+    width: int,
+    height: int,
+    settings: Dict[str, Any],
+    deadline_seconds: float,
+    model: Optional[CostModel] = None,
+) -> Tuple[Dict[str, Any], List[str], float]:
+    """Downgrade settings until the estimated runtime fits the deadline.
+
+    Walks _LADDER (smoothing at source resolution, bilateral instead of
+    mean-shift, lower upscale, median cut instead of k-means, no
+    smoothing, fewer colors). Returns (settings, downgrades, estimated
+    seconds). Unlike the memory budget this never refuses: if even the
+    cheapest settings miss the deadline, they are returned anyway.
+    """
+    model = model or cost_model
+    active = dict(settings)
+
+    def estimate() -> float:
+        return estimate_seconds(width, height, active, model)
+
+    for key, step in _LADDER:
+        while estimate() > deadline_seconds:
+            value = step(active)
+            if value is None:
+                break
+            active[key] = value
+    if active["smoothing"] == "none":
+        # Where smoothing runs no longer matters; don't report it.
+        active["smooth_resolution"] = settings["smooth_resolution"]
+
+    downgrades = [
+        f"{key} {settings[key]} -> {active[key]}"
+        for key in dict.fromkeys(key for key, _ in _LADDER)
+        if active[key] != settings[key]
+    ]
+    return active, downgrades, estimate()
+
+
+# Shared across converter instances (the API builds one per request).
+cost_model = CostModel(PRIOR_RATES)
@@ -0,0 +1,95 @@
+"""Peak-memory estimate for the potrace-color pipeline, and a settings
+downgrade path that keeps a conversion inside a configured budget.
+
+Everything after the upscale stage works on upscale**2 times the source
+pixel count, so a 2048px input at upscale 4 is a 67 MP working image. The
+estimate is deliberately simple (bytes per upscaled pixel per stage) and
+errs on the high side.
+
+POTRACE_COLOR_MEMORY_MB bounds the whole process: memory the shared stage
+cache already holds is taken off the top, and the rest is split evenly
+across the conversions that may run at once (the API's cpu slots).
+"""
+import os
+from typing import Any, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+from backend.core.utils import concurrent_conversions
+
+load_dotenv()
+
+# Resident while quantizing and tracing: upscaled RGB + alpha, smoothed RGB,
+# int32 label map.
+_PERSISTENT_BYTES_PER_PIXEL = 3 + 1 + 3 + 4
+# quantize_lab transient peak: Lab image, opaque Lab uint8 + float32 copies,
+# k-means labels, re-embedded label map, opaque mask.
+_QUANTIZE_BYTES_PER_PIXEL = 3 + 3 + 12 + 4 + 4 + 1
+# Per-color masks are kept (and cached) until tracing; +2 for clean_mask temps.
+_MASK_BYTES_PER_PIXEL_PER_COLOR = 1
+_MASK_OVERHEAD_BYTES_PER_PIXEL = 2
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised when no allowed downgrade brings the estimate under budget."""
+
+
+def memory_budget_bytes() -> int:
+    """Configured budget from POTRACE_COLOR_MEMORY_MB (0 disables the check)."""
+    return int(os.getenv("POTRACE_COLOR_MEMORY_MB", "4096")) * 1024 * 1024
+
+
+def conversion_budget_bytes(cache_bytes: int) -> int:
+    """Budget for one conversion, given the bytes the stage cache holds now
+    (0 if the check is disabled)."""
+    budget = memory_budget_bytes()
+    if budget <= 0:
+        return 0
+    return max(1, (budget - cache_bytes) // concurrent_conversions())
+
+
+def estimate_peak_bytes(width: int, height: int, upscale: int, n_colors: int) -> int:
+    """Estimate peak working memory of one conversion, in bytes."""
+    pixels = width * height * max(1, upscale) ** 2
+    masks = n_colors * _MASK_BYTES_PER_PIXEL_PER_COLOR + _MASK_OVERHEAD_BYTES_PER_PIXEL
+    per_pixel = _PERSISTENT_BYTES_PER_PIXEL + max(_QUANTIZE_BYTES_PER_PIXEL, masks)
+    return pixels * per_pixel
+
+
+def fit_to_budget(
+    width: int, height: int, settings: Dict[str, Any], budget: int
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Downgrade settings until the peak estimate fits the budget.
+
+    Lowers upscale_factor first (memory scales with its square), then
+    n_colors. Returns (settings, downgrades) where downgrades describes each
+    change applied; raises MemoryBudgetExceeded if nothing fits.
+    """
+    active = dict(settings)
+    downgrades: List[str] = []
+    if budget <= 0:
+        return active, downgrades
+
+    def estimate() -> int:
+        return estimate_peak_bytes(
+            width, height, int(active["upscale_factor"]), int(active["n_colors"])
+        )
+
+    while estimate() > budget and int(active["upscale_factor"]) > 1:
+        active["upscale_factor"] = int(active["upscale_factor"]) - 1
+    if active["upscale_factor"] != settings["upscale_factor"]:
+        downgrades.append(
+            f"upscale_factor {settings['upscale_factor']} -> {active['upscale_factor']}"
+        )
+
+    while estimate() > budget and int(active["n_colors"]) > 2:
+        active["n_colors"] = int(active["n_colors"]) - 1
+    if active["n_colors"] != settings["n_colors"]:
+        downgrades.append(f"n_colors {settings['n_colors']} -> {active['n_colors']}")
+
+    if estimate() > budget:
+        raise MemoryBudgetExceeded(
+            f"{width}x{height} image needs ~{estimate() // (1024 * 1024)} MB "
+            f"(budget {budget // (1024 * 1024)} MB) even at the lowest settings."
+        )
+    return active, downgrades
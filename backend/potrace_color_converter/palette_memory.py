@@ -0,0 +1,32 @@
+"""Remembers the last k-means palette per image so interactive re-runs can
+warm-start quantize_lab instead of restarting from k-means++."""
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class PaletteMemory:
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._palettes: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            palette = self._palettes.get(key)
+            if palette is not None:
+                self._palettes.move_to_end(key)
+            return palette
+
+    def put(self, key: str, centers_rgb: np.ndarray) -> None:
+        with self._lock:
+            self._palettes[key] = np.array(centers_rgb, dtype=np.uint8)
+            self._palettes.move_to_end(key)
+            while len(self._palettes) > self.max_entries:
+                self._palettes.popitem(last=False)
+
+
+# Shared across converter instances (the API builds one per request).
+palette_memory = PaletteMemory()
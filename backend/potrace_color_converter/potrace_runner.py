@@ -8,7 +8,6 @@ final multi-color SVG, otherwise paths land off-canvas.
 """
 import os
 import re
-import subprocess
 import tempfile
 from pathlib import Path
 from typing import Optional, Tuple
@@ -16,6 +15,8 @@ from typing import Optional, Tuple
 import numpy as np
 from PIL import Image
 
+from backend.core.cancel import CancelToken, run_process
+
 
 # Match the wrapping <g transform="..."> emitted by Potrace's SVG mode.
 _G_TRANSFORM_RE = re.compile(r'<g[^>]*\stransform="([^"]+)"', re.DOTALL)
@@ -23,7 +24,11 @@ _PATH_D_RE = re.compile(r'<path[^>]*\sd="([^"]+)"', re.DOTALL)
 
 
 def trace_mask(
-    mask: np.ndarray, potrace_path: Path, potrace_settings: dict, timeout: int = 30
+    mask: np.ndarray,
+    potrace_path: Path,
+    potrace_settings: dict,
+    timeout: int = 30,
+    cancel: Optional[CancelToken] = None,
 ) -> Optional[Tuple[str, str]]:
     """Run Potrace on a binary mask and return (path_d, transform).
 
@@ -32,6 +37,7 @@ def trace_mask(
         potrace_path: Path to potrace binary.
         potrace_settings: dict with turdsize, alphamax, opttolerance, longcurve.
         timeout: subprocess timeout in seconds.
+        cancel: Optional token; cancelling it kills Potrace (raises Cancelled).
 
     Returns:
         Tuple of (concatenated 'd' attribute, group 'transform' attribute), or
@@ -40,7 +46,7 @@ def trace_mask(
     """
     # Potrace: black (0) = foreground to trace, white (255) = background.
     mask_bool = mask.astype(bool)
-    bw = np.where(mask_bool, 0, 255).astype(np.uint8)
+    bw = np.where(mask_bool, np.uint8(0), np.uint8(255))
     pil = Image.fromarray(bw, "L")
 
     with tempfile.NamedTemporaryFile(suffix=".pbm", delete=False) as tf:
@@ -67,9 +73,7 @@ def trace_mask(
         if potrace_settings.get("longcurve", False):
             cmd.append("--longcurve")
 
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=timeout
-        )
+        result = run_process(cmd, timeout, cancel)
         if result.returncode != 0:
             raise RuntimeError(f"Potrace error: {result.stderr}")
 
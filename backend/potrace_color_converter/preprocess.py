@@ -1,9 +1,12 @@
 """Stateless preprocessing helpers for the Potrace color pipeline."""
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 
 import cv2
 import numpy as np
 
+from backend.core.utils import cpu_share
+
 
 def upscale_rgba(
     rgb: np.ndarray, alpha: np.ndarray, factor: int
@@ -18,6 +21,13 @@ def upscale_rgba(
     return rgb_up, alpha_up
 
 
+def source_spatial_radius(spatial_radius: int, upscale: int) -> int:
+    """Convert a spatial radius given in upscaled pixels to source pixels."""
+    if upscale <= 1:
+        return spatial_radius
+    return max(1, int(round(spatial_radius / upscale)))
+
+
 def edge_preserving_smooth(
     rgb: np.ndarray, mode: str, spatial_radius: int, color_radius: int
 ) -> np.ndarray:
@@ -45,6 +55,71 @@ def edge_preserving_smooth(
     raise ValueError(f"Unknown smoothing mode: {mode}")
 
 
+def smoothing_halo(mode: str, spatial_radius: int) -> int:
+    """Tile overlap needed so tiled smoothing matches a single full-image call.
+
+    bilateral reads a fixed d=9 neighborhood, so its tiles match exactly.
+    Mean-shift windows drift as they converge; two spatial radii of context
+    keeps tiled output within 1 level of the full-image call on a handful
+    of pixels. The halo is rounded up to a multiple of 8 so tile origins
+    stay aligned with mean-shift's pyramid levels.
+    """
+    if mode == "none":
+        return 0
+    if mode == "bilateral":
+        reach = 9 // 2
+    else:
+        reach = 2 * spatial_radius
+    return -(-reach // 8) * 8
+
+
+def tiled_edge_preserving_smooth(
+    rgb: np.ndarray,
+    mode: str,
+    spatial_radius: int,
+    color_radius: int,
+    workers: int,
+    tile_size: int = 512,
+) -> np.ndarray:
+    """edge_preserving_smooth split into haloed tiles filtered on a thread pool.
+
+    OpenCV releases the GIL inside both filters, so tiles run truly in
+    parallel. Each tile is filtered together with a halo of neighboring
+    pixels (see smoothing_halo) and only its interior is written back, so
+    tile seams don't show.
+
+    Args:
+        rgb: HxWx3 uint8 array.
+        mode, spatial_radius, color_radius: As for edge_preserving_smooth.
+        workers: Thread count; <= 0 means this conversion's share of the
+            CPUs (see cpu_share). 1 falls back to the single full-image call.
+        tile_size: Interior tile edge in pixels (rounded down to a multiple of 8).
+    """
+    if workers <= 0:
+        workers = cpu_share()
+    h, w = rgb.shape[:2]
+    tile_size = max(8, (tile_size // 8) * 8)
+    if mode == "none" or workers == 1 or (h <= tile_size and w <= tile_size):
+        return edge_preserving_smooth(rgb, mode, spatial_radius, color_radius)
+
+    halo = smoothing_halo(mode, spatial_radius)
+    out = np.empty_like(rgb)
+
+    def run(y0: int, x0: int) -> None:
+        y1, x1 = min(y0 + tile_size, h), min(x0 + tile_size, w)
+        hy0, hx0 = max(0, y0 - halo), max(0, x0 - halo)
+        hy1, hx1 = min(h, y1 + halo), min(w, x1 + halo)
+        tile = np.ascontiguousarray(rgb[hy0:hy1, hx0:hx1])
+        smoothed = edge_preserving_smooth(tile, mode, spatial_radius, color_radius)
+        out[y0:y1, x0:x1] = smoothed[y0 - hy0 : y1 - hy0, x0 - hx0 : x1 - hx0]
+
+    origins = [(y, x) for y in range(0, h, tile_size) for x in range(0, w, tile_size)]
+    with ThreadPoolExecutor(max_workers=min(workers, len(origins))) as pool:
+        # list() re-raises the first worker exception, if any.
+        list(pool.map(lambda origin: run(*origin), origins))
+    return out
+
+
 def merge_similar_colors(
     labels: np.ndarray, centers_rgb: np.ndarray, max_distance: float
 ) -> Tuple[np.ndarray, np.ndarray]:
@@ -93,7 +168,7 @@ def merge_similar_colors(
         return labels, centers_rgb
 
     # Weighted-average merged centers in Lab, weighted by cluster pixel count.
-    counts = np.array([(labels == i).sum() for i in range(n)], dtype=np.float64)
+    counts = np.bincount(labels[labels >= 0], minlength=n).astype(np.float64)
     root_to_new = {root: new for new, root in enumerate(unique_roots)}
     new_centers_lab = np.zeros((len(unique_roots), 3), dtype=np.float64)
     new_counts = np.zeros(len(unique_roots), dtype=np.float64)
@@ -111,9 +186,9 @@ def merge_similar_colors(
 
     # Remap labels (transparent -1 passes through).
     mapping = np.array([root_to_new[roots[i]] for i in range(n)], dtype=np.int32)
-    new_labels = np.where(labels >= 0, mapping[np.clip(labels, 0, n - 1)], -1)
+    new_labels = np.where(labels >= 0, mapping[np.clip(labels, 0, n - 1)], np.int32(-1))
 
-    return new_labels.astype(np.int32), new_centers_rgb
+    return new_labels.astype(np.int32, copy=False), new_centers_rgb
 
 
 def clean_mask(mask: np.ndarray, upscale: int) -> np.ndarray:
@@ -130,8 +205,50 @@ def clean_mask(mask: np.ndarray, upscale: int) -> np.ndarray:
     return m.astype(bool)
 
 
+def _nearest_center(pixels: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Index of the nearest center for each row of pixels (N x 3 float32)."""
+    best = np.full(pixels.shape[0], np.inf, dtype=np.float32)
+    labels = np.zeros(pixels.shape[0], dtype=np.int32)
+    for i, c in enumerate(centers):
+        d = ((pixels - c) ** 2).sum(axis=1)
+        closer = d < best
+        best[closer] = d[closer]
+        labels[closer] = i
+    return labels
+
+
+def _resize_palette(centers: np.ndarray, k: int, pixels: np.ndarray) -> np.ndarray:
+    """Grow or shrink a Lab palette to k centers.
+
+    Shrinking repeatedly averages the closest pair of centers. Growing adds the
+    pixel farthest from every existing center (the k-means++ choice, made
+    greedily) from a strided sample of the pixels.
+    """
+    centers = [c.astype(np.float32) for c in centers]
+    while len(centers) > k:
+        arr = np.array(centers)
+        d = ((arr[:, None, :] - arr[None, :, :]) ** 2).sum(axis=2)
+        np.fill_diagonal(d, np.inf)
+        i, j = np.unravel_index(int(np.argmin(d)), d.shape)
+        merged = (centers[i] + centers[j]) / 2.0
+        centers = [c for n, c in enumerate(centers) if n not in (i, j)] + [merged]
+    if len(centers) < k:
+        sample = pixels[:: max(1, pixels.shape[0] // 20000)]
+        nearest = np.full(sample.shape[0], np.inf, dtype=np.float32)
+        for c in centers:
+            nearest = np.minimum(nearest, ((sample - c) ** 2).sum(axis=1))
+        while len(centers) < k:
+            c = sample[int(np.argmax(nearest))].copy()
+            centers.append(c)
+            nearest = np.minimum(nearest, ((sample - c) ** 2).sum(axis=1))
+    return np.array(centers, dtype=np.float32)
+
+
 def quantize_lab(
-    rgb: np.ndarray, opaque_mask: np.ndarray, n_colors: int
+    rgb: np.ndarray,
+    opaque_mask: np.ndarray,
+    n_colors: int,
+    initial_centers: Optional[np.ndarray] = None,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """Cluster opaque pixels into n_colors groups via k-means in Lab color space.
 
@@ -139,6 +256,10 @@ def quantize_lab(
         rgb: HxWx3 uint8 RGB array.
         opaque_mask: HxW bool array, True where alpha >= threshold.
         n_colors: Number of clusters.
+        initial_centers: Optional (M, 3) uint8 RGB palette from a previous run
+            on the same image. Centers are added or dropped to reach n_colors,
+            then a single short k-means refinement replaces the 3 full
+            k-means++ restarts.
 
     Returns:
         labels: HxW int32 array. Label = cluster index for opaque pixels; -1 for transparent.
@@ -146,10 +267,12 @@ def quantize_lab(
     """
     h, w = rgb.shape[:2]
     # Convert full image to Lab for perceptual clustering, then sample only opaque pixels.
+    # Select opaque pixels before the float32 cast so only the subject (not the
+    # whole upscaled image) is ever held as float.
     lab = cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB)
     opaque_flat = opaque_mask.reshape(-1)
-    lab_flat = lab.reshape(-1, 3).astype(np.float32)
-    subject_pixels = lab_flat[opaque_flat]
+    subject_pixels = lab.reshape(-1, 3)[opaque_flat].astype(np.float32)
+    del lab
 
     if subject_pixels.shape[0] == 0:
         # Nothing to cluster — return all-transparent labels.
@@ -157,14 +280,30 @@ def quantize_lab(
 
     # Clamp n_colors to the number of unique pixels (k-means fails if k > samples).
     k = min(n_colors, subject_pixels.shape[0])
-    criteria = (
-        cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,
-        20,
-        1.0,
-    )
-    _, sub_labels, centers_lab = cv2.kmeans(
-        subject_pixels, k, None, criteria, 3, cv2.KMEANS_PP_CENTERS
-    )
+    if initial_centers is not None and len(initial_centers) > 0:
+        start_lab = cv2.cvtColor(
+            np.asarray(initial_centers, dtype=np.uint8).reshape(1, -1, 3),
+            cv2.COLOR_RGB2LAB,
+        ).reshape(-1, 3)
+        start_lab = _resize_palette(start_lab, k, subject_pixels)
+        init_labels = _nearest_center(subject_pixels, start_lab).reshape(-1, 1)
+        criteria = (
+            cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,
+            5,
+            1.0,
+        )
+        _, sub_labels, centers_lab = cv2.kmeans(
+            subject_pixels, k, init_labels, criteria, 1, cv2.KMEANS_USE_INITIAL_LABELS
+        )
+    else:
+        criteria = (
+            cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,
+            20,
+            1.0,
+        )
+        _, sub_labels, centers_lab = cv2.kmeans(
+            subject_pixels, k, None, criteria, 3, cv2.KMEANS_PP_CENTERS
+        )
     sub_labels = sub_labels.reshape(-1)
 
     # Re-embed labels into full image (transparent pixels = -1).
@@ -177,3 +316,124 @@ def quantize_lab(
     centers_rgb = cv2.cvtColor(centers_lab_img, cv2.COLOR_LAB2RGB).reshape(-1, 3)
 
     return labels, centers_rgb
+
+
+def quantize_histogram(
+    rgb: np.ndarray, opaque_mask: np.ndarray, n_colors: int, bits: int = 5
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Median-cut quantizer over a compact color histogram of the opaque pixels.
+
+    Opaque pixels are bucketed into a 2**(3*bits) RGB histogram in a single
+    linear pass. Median cut (in Lab, weighted by bucket population) then runs
+    over the occupied buckets only, followed by a few weighted Lloyd steps to
+    pull the box centers onto the dominant colors. Pixels are mapped back
+    through a bucket -> label lookup table. Apart from the histogram pass and
+    the final lookup, cost scales with the number of distinct colors rather
+    than with image size, which makes this much cheaper than k-means on
+    flat-color icons.
+
+    Args:
+        rgb: HxWx3 uint8 RGB array.
+        opaque_mask: HxW bool array, True where alpha >= threshold.
+        n_colors: Maximum number of palette colors.
+        bits: Histogram precision per channel (5-6 is plenty for icons).
+
+    Returns:
+        Same contract as quantize_lab: (labels, centers_rgb), labels -1 for
+        transparent pixels. May return fewer than n_colors centers when the
+        image has fewer distinct buckets.
+    """
+    h, w = rgb.shape[:2]
+    opaque_flat = opaque_mask.reshape(-1)
+    pixels = rgb.reshape(-1, 3)[opaque_flat]
+
+    if pixels.shape[0] == 0:
+        return np.full((h, w), -1, dtype=np.int32), np.zeros((n_colors, 3), dtype=np.uint8)
+
+    # 1. Bucket codes + histogram (per-bucket population and mean RGB).
+    shift = 8 - bits
+    codes = (pixels[:, 0] >> shift).astype(np.int32) << (2 * bits)
+    codes |= (pixels[:, 1] >> shift).astype(np.int32) << bits
+    codes |= pixels[:, 2] >> shift
+    n_bins = 1 << (3 * bits)
+    counts = np.bincount(codes, minlength=n_bins)
+    occupied = np.flatnonzero(counts)
+    weights = counts[occupied].astype(np.float64)
+    bucket_rgb = np.stack(
+        [np.bincount(codes, weights=pixels[:, c], minlength=n_bins)[occupied] for c in range(3)],
+        axis=1,
+    ) / weights[:, None]
+    bucket_lab = (
+        cv2.cvtColor(
+            np.round(bucket_rgb).astype(np.uint8).reshape(1, -1, 3), cv2.COLOR_RGB2LAB
+        )
+        .reshape(-1, 3)
+        .astype(np.float64)
+    )
+
+    # 2. Median cut: repeatedly split the box with the largest weighted error
+    # along its highest-variance Lab axis, at the weighted median.
+    def box_error(idx: np.ndarray) -> Tuple[float, int]:
+        wts = weights[idx]
+        pts = bucket_lab[idx]
+        mean = (pts * wts[:, None]).sum(axis=0) / wts.sum()
+        var = ((pts - mean) ** 2 * wts[:, None]).sum(axis=0)
+        return float(var.sum()), int(np.argmax(var))
+
+    boxes = [np.arange(occupied.shape[0])]
+    errors = [box_error(boxes[0])]
+    while len(boxes) < n_colors:
+        splittable = [i for i, b in enumerate(boxes) if b.shape[0] > 1 and errors[i][0] > 0]
+        if not splittable:
+            break
+        target = max(splittable, key=lambda i: errors[i][0])
+        idx = boxes[target]
+        axis = errors[target][1]
+        order = idx[np.argsort(bucket_lab[idx, axis], kind="stable")]
+        cum = np.cumsum(weights[order])
+        cut = int(np.searchsorted(cum, cum[-1] / 2.0)) + 1
+        cut = min(max(cut, 1), order.shape[0] - 1)
+        low, high = order[:cut], order[cut:]
+        boxes[target] = low
+        errors[target] = box_error(low)
+        boxes.append(high)
+        errors.append(box_error(high))
+
+    centers_lab = np.stack(
+        [(bucket_lab[b] * weights[b, None]).sum(axis=0) / weights[b].sum() for b in boxes]
+    )
+
+    # 3. Weighted Lloyd refinement over the buckets (not the pixels).
+    for _ in range(4):
+        dists = ((bucket_lab[:, None, :] - centers_lab[None, :, :]) ** 2).sum(axis=2)
+        assign = np.argmin(dists, axis=1)
+        k = centers_lab.shape[0]
+        sums = np.stack(
+            [np.bincount(assign, weights=bucket_lab[:, c] * weights, minlength=k) for c in range(3)],
+            axis=1,
+        )
+        totals = np.bincount(assign, weights=weights, minlength=k)
+        live = totals > 0
+        centers_lab[live] = sums[live] / totals[live, None]
+    dists = ((bucket_lab[:, None, :] - centers_lab[None, :, :]) ** 2).sum(axis=2)
+    assign = np.argmin(dists, axis=1)
+
+    # Drop clusters that lost every bucket so labels stay contiguous.
+    used = np.unique(assign)
+    remap = np.full(centers_lab.shape[0], -1, dtype=np.int32)
+    remap[used] = np.arange(used.shape[0], dtype=np.int32)
+    centers_lab = centers_lab[used]
+
+    # 4. Bucket -> label lookup table, then map every opaque pixel through it.
+    lut = np.full(n_bins, -1, dtype=np.int32)
+    lut[occupied] = remap[assign]
+    labels_flat = np.full(h * w, -1, dtype=np.int32)
+    labels_flat[opaque_flat] = lut[codes]
+    labels = labels_flat.reshape(h, w)
+
+    centers_rgb = cv2.cvtColor(
+        np.clip(np.round(centers_lab), 0, 255).astype(np.uint8).reshape(1, -1, 3),
+        cv2.COLOR_LAB2RGB,
+    ).reshape(-1, 3)
+
+    return labels, centers_rgb
@@ -1,21 +1,45 @@
+import hashlib
+import io
 import os
 import subprocess
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 
 import numpy as np
 from dotenv import load_dotenv
 from PIL import Image
 
+from backend.core.cancel import CancelToken
+from backend.core.utils import ProgressCallback, progress_or_noop
 from backend.potrace_color_converter.preprocess import (
     clean_mask,
-    edge_preserving_smooth,
     merge_similar_colors,
+    quantize_histogram,
     quantize_lab,
+    source_spatial_radius,
+    tiled_edge_preserving_smooth,
     upscale_rgba,
 )
+from backend.potrace_color_converter.cost_model import (
+    cost_model,
+    fit_to_deadline,
+    stage_costs,
+)
+from backend.potrace_color_converter.memory_budget import (
+    conversion_budget_bytes,
+    fit_to_budget,
+)
+from backend.potrace_color_converter.palette_memory import palette_memory
 from backend.potrace_color_converter.potrace_runner import trace_mask
-from backend.potrace_color_converter.svg_composer import compose_svg
+from backend.potrace_color_converter.stage_cache import stage_cache
+from backend.potrace_color_converter.svg_composer import (
+    PathEntry,
+    compose_svg,
+    svg_footer,
+    svg_header,
+    svg_layer,
+)
 
 load_dotenv()
 
@@ -36,6 +60,9 @@ class PotraceColorConverter:
             self.potrace_path = Path("C:/Tools/potrace-1.16.win64/potrace.exe")
 
         self.settings = self._load_settings()
+        self.cache = stage_cache
+        self.applied_downgrades: list = []
+        self.estimated_seconds: Optional[float] = None
 
     def _load_settings(self) -> dict:
         try:
@@ -46,10 +73,13 @@ class PotraceColorConverter:
             print(f"Warning: could not load potrace color settings, using defaults: {e}")
             return {
                 "n_colors": 8,
+                "quantizer": "kmeans",
                 "upscale_factor": 3,
                 "smoothing": "mean_shift",
                 "smooth_spatial_radius": 15,
                 "smooth_color_radius": 20,
+                "smooth_resolution": "upscaled",
+                "smooth_workers": 0,
                 "alpha_threshold": 128,
                 "min_region_pixels": 32,
                 "merge_color_distance": 10,
@@ -58,6 +88,8 @@ class PotraceColorConverter:
                 "alphamax": 1.0,
                 "opttolerance": 0.2,
                 "longcurve": False,
+                "svg_coordinates": "potrace",
+                "svg_precision": 2,
             }
 
     def check_potrace(self) -> bool:
@@ -74,10 +106,136 @@ class PotraceColorConverter:
         except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
             return False
 
-    def convert(self, image_path: Path, settings: Optional[dict] = None) -> Path:
+    def convert(
+        self,
+        image_path: Path,
+        settings: Optional[dict] = None,
+        progress: Optional[ProgressCallback] = None,
+        cancel: Optional[CancelToken] = None,
+        deadline: Optional[float] = None,
+    ) -> Path:
         """Convert a background-removed PNG to a color SVG via AA-aware preprocessing
         + per-color Potrace tracing.
         """
+        return self.convert_bytes(
+            image_path.read_bytes(),
+            image_path.stem,
+            settings,
+            progress=progress,
+            cancel=cancel,
+            deadline=deadline,
+        )
+
+    def convert_bytes(
+        self,
+        data: bytes,
+        stem: str,
+        settings: Optional[dict] = None,
+        decoded: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        progress: Optional[ProgressCallback] = None,
+        cancel: Optional[CancelToken] = None,
+        deadline: Optional[float] = None,
+    ) -> Path:
+        """Same as convert, for encoded image bytes. Writes <stem>_color_precision.svg.
+
+        Args:
+            data: Encoded image bytes.
+            stem: Output file name stem.
+            settings: Optional override dict.
+            decoded: Optional (rgb, alpha) arrays already decoded from data by
+                the caller; used for the decode stage instead of decoding again.
+            progress: Optional hook called as each stage starts: decode,
+                upscale, smooth, quantize, merge, masks, trace (layer i of n)
+                and compose.
+            cancel: Optional token, checked between stages and layers;
+                cancelling it also kills the running Potrace process. The
+                conversion then raises Cancelled.
+            deadline: Optional time budget in seconds. Settings are
+                downgraded (see cost_model.fit_to_deadline) until the
+                estimated runtime fits; the changes are reported in
+                applied_downgrades and the estimate in estimated_seconds.
+        """
+        progress = progress_or_noop(progress)
+        active, content_key, size = self._begin(data, settings, deadline)
+        original_w, original_h = size
+        layers_key, masks, centers_rgb = self._preprocess(
+            data, content_key, active, size, decoded, progress, cancel
+        )
+        paths = list(
+            self._trace_layers(layers_key, masks, centers_rgb, active, progress, cancel)
+        )
+
+        if not paths:
+            raise RuntimeError("No traceable regions found after quantization.")
+
+        # 7. Compose layered SVG at original dimensions
+        if cancel is not None:
+            cancel.check()
+        progress("compose")
+        output_path = self.output_dir / f"{stem}_color_precision.svg"
+        compose_svg(
+            paths,
+            original_w,
+            original_h,
+            int(active.get("upscale_factor", 3)),
+            output_path,
+            coordinates=str(active.get("svg_coordinates", "potrace")),
+            precision=int(active.get("svg_precision", 2)),
+        )
+        return output_path
+
+    def convert_stream(
+        self,
+        image_path: Path,
+        settings: Optional[dict] = None,
+        deadline: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Tuple[Path, Iterator[str]]:
+        """Streaming variant of convert.
+
+        Validation (Potrace check, memory budget) and deadline fitting happen
+        before this returns, so errors can still be reported normally. The
+        returned iterator yields the SVG header immediately, then each color
+        layer as soon as it is traced, largest area first, then the footer;
+        the complete SVG is also written to the returned output path once the
+        last layer is done. cancel is checked as in convert; the iterator
+        then raises Cancelled and nothing is written.
+        """
+        data = image_path.read_bytes()
+        active, content_key, size = self._begin(data, settings, deadline)
+        original_w, original_h = size
+        upscale = int(active.get("upscale_factor", 3))
+        coordinates = str(active.get("svg_coordinates", "potrace"))
+        precision = int(active.get("svg_precision", 2))
+        output_path = self.output_dir / f"{image_path.stem}_color_precision.svg"
+
+        def generate() -> Iterator[str]:
+            parts = [svg_header(original_w, original_h, upscale, coordinates)]
+            yield parts[0]
+            layers_key, masks, centers_rgb = self._preprocess(
+                data, content_key, active, size, cancel=cancel
+            )
+            for entry in self._trace_layers(
+                layers_key, masks, centers_rgb, active, cancel=cancel
+            ):
+                parts.append(svg_layer(entry, upscale, coordinates, precision))
+                yield parts[-1]
+            if len(parts) == 1:
+                # Too late for an error status; leave a marker in the document.
+                parts.append("<!-- No traceable regions found after quantization. -->\n")
+                yield parts[-1]
+            parts.append(svg_footer())
+            yield parts[-1]
+            output_path.write_text("".join(parts), encoding="utf-8")
+
+        return output_path, generate()
+
+    def _begin(
+        self, data: bytes, settings: Optional[dict], deadline: Optional[float] = None
+    ) -> Tuple[dict, str, Tuple[int, int]]:
+        """Check Potrace, merge settings, hash the input and apply the memory
+        budget, then the deadline if any. Returns (active settings, content
+        hash, (w, h))."""
         if not self.check_potrace():
             raise RuntimeError(
                 "Potrace not found. Set POTRACE_PATH in .env or install at the default location."
@@ -87,35 +245,175 @@ class PotraceColorConverter:
         if settings:
             active.update(settings)
 
-        # 1. Load RGBA
-        img = Image.open(image_path).convert("RGBA")
-        rgb = np.array(img.convert("RGB"))
-        alpha = np.array(img.getchannel("A"))
-        original_h, original_w = rgb.shape[:2]
+        # 1. Content key for the stage cache (decode happens in _preprocess)
+        content_key = hashlib.sha1(data).hexdigest()
 
-        # 2. Optional upscale (Lanczos RGB, nearest alpha)
-        upscale = int(active.get("upscale_factor", 3))
-        rgb, alpha = upscale_rgba(rgb, alpha, upscale)
-
-        # 3. Edge-preserving smooth (only on RGB)
-        rgb = edge_preserving_smooth(
-            rgb,
-            mode=str(active.get("smoothing", "mean_shift")),
-            spatial_radius=int(active.get("smooth_spatial_radius", 15)),
-            color_radius=int(active.get("smooth_color_radius", 20)),
+        # 1b. Check the peak-memory estimate (header only, no decode yet) and
+        # downgrade upscale/n_colors to fit this conversion's share of the
+        # budget, or refuse.
+        with Image.open(io.BytesIO(data)) as probe:
+            probe_w, probe_h = probe.size
+        active, self.applied_downgrades = fit_to_budget(
+            probe_w, probe_h, active, conversion_budget_bytes(self.cache.stats()["bytes"])
         )
+        for downgrade in self.applied_downgrades:
+            print(f"Warning: memory budget exceeded, downgraded {downgrade}")
 
-        # 4. Build opaque mask
-        alpha_threshold = int(active.get("alpha_threshold", 128))
-        opaque_mask = alpha >= alpha_threshold
+        # 1c. Fit the estimated runtime into the deadline, if one was given.
+        if deadline is not None:
+            active, downgrades, self.estimated_seconds = fit_to_deadline(
+                probe_w, probe_h, active, deadline
+            )
+            self.applied_downgrades += downgrades
+        return active, content_key, (probe_w, probe_h)
+
+    def _preprocess(
+        self,
+        data: bytes,
+        content_key: str,
+        active: dict,
+        size: Tuple[int, int],
+        decoded: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        progress: Optional[ProgressCallback] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Tuple[str, list, np.ndarray]:
+        """Run decode through masks. Returns (masks stage key, masks, palette)
+        where masks is a list of (color_idx, mask, area). size is the source
+        (w, h); decoded, if given, is the (rgb, alpha) result of the decode
+        stage.
+
+        Every stage goes through the shared stage cache, keyed by its parent
+        stage plus only the settings it reads, so re-runs that only change
+        downstream settings (e.g. alphamax) skip straight to that stage.
+        progress, if given, is called with each stage's name as it starts;
+        cancel, if given, is checked before each stage. Stages that are
+        actually computed (cache misses) feed their timings to the cost model.
+        """
+        progress = progress_or_noop(progress)
+        costs = stage_costs(size[0], size[1], active)
+
+        def run_stage(stage, parent_key, params, compute):
+            if cancel is not None:
+                cancel.check()
+            progress(stage)
 
-        # 5. k-means quantize opaque pixels in Lab
+            def timed():
+                start = time.perf_counter()
+                value = compute()
+                if stage in costs:
+                    cost_model.observe(*costs[stage], time.perf_counter() - start)
+                return value
+
+            return self.cache.run(stage, parent_key, params, timed)
+
+        def decode():
+            if decoded is not None:
+                return decoded
+            img = Image.open(io.BytesIO(data)).convert("RGBA")
+            return np.array(img.convert("RGB")), np.array(img.getchannel("A"))
+
+        key, (rgb, alpha) = run_stage("decode", content_key, {}, decode)
+
+        # 2-3. Optional upscale (Lanczos RGB, nearest alpha) and edge-preserving
+        # smooth (RGB only). Radii are specified in upscaled pixels; smoothing at
+        # source resolution runs on upscale**2 fewer pixels, so the spatial
+        # radius is rescaled to source pixels to keep the result comparable.
+        upscale = int(active.get("upscale_factor", 3))
+        smoothing = str(active.get("smoothing", "mean_shift"))
+        spatial_radius = int(active.get("smooth_spatial_radius", 15))
+        color_radius = int(active.get("smooth_color_radius", 20))
+        smooth_resolution = str(active.get("smooth_resolution", "upscaled"))
+        smooth_workers = int(active.get("smooth_workers", 0))
+        smooth_params = {
+            "smoothing": smoothing,
+            "smooth_spatial_radius": spatial_radius,
+            "smooth_color_radius": color_radius,
+            "smooth_resolution": smooth_resolution,
+            "upscale_factor": upscale,
+        }
+        if smooth_resolution == "source":
+            key, rgb = run_stage(
+                "smooth",
+                key,
+                smooth_params,
+                lambda: tiled_edge_preserving_smooth(
+                    rgb,
+                    mode=smoothing,
+                    spatial_radius=source_spatial_radius(spatial_radius, upscale),
+                    color_radius=color_radius,
+                    workers=smooth_workers,
+                ),
+            )
+            key, (rgb, alpha) = run_stage(
+                "upscale",
+                key,
+                {"upscale_factor": upscale},
+                lambda: upscale_rgba(rgb, alpha, upscale),
+            )
+        elif smooth_resolution == "upscaled":
+            key, (rgb, alpha) = run_stage(
+                "upscale",
+                key,
+                {"upscale_factor": upscale},
+                lambda: upscale_rgba(rgb, alpha, upscale),
+            )
+            key, rgb = run_stage(
+                "smooth",
+                key,
+                smooth_params,
+                lambda: tiled_edge_preserving_smooth(
+                    rgb,
+                    mode=smoothing,
+                    spatial_radius=spatial_radius,
+                    color_radius=color_radius,
+                    workers=smooth_workers,
+                ),
+            )
+        else:
+            raise ValueError(f"Unknown smooth_resolution: {smooth_resolution}")
+
+        # 4-5. Build opaque mask, then quantize opaque pixels (k-means in Lab,
+        # or histogram median cut)
+        alpha_threshold = int(active.get("alpha_threshold", 128))
         n_colors = int(active.get("n_colors", 8))
-        labels, centers_rgb = quantize_lab(rgb, opaque_mask, n_colors)
+        quantizer = str(active.get("quantizer", "kmeans"))
+        if quantizer not in ("kmeans", "median_cut"):
+            raise ValueError(f"Unknown quantizer: {quantizer}")
+
+        # k-means warm-starts from the last palette found for this image at
+        # this upscale, so tuning n_colors (or smoothing) converges quickly.
+        # Keyed on the content hash, not the stage key: the palette barely
+        # moves when upstream settings change, and the warm start survives.
+        image_key = f"{content_key}:x{upscale}"
+
+        def quantize():
+            opaque_mask = alpha >= alpha_threshold
+            if quantizer == "kmeans":
+                result = quantize_lab(
+                    rgb,
+                    opaque_mask,
+                    n_colors,
+                    initial_centers=palette_memory.get(image_key),
+                )
+                palette_memory.put(image_key, result[1])
+                return result
+            return quantize_histogram(rgb, opaque_mask, n_colors)
+
+        key, (labels, centers_rgb) = run_stage(
+            "quantize",
+            key,
+            {"alpha_threshold": alpha_threshold, "n_colors": n_colors, "quantizer": quantizer},
+            quantize,
+        )
 
         # 5b. Collapse near-duplicate clusters (AA gradients often steal clusters)
         merge_distance = float(active.get("merge_color_distance", 10))
-        labels, centers_rgb = merge_similar_colors(labels, centers_rgb, merge_distance)
+        key, (labels, centers_rgb) = run_stage(
+            "merge",
+            key,
+            {"merge_color_distance": merge_distance},
+            lambda: merge_similar_colors(labels, centers_rgb, merge_distance),
+        )
 
         # 6. Per-color: build mask → Potrace → collect
         min_region = int(active.get("min_region_pixels", 32))
@@ -123,6 +421,38 @@ class PotraceColorConverter:
         min_region_scaled = min_region * (upscale * upscale)
         mask_cleanup = bool(active.get("mask_cleanup", True))
 
+        def build_masks():
+            masks = []
+            for color_idx in range(centers_rgb.shape[0]):
+                mask = labels == color_idx
+                if mask_cleanup:
+                    mask = clean_mask(mask, upscale)
+                area = int(mask.sum())
+                if area < min_region_scaled:
+                    continue
+                masks.append((color_idx, mask, area))
+            return masks
+
+        key, masks = run_stage(
+            "masks",
+            key,
+            {"min_region_pixels": min_region, "mask_cleanup": mask_cleanup},
+            build_masks,
+        )
+        return key, masks, centers_rgb
+
+    def _trace_layers(
+        self,
+        layers_key: str,
+        masks: list,
+        centers_rgb: np.ndarray,
+        active: dict,
+        progress: Optional[ProgressCallback] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Iterator[PathEntry]:
+        """Trace each color mask with Potrace, largest area first, yielding
+        path entries as they complete. Each layer is cached on its own."""
+        progress = progress_or_noop(progress)
         potrace_settings = {
             "turdsize": active.get("turdsize", 2),
             "alphamax": active.get("alphamax", 1.0),
@@ -130,25 +460,25 @@ class PotraceColorConverter:
             "longcurve": active.get("longcurve", False),
         }
 
-        paths = []
-        for color_idx in range(centers_rgb.shape[0]):
-            mask = labels == color_idx
-            if mask_cleanup:
-                mask = clean_mask(mask, upscale)
-            area = int(mask.sum())
-            if area < min_region_scaled:
-                continue
-            traced = trace_mask(mask, self.potrace_path, potrace_settings)
+        def trace(mask):
+            start = time.perf_counter()
+            traced = trace_mask(mask, self.potrace_path, potrace_settings, cancel=cancel)
+            cost_model.observe("trace", mask.size, time.perf_counter() - start)
+            return traced
+
+        ordered = sorted(masks, key=lambda m: -m[2])
+        for i, (color_idx, mask, area) in enumerate(ordered, 1):
+            if cancel is not None:
+                cancel.check()
+            progress("trace", i, len(ordered))
+            _, traced = self.cache.run(
+                "trace",
+                layers_key,
+                dict(potrace_settings, color_idx=color_idx),
+                lambda: trace(mask),
+            )
             if not traced:
                 continue
             d, transform = traced
             r, g, b = centers_rgb[color_idx].tolist()
-            paths.append((d, transform, (int(r), int(g), int(b)), area))
-
-        if not paths:
-            raise RuntimeError("No traceable regions found after quantization.")
-
-        # 7. Compose layered SVG at original dimensions
-        output_path = self.output_dir / f"{image_path.stem}_color_precision.svg"
-        compose_svg(paths, original_w, original_h, upscale, output_path)
-        return output_path
+            yield (d, transform, (int(r), int(g), int(b)), area)
@@ -14,6 +14,12 @@ class PotraceColorSettings:
                 "description": "Number of palette colors after k-means. Each becomes one SVG layer.",
                 "range": [2, 16],
             },
+            "quantizer": {
+                "value": "kmeans",
+                "description": "Palette quantizer. kmeans clusters every opaque pixel (best on photos/gradients); median_cut works on a color histogram and is much faster on flat-color icons.",
+                "type": "enum",
+                "options": ["kmeans", "median_cut"],
+            },
             "upscale_factor": {
                 "value": 3,
                 "description": "Pre-trace upscale multiplier. Higher = sub-pixel-equivalent edge precision, slower.",
@@ -36,6 +42,17 @@ class PotraceColorSettings:
                 "description": "Color window radius for smoothing. Larger = more aggressive color merging.",
                 "range": [5, 50],
             },
+            "smooth_resolution": {
+                "value": "upscaled",
+                "description": "Where smoothing runs. upscaled = after upscaling (original behavior); source = before upscaling with the spatial radius rescaled, roughly upscale² times cheaper.",
+                "type": "enum",
+                "options": ["upscaled", "source"],
+            },
+            "smooth_workers": {
+                "value": 0,
+                "description": "Threads for tiled smoothing. 0 = this conversion's share of the CPUs; 1 = single full-image filter call.",
+                "range": [0, 32],
+            },
             "alpha_threshold": {
                 "value": 128,
                 "description": "Pixels with alpha below this are treated as transparent and excluded from tracing.",
@@ -76,6 +93,17 @@ class PotraceColorSettings:
                 "description": "Potrace --longcurve: DISABLES curve optimization, keeping every raw segment (many more anchor points). Leave off unless you need maximum fidelity.",
                 "type": "boolean",
             },
+            "svg_coordinates": {
+                "value": "potrace",
+                "description": "SVG path encoding. potrace = Potrace's 10x coordinates under per-layer transforms; compact = transforms baked into pixel-space relative coordinates (much smaller, faster to render).",
+                "type": "enum",
+                "options": ["potrace", "compact"],
+            },
+            "svg_precision": {
+                "value": 2,
+                "description": "Decimal places for compact SVG coordinates. Higher = more accurate, larger file.",
+                "range": [0, 4],
+            },
         }
 
         self.current_settings = self._load_settings()
@@ -0,0 +1,111 @@
+"""Size-bounded LRU cache for intermediate potrace-color pipeline stages.
+
+Each stage result is keyed by its parent stage's key plus only the settings
+that affect that stage, so changing e.g. `alphamax` reuses everything up to
+and including the per-color masks and re-runs only the trace stage.
+
+Cached values are shared between conversions: stages must treat inputs they
+receive from the cache as read-only.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _value_nbytes(value: Any) -> int:
+    """Approximate memory held by a cached stage value."""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(_value_nbytes(v) for v in value)
+    if isinstance(value, str):
+        return len(value)
+    return 64
+
+
+def stage_key(parent_key: str, stage: str, params: Dict[str, Any]) -> str:
+    """Derive a stage key from its parent key, name and relevant settings."""
+    payload = json.dumps([parent_key, stage, params], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        stage: str,
+        parent_key: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+    ) -> Tuple[str, Any]:
+        """Return (key, value) for a stage, computing and storing it on a miss."""
+        key = stage_key(parent_key, stage, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits[stage] = self._hits.get(stage, 0) + 1
+                return key, entry[1]
+            self._misses[stage] = self._misses.get(stage, 0) + 1
+
+        # Compute outside the lock; concurrent misses on the same key simply
+        # both compute and the later store wins.
+        value = compute()
+        self._store(key, stage, value)
+        return key, value
+
+    def _store(self, key: str, stage: str, value: Any) -> None:
+        size = _value_nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (stage, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = sorted(set(self._hits) | set(self._misses))
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "stages": {
+                    s: {"hits": self._hits.get(s, 0), "misses": self._misses.get(s, 0)}
+                    for s in stages
+                },
+            }
+
+
+# Shared across converter instances (the API builds one per request).
+# POTRACE_COLOR_CACHE_MB=0 disables caching.
+_cache_mb = int(os.getenv("POTRACE_COLOR_CACHE_MB", "512"))
+stage_cache = StageCache(max_bytes=_cache_mb * 1024 * 1024)
@@ -1,11 +1,199 @@
 """Composes per-color Potrace paths into one layered SVG."""
+import re
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Iterable, List, Tuple
 
 
 # Each path entry: (d_string, potrace_transform, (r, g, b), area_in_pixels)
 PathEntry = Tuple[str, str, Tuple[int, int, int], int]
 
+# Affine (a, b, c, d, e, f) as in SVG matrix(): x' = a*x + c*y + e, y' = b*x + d*y + f
+Affine = Tuple[float, float, float, float, float, float]
+
+_IDENTITY: Affine = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+_TRANSFORM_RE = re.compile(r"(matrix|translate|scale)\s*\(([^)]*)\)")
+_PATH_TOKEN_RE = re.compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+# Potrace only emits M/m, l, c and z; H/V are accepted for robustness.
+_ARG_COUNTS = {"m": 2, "l": 2, "h": 1, "v": 1, "c": 6}
+
+
+def _multiply(m: Affine, n: Affine) -> Affine:
+    a1, b1, c1, d1, e1, f1 = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def parse_transform(transform: str) -> Affine:
+    """Parse a translate/scale/matrix transform list into one affine."""
+    result = _IDENTITY
+    for name, raw_args in _TRANSFORM_RE.findall(transform or ""):
+        args = [float(v) for v in re.split(r"[\s,]+", raw_args.strip()) if v]
+        if name == "translate":
+            step = (1.0, 0.0, 0.0, 1.0, args[0], args[1] if len(args) > 1 else 0.0)
+        elif name == "scale":
+            step = (args[0], 0.0, 0.0, args[1] if len(args) > 1 else args[0], 0.0, 0.0)
+        else:
+            step = tuple(args[:6])
+        result = _multiply(result, step)
+    return result
+
+
+def _fmt(value: float, precision: int) -> str:
+    """Shortest decimal form: no trailing zeros, no leading zero, no '-0'."""
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if text == "-0":
+        text = "0"
+    if text.startswith("0."):
+        text = text[1:]
+    elif text.startswith("-0."):
+        text = "-" + text[2:]
+    return text
+
+
+def bake_path(d: str, transform: Affine, precision: int) -> str:
+    """Rewrite path data in absolute pixel space using compact relative commands.
+
+    Every point is mapped through `transform`, rounded to `precision`
+    decimals, and emitted relative to the previous *rounded* point, so
+    rounding error never accumulates along a path. Segments that round to
+    zero length are dropped. Repeated command letters are omitted and
+    separators are only written where SVG syntax needs them.
+    """
+    a, b, c, dd, e, f = transform
+    unit = 10 ** precision
+    tokens = _PATH_TOKEN_RE.findall(d)
+
+    pieces: List[str] = []
+    prev_number = ""  # last emitted number, "" right after a command letter
+    last_letter = ""
+
+    def emit(letter: str, values: List[int]) -> None:
+        nonlocal prev_number, last_letter
+        if letter != last_letter or letter == "m":
+            pieces.append(letter)
+            prev_number = ""
+            last_letter = letter
+        for v in values:
+            num = _fmt(v / unit, precision)
+            if prev_number and not (
+                num.startswith("-") or (num.startswith(".") and "." in prev_number)
+            ):
+                pieces.append(" ")
+            pieces.append(num)
+            prev_number = num
+
+    # Current point and subpath start: in source units and in rounded output units.
+    cx = cy = start_x = start_y = 0.0
+    ox = oy = start_ox = start_oy = 0
+    cmd = ""
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            cmd = tokens[i]
+            i += 1
+            if cmd in "Zz":
+                pieces.append("z")
+                prev_number, last_letter = "", "z"
+                cx, cy, ox, oy = start_x, start_y, start_ox, start_oy
+                continue
+        lower = cmd.lower()
+        if lower not in _ARG_COUNTS:
+            raise ValueError(f"Unsupported path command: {cmd!r}")
+        n = _ARG_COUNTS[lower]
+        args = [float(v) for v in tokens[i : i + n]]
+        if len(args) < n:
+            raise ValueError("Truncated path data")
+        i += n
+        relative = cmd.islower()
+
+        if lower == "h":
+            args, lower = [args[0], 0.0] if relative else [args[0], cy], "l"
+        elif lower == "v":
+            args, lower = [0.0, args[0]] if relative else [cx, args[0]], "l"
+
+        points = []
+        for j in range(0, n if n > 1 else 2, 2):
+            px, py = args[j], args[j + 1]
+            if relative:
+                # All points of a relative segment are offsets from its start.
+                px, py = cx + px, cy + py
+            points.append((px, py))
+        rounded = [
+            (round((a * px + c * py + e) * unit), round((b * px + dd * py + f) * unit))
+            for px, py in points
+        ]
+        deltas: List[int] = []
+        for rx, ry in rounded:
+            deltas.extend((rx - ox, ry - oy))
+        # A line or curve that rounds away entirely draws nothing; skip it.
+        if lower == "m" or any(deltas):
+            emit(lower, deltas)
+
+        cx, cy = points[-1]
+        ox, oy = rounded[-1]
+        if lower == "m":
+            start_x, start_y, start_ox, start_oy = cx, cy, ox, oy
+            # Extra coordinate pairs after a moveto are implicit linetos.
+            cmd = "l" if relative else "L"
+    return "".join(pieces)
+
+
+def svg_header(
+    original_width: int, original_height: int, upscale: int, coordinates: str = "potrace"
+) -> str:
+    """Opening tags for a composed SVG, up to and including the layer group."""
+    if coordinates == "compact":
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" '
+            f'viewBox="0 0 {original_width} {original_height}" '
+            f'width="{original_width}" height="{original_height}">\n'
+            '<g stroke="none" fill-rule="evenodd">\n'
+        )
+    if coordinates != "potrace":
+        raise ValueError(f"Unknown SVG coordinates mode: {coordinates}")
+    outer = f'<g transform="scale({1.0 / upscale})">' if upscale > 1 else "<g>"
+    return (
+        '<?xml version="1.0" standalone="no"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+        f'viewBox="0 0 {original_width} {original_height}" '
+        f'width="{original_width}" height="{original_height}">\n'
+        f"{outer}\n"
+    )
+
+
+def svg_layer(
+    entry: PathEntry, upscale: int, coordinates: str = "potrace", precision: int = 2
+) -> str:
+    """One color layer, as emitted inside the group opened by svg_header."""
+    d, potrace_transform, (r, g, b), _area = entry
+    if coordinates == "compact":
+        outer: Affine = (1.0 / upscale, 0.0, 0.0, 1.0 / upscale, 0.0, 0.0)
+        affine = _multiply(outer, parse_transform(potrace_transform))
+        baked = bake_path(d, affine, precision)
+        return f'<path fill="#{int(r):02x}{int(g):02x}{int(b):02x}" d="{baked}"/>\n'
+    fill = f'rgb({int(r)},{int(g)},{int(b)})'
+    if potrace_transform:
+        return (
+            f'<g transform="{potrace_transform}" fill="{fill}" '
+            f'stroke="none" fill-rule="evenodd">'
+            f'<path d="{d}"/></g>\n'
+        )
+    return f'<path fill="{fill}" stroke="none" fill-rule="evenodd" d="{d}"/>\n'
+
+
+def svg_footer() -> str:
+    """Closing tags matching svg_header."""
+    return "</g>\n</svg>"
+
 
 def compose_svg(
     paths: Iterable[PathEntry],
@@ -13,6 +201,8 @@ def compose_svg(
     original_height: int,
     upscale: int,
     output_path: Path,
+    coordinates: str = "potrace",
+    precision: int = 2,
 ) -> None:
     """Emit a single SVG with one <path> per color, stacked biggest-first.
 
@@ -26,38 +216,19 @@ def compose_svg(
     renders at the original (pre-upscale) dimensions. The viewBox uses the
     original size — downstream tools display at the source resolution while
     benefiting from the sub-pixel precision the upscale granted.
+
+    With coordinates="compact", both transforms are instead baked into the
+    path data (see bake_path): paths are emitted directly in original pixel
+    space with relative commands rounded to `precision` decimals, and no
+    per-layer <g> wrappers.
+
+    The header/layer/footer pieces are also exposed separately so the SVG can
+    be streamed layer by layer.
     """
     # Sort largest area first so bigger regions render underneath smaller ones.
     ordered = sorted(paths, key=lambda p: -p[3])
 
-    lines = [
-        '<?xml version="1.0" standalone="no"?>',
-        (
-            f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
-            f'viewBox="0 0 {original_width} {original_height}" '
-            f'width="{original_width}" height="{original_height}">'
-        ),
-    ]
-
-    if upscale > 1:
-        lines.append(f'<g transform="scale({1.0 / upscale})">')
-    else:
-        lines.append("<g>")
-
-    for d, potrace_transform, (r, g, b), _area in ordered:
-        fill = f'rgb({int(r)},{int(g)},{int(b)})'
-        if potrace_transform:
-            lines.append(
-                f'<g transform="{potrace_transform}" fill="{fill}" '
-                f'stroke="none" fill-rule="evenodd">'
-                f'<path d="{d}"/></g>'
-            )
-        else:
-            lines.append(
-                f'<path fill="{fill}" stroke="none" fill-rule="evenodd" d="{d}"/>'
-            )
-
-    lines.append("</g>")
-    lines.append("</svg>")
-
-    output_path.write_text("\n".join(lines), encoding="utf-8")
+    parts = [svg_header(original_width, original_height, upscale, coordinates)]
+    parts.extend(svg_layer(entry, upscale, coordinates, precision) for entry in ordered)
+    parts.append(svg_footer())
+    output_path.write_text("".join(parts), encoding="utf-8")
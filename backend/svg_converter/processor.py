@@ -6,7 +6,7 @@ from PIL import Image
 import numpy as np
 from typing import Optional
 from dotenv import load_dotenv
-from backend.core.utils import loading_animation
+from backend.core.utils import ProgressCallback, loading_animation, progress_or_noop
 
 load_dotenv()
 
@@ -72,20 +72,45 @@ class SVGConverter:
 
         print("\nReturning to main menu...")
 
-    def convert(self, image_path: Path, settings: dict = None) -> Path:
+    def convert(
+        self, image_path: Path, settings: dict = None, progress: ProgressCallback = None
+    ) -> Path:
         """Programmatic API for SVG conversion. Returns output SVG path.
 
         Args:
             image_path: Path to a background-removed PNG image
             settings: Optional settings override dict (threshold, turdsize, etc.)
+            progress: Optional hook called as each stage starts (decode, threshold, trace)
         """
+        progress_or_noop(progress)("decode")
+        with Image.open(image_path) as image:
+            image.load()
+            return self.convert_image(image, image_path.stem, settings, progress)
+
+    def convert_image(
+        self,
+        image: Image.Image,
+        stem: str,
+        settings: dict = None,
+        progress: ProgressCallback = None,
+    ) -> Path:
+        """Same as convert, for an already-decoded image. Writes <stem>_vector.svg.
+
+        Args:
+            image: Image with alpha (converted to RGBA if needed)
+            stem: Output file name stem
+            settings: Optional settings override dict (threshold, turdsize, etc.)
+            progress: Optional hook called as each stage starts (threshold, trace)
+        """
+        progress = progress_or_noop(progress)
         if not self._check_potrace():
             raise RuntimeError("Potrace not found. Check POTRACE_PATH in .env")
 
         active_settings = settings if settings else self.settings
 
         # Convert to black & white
-        bw_image = self._convert_to_black_white(image_path, active_settings.get("threshold", 128))
+        progress("threshold")
+        bw_image = self._alpha_to_black_white(image, active_settings.get("threshold", 128))
 
         # Save temporary bitmap
         with tempfile.NamedTemporaryFile(suffix=".pbm", delete=False) as temp_file:
@@ -93,7 +118,7 @@ class SVGConverter:
             bw_image.save(temp_bmp_path, "PPM")
 
         try:
-            output_filename = f"{image_path.stem}_vector.svg"
+            output_filename = f"{stem}_vector.svg"
             output_path = self.output_dir / output_filename
 
             cmd = [
@@ -112,6 +137,7 @@ class SVGConverter:
             if active_settings.get("longcurve", False):
                 cmd.append("--longcurve")
 
+            progress("trace")
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
 
             if result.returncode != 0:
@@ -239,8 +265,11 @@ class SVGConverter:
     def _convert_to_black_white(self, image_path: Path, threshold: int = None) -> Image.Image:
         """Convert PNG image to black and white bitmap for Potrace using its alpha channel."""
         # Load image with transparency, images should already have background removed
-        image = Image.open(image_path)
+        with Image.open(image_path) as image:
+            return self._alpha_to_black_white(image, threshold)
 
+    def _alpha_to_black_white(self, image: Image.Image, threshold: int = None) -> Image.Image:
+        """Black silhouette on white from an image's alpha channel."""
         # Convert to RGBA if not already to ensure it has an alpha channel
         if image.mode != "RGBA":
             image = image.convert("RGBA")
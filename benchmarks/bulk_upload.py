@@ -0,0 +1,76 @@
+"""Ingesting a brand pack: one /upload call per file vs one /upload/bulk call.
+
+    python -m benchmarks.bulk_upload [--files 200] [--size 1000]
+
+Generates --files synthetic icons of --size px (not grid-aligned, so each
+is resampled), then uploads them to the in-process app: once file by file
+through /api/upload, once as a zip through /api/upload/bulk. Uploaded
+files are removed from the input folder afterwards.
+"""
+import argparse
+import io
+import json
+import time
+import zipfile
+from typing import List
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend.api.app import create_app
+from backend.api.dependencies import get_input_dir
+from benchmarks.common import synthetic_icon
+
+
+def make_pngs(count: int, size: int) -> List[bytes]:
+    rgb, alpha = synthetic_icon(size)
+    pngs = []
+    for i in range(count):
+        variant = rgb.copy()
+        variant[0, 0] = (i % 256, i // 256, 0)
+        buf = io.BytesIO()
+        Image.fromarray(np.dstack([variant, alpha])).save(buf, "PNG")
+        pngs.append(buf.getvalue())
+    return pngs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size", type=int, default=1000)
+    args = parser.parse_args()
+
+    pngs = make_pngs(args.files, args.size)
+    names = [f"_bulk_bench_{i}.png" for i in range(args.files)]
+    client = TestClient(create_app())
+    try:
+        start = time.perf_counter()
+        for name, data in zip(names, pngs):
+            client.post("/api/upload", files={"file": (name, data, "image/png")}).raise_for_status()
+        single = time.perf_counter() - start
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+            for name, data in zip(names, pngs):
+                zf.writestr(f"pack/{name}", data)
+        start = time.perf_counter()
+        res = client.post(
+            "/api/upload/bulk",
+            files=[("files", ("pack.zip", archive.getvalue(), "application/zip"))],
+        )
+        results = [json.loads(line) for line in res.text.splitlines()]
+        bulk = time.perf_counter() - start
+        failed = sum("error" in r for r in results)
+    finally:
+        for name in names:
+            (get_input_dir() / name).unlink(missing_ok=True)
+
+    print(f"{args.files} files of {args.size}px")
+    label = f"/upload x{args.files}"
+    print(f"  {label:<20} {single:7.2f}s  {args.files / single:6.1f} files/s")
+    print(f"  {'/upload/bulk (zip)':<20} {bulk:7.2f}s  {args.files / bulk:6.1f} files/s  ({failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
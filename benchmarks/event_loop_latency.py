@@ -0,0 +1,120 @@
+"""/api/images listing latency while conversions are running.
+
+    python -m benchmarks.event_loop_latency [--clients 4] [--seconds 10] [--size 1536]
+
+Starts the API with uvicorn on a free local port, then measures
+GET /api/images/input latency, first idle and then while --clients threads
+keep posting VTracer conversions of a synthetic image (written to the input
+folder and removed afterwards, with its SVGs). With blocking work kept off the event loop
+the two distributions should be close; before, every listing waited for
+the conversion in progress.
+"""
+import argparse
+import json
+import socket
+import statistics
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import uvicorn
+from PIL import Image
+
+from backend.api.app import app
+from backend.api.dependencies import get_input_dir, get_output_subdir
+from benchmarks.common import synthetic_icon
+
+IMAGE_NAME = "_latency_bench.png"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(url: str) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as res:
+        res.read()
+    return time.perf_counter() - start
+
+
+def post(url: str, payload: dict) -> None:
+    req = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req) as res:
+        res.read()
+
+
+def sample(url: str, seconds: float, interval: float = 0.05) -> list:
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        latencies.append(get(url))
+        time.sleep(interval)
+    return latencies
+
+
+def summary(latencies: list) -> str:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[min(len(ms) - 1, int(0.95 * len(ms)))]
+    return (
+        f"n={len(ms):4d}  p50 {statistics.median(ms):7.1f} ms  "
+        f"p95 {p95:7.1f} ms  max {ms[-1]:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--size", type=int, default=1536)
+    args = parser.parse_args()
+
+    input_dir = get_input_dir()
+    input_dir.mkdir(parents=True, exist_ok=True)
+    rgb, alpha = synthetic_icon(args.size)
+    # Noise gives VTracer many small regions, i.e. a slow conversion.
+    noise = np.random.default_rng(0).integers(0, 40, rgb.shape, dtype=np.uint8)
+    Image.fromarray(np.dstack([np.minimum(rgb, 215) + noise, alpha])).save(input_dir / IMAGE_NAME)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base = f"http://127.0.0.1:{port}/api"
+    listing = f"{base}/images/input"
+
+    try:
+        print(f"idle:             {summary(sample(listing, args.seconds / 2))}")
+
+        stop = threading.Event()
+        done = []
+
+        def client():
+            while not stop.is_set():
+                post(f"{base}/color-svg/convert", {"image": IMAGE_NAME})
+                done.append(1)
+
+        workers = [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+        for w in workers:
+            w.start()
+        busy = sample(listing, args.seconds)
+        stop.set()
+        for w in workers:
+            w.join()
+        print(f"{args.clients} converting:    {summary(busy)}  ({len(done)} conversions)")
+    finally:
+        server.should_exit = True
+        (input_dir / IMAGE_NAME).unlink(missing_ok=True)
+        for svg in get_output_subdir("color_svg").glob(f"{Path(IMAGE_NAME).stem}*.svg"):
+            svg.unlink()
+
+
+if __name__ == "__main__":
+    main()
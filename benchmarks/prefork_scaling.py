@@ -0,0 +1,184 @@
+"""Memory and throughput of the pre-forked server at several worker counts.
+
+    python -m benchmarks.prefork_scaling [--workers 1,2,4,8] [--engine background]
+        [--preload rembg:bria-rmbg] [--clients 8] [--seconds 30]
+
+For each worker count, starts `python -m backend.api.prefork` on a free
+port and keeps --clients threads posting conversions for --seconds. Each
+client converts its own synthetic icon (written to the input folder and
+removed afterwards), so identical requests are never coalesced. Reports
+completed requests per second, and the summed RSS and PSS of the parent
+and its workers after the run. RSS counts shared copy-on-write pages once
+per process; PSS splits them between the sharers, so with preloaded
+models PSS should grow far slower than RSS as workers are added.
+
+--engine potrace-color (median cut, no smoothing) measures serving
+overhead without any models. Linux only (reads /proc).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from backend.api.dependencies import get_input_dir, get_output_subdir
+from benchmarks.common import synthetic_icon
+
+ENGINES = {
+    "background": (
+        "/api/background/process",
+        {"model_type": "rembg", "model_name": "bria-rmbg"},
+        "background_removed",
+    ),
+    "potrace-color": (
+        "/api/potrace-color/convert",
+        {
+            "settings": {
+                "quantizer": "median_cut",
+                "smoothing": "none",
+                "upscale_factor": 1,
+                "n_colors": 6,
+            }
+        },
+        "color_svg",
+    ),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base: str, timeout: float = 300.0) -> None:
+    end = time.perf_counter() + timeout
+    while time.perf_counter() < end:
+        try:
+            with urllib.request.urlopen(f"{base}/api/scheduler/stats", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def memory_kb(pid: int) -> Tuple[int, int]:
+    """(RSS, PSS) of one process in kB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                fields[parts[0]] = int(parts[1])
+    return fields.get("Rss:", 0), fields.get("Pss:", 0)
+
+
+def children(pid: int) -> List[int]:
+    found = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        found += [int(c) for c in (task / "children").read_text().split()]
+    return found
+
+
+def make_images(clients: int) -> List[str]:
+    rgb, alpha = synthetic_icon(512)
+    names = []
+    get_input_dir().mkdir(parents=True, exist_ok=True)
+    for i in range(clients):
+        variant = rgb.copy()
+        variant[0, 0] = (i % 256, i // 256, 0)
+        name = f"_prefork_bench_{i}.png"
+        Image.fromarray(np.dstack([variant, alpha])).save(get_input_dir() / name)
+        names.append(name)
+    return names
+
+
+def post(url: str, payload: dict) -> bool:
+    req = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(req) as res:
+            res.read()
+        return True
+    except urllib.error.HTTPError:
+        return False
+
+
+def run_load(url: str, payload: dict, images: List[str], seconds: float) -> Dict[str, int]:
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    end = time.perf_counter() + seconds
+
+    def client(image: str) -> None:
+        while time.perf_counter() < end:
+            ok = post(url, dict(payload, image=image))
+            with lock:
+                counts["ok" if ok else "failed"] += 1
+
+    threads = [threading.Thread(target=client, args=(image,)) for image in images]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="background")
+    parser.add_argument("--preload", default="rembg:bria-rmbg")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    path, payload, output_kind = ENGINES[args.engine]
+    images = make_images(args.clients)
+    print(f"{'workers':>7} {'req/s':>8} {'failed':>6} {'RSS MB':>8} {'PSS MB':>8}")
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable, "-m", "backend.api.prefork",
+                    "--workers", str(workers), "--port", str(port),
+                    "--preload", args.preload,
+                ],
+                stdout=subprocess.DEVNULL,
+                # Every request is a repeat; measure conversions, not cache hits.
+                env=dict(os.environ, POTRACE_COLOR_CACHE_MB="0"),
+            )
+            try:
+                base = f"http://127.0.0.1:{port}"
+                wait_ready(base)
+                # Let every worker finish starting before measuring.
+                time.sleep(2)
+                start = time.perf_counter()
+                counts = run_load(base + path, payload, images, args.seconds)
+                rate = counts["ok"] / (time.perf_counter() - start)
+                pids = [server.pid] + children(server.pid)
+                rss, pss = (sum(m) / 1024 for m in zip(*(memory_kb(p) for p in pids)))
+                print(f"{workers:>7} {rate:>8.2f} {counts['failed']:>6} {rss:>8.0f} {pss:>8.0f}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        for name in images:
+            (get_input_dir() / name).unlink(missing_ok=True)
+            for out in get_output_subdir(output_kind).glob(f"{Path(name).stem}*"):
+                out.unlink()
+
+
+if __name__ == "__main__":
+    main()
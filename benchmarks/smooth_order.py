@@ -0,0 +1,63 @@
+"""Compare smoothing after upscaling (original order) against smoothing at
+source resolution, on the potrace-color defaults (mean_shift, upscale 3).
+
+    python -m benchmarks.smooth_order [image.png] [--size 512]
+
+Reports wall time of the upscale+smooth stage for both orders, and how far
+the quantized palettes they produce are from each other.
+"""
+import argparse
+
+from backend.potrace_color_converter.preprocess import (
+    edge_preserving_smooth,
+    merge_similar_colors,
+    quantize_lab,
+    source_spatial_radius,
+    upscale_rgba,
+)
+from benchmarks.common import load_rgba, mean_delta_e, palette_image, timed
+
+
+def smooth_upscaled(rgb, alpha, upscale, mode, sp, sr):
+    rgb, alpha = upscale_rgba(rgb, alpha, upscale)
+    return edge_preserving_smooth(rgb, mode, sp, sr), alpha
+
+
+def smooth_source(rgb, alpha, upscale, mode, sp, sr):
+    rgb = edge_preserving_smooth(rgb, mode, source_spatial_radius(sp, upscale), sr)
+    return upscale_rgba(rgb, alpha, upscale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("image", nargs="?")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--upscale", type=int, default=3)
+    parser.add_argument("--smoothing", default="mean_shift")
+    parser.add_argument("--spatial", type=int, default=15)
+    parser.add_argument("--color", type=int, default=20)
+    parser.add_argument("--n-colors", type=int, default=8)
+    args = parser.parse_args()
+
+    rgb, alpha = load_rgba(args.image, args.size)
+    params = (args.upscale, args.smoothing, args.spatial, args.color)
+
+    results = {}
+    for name, fn in (("upscaled", smooth_upscaled), ("source", smooth_source)):
+        (smoothed, alpha_up), seconds = timed(fn, rgb, alpha, *params)
+        opaque = alpha_up >= 128
+        labels, centers = quantize_lab(smoothed, opaque, args.n_colors)
+        labels, centers = merge_similar_colors(labels, centers, 10)
+        results[name] = (seconds, palette_image(labels, centers), opaque, centers.shape[0])
+        print(f"{name:>9}: smooth stage {seconds:7.3f}s, {centers.shape[0]} colors")
+
+    t_up, img_up, opaque, _ = results["upscaled"]
+    t_src, img_src, _, _ = results["source"]
+    changed = (abs(img_up.astype(int) - img_src.astype(int)).sum(axis=2) > 0)[opaque].mean()
+    print(f"speedup: {t_up / max(t_src, 1e-9):.1f}x")
+    print(f"mean Lab distance between quantized outputs: {mean_delta_e(img_up, img_src, opaque):.2f}")
+    print(f"opaque pixels with a different palette color: {changed * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
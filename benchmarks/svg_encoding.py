@@ -0,0 +1,73 @@
+"""Byte size and parse/render time of potrace-color SVG encodings.
+
+    python -m benchmarks.svg_encoding [icon.png ...] [--precision 1 2]
+
+Converts each icon once per encoding (the stage cache means only the
+compose step re-runs) and compares the original Potrace-coordinate output
+with compact baked coordinates. Parse time uses xml.etree; render time is
+reported when cairosvg is installed. Requires Potrace (POTRACE_PATH).
+Without arguments, synthetic icons at 128/256/512px are used.
+"""
+import argparse
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from backend.potrace_color_converter.processor import PotraceColorConverter
+from benchmarks.common import synthetic_icon
+
+try:
+    import cairosvg
+except (ImportError, OSError):
+    cairosvg = None
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--precision", type=int, nargs="+", default=[1, 2])
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="iconforge_bench_"))
+    images = [Path(p) for p in args.images]
+    if not images:
+        for size in (128, 256, 512):
+            rgb, alpha = synthetic_icon(size)
+            path = workdir / f"synthetic_{size}.png"
+            Image.fromarray(np.dstack([rgb, alpha])).save(path)
+            images.append(path)
+
+    converter = PotraceColorConverter()
+    encodings = [("potrace", None)] + [("compact", p) for p in args.precision]
+    print(f"{'image':<24} {'encoding':<12} {'bytes':>9} {'parse ms':>9} {'render ms':>10}")
+    for image in images:
+        for mode, precision in encodings:
+            converter.output_dir = workdir / f"{mode}{precision or ''}"
+            converter.output_dir.mkdir(exist_ok=True)
+            overrides = {"svg_coordinates": mode}
+            if precision is not None:
+                overrides["svg_precision"] = precision
+            svg = converter.convert(image, overrides).read_bytes()
+            parse_ms = best_of(lambda: ET.fromstring(svg.split(b"?>", 1)[-1])) * 1000
+            render = "n/a"
+            if cairosvg is not None:
+                render = f"{best_of(lambda: cairosvg.svg2png(bytestring=svg)) * 1000:10.2f}"
+            label = mode if precision is None else f"compact/{precision}"
+            print(f"{image.name:<24} {label:<12} {len(svg):>9} {parse_ms:9.3f} {render:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Scaling of tile-parallel edge-preserving smoothing.
+
+    python -m benchmarks.tiled_smooth [image.png] [--size 512] [--upscale 3]
+
+Times tiled_edge_preserving_smooth at 1/2/4/8 workers on the upscaled
+image and checks each result against the single full-image call.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from backend.potrace_color_converter.preprocess import (
+    edge_preserving_smooth,
+    tiled_edge_preserving_smooth,
+    upscale_rgba,
+)
+from benchmarks.common import load_rgba, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("image", nargs="?")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--upscale", type=int, default=3)
+    parser.add_argument("--smoothing", default="mean_shift")
+    parser.add_argument("--spatial", type=int, default=15)
+    parser.add_argument("--color", type=int, default=20)
+    parser.add_argument("--tile-size", type=int, default=512)
+    args = parser.parse_args()
+
+    rgb, alpha = load_rgba(args.image, args.size)
+    rgb, _ = upscale_rgba(rgb, alpha, args.upscale)
+    print(f"{rgb.shape[1]}x{rgb.shape[0]} {args.smoothing}, {os.cpu_count()} CPUs")
+
+    reference, base = timed(
+        edge_preserving_smooth, rgb, args.smoothing, args.spatial, args.color,
+        repeat=3,
+    )
+    print(f"single call : {base:7.3f}s")
+    for workers in (1, 2, 4, 8):
+        out, seconds = timed(
+            tiled_edge_preserving_smooth, rgb, args.smoothing, args.spatial,
+            args.color, workers, tile_size=args.tile_size, repeat=3,
+        )
+        diff = np.abs(out.astype(np.int16) - reference.astype(np.int16)).max(axis=2)
+        print(
+            f"{workers} worker(s): {seconds:7.3f}s  speedup {base / seconds:4.2f}x  "
+            f"differing pixels {(diff > 0).mean() * 100:.4f}%  max diff {int(diff.max())}"
+        )
+
+
+if __name__ == "__main__":
+    main()
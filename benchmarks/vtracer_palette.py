@@ -0,0 +1,75 @@
+"""Effect of the palette pre-pass on VTracer conversions.
+
+    python -m benchmarks.vtracer_palette [image.png ...] [--colors 8 16 32]
+        [--settings '{"color_precision": 8}']
+
+Converts each image with palette_colors off and at each --colors value
+(other settings from color_svg_settings.json plus --settings) and reports conversion time
+(including the pre-pass), color layer count (distinct fills), path count
+and SVG size. Without arguments, the synthetic icon at 512/1024px is used.
+"""
+import argparse
+import io
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from backend.color_svg_converter.processor import ColorSVGConverter
+from benchmarks.common import synthetic_icon
+
+
+def measure(converter, data, settings, repeat):
+    best = float("inf")
+    svg = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        svg = converter.convert_bytes(data, "png", settings)
+        best = min(best, time.perf_counter() - start)
+    layers = len(set(re.findall(r'fill="([^"]+)"', svg)))
+    return best, layers, svg.count("<path"), len(svg.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--colors", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--settings", type=json.loads, default={})
+    args = parser.parse_args()
+
+    inputs = [(Path(p).name, Path(p).read_bytes()) for p in args.images]
+    if not inputs:
+        for size in (512, 1024):
+            rgb, alpha = synthetic_icon(size)
+            buf = io.BytesIO()
+            Image.fromarray(np.dstack([rgb, alpha])).save(buf, "PNG")
+            inputs.append((f"synthetic_{size}", buf.getvalue()))
+
+    converter = ColorSVGConverter()
+    print(f"{'image':<20} {'palette':>7} {'time s':>8} {'layers':>7} {'paths':>6} {'bytes':>9}")
+    for name, data in inputs:
+        base = None
+        for colors in [0] + args.colors:
+            seconds, layers, paths, size = measure(
+                converter, data, dict(args.settings, palette_colors=colors), args.repeat
+            )
+            line = (
+                f"{name:<20} {colors or 'off':>7} {seconds:8.3f} {layers:>7} "
+                f"{paths:>6} {size:>9}"
+            )
+            if base is None:
+                base = (seconds, layers, paths, size)
+            else:
+                line += (
+                    f"  ({base[0] / seconds:.1f}x faster, "
+                    f"{100 * (1 - size / base[3]):.0f}% smaller)"
+                )
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
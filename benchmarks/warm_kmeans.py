@@ -0,0 +1,65 @@
+"""Convergence time of warm-started vs. cold k-means over a tuning session.
+
+    python -m benchmarks.warm_kmeans [image.png] [--size 512] [--upscale 3]
+
+Replays a sequence of n_colors tweaks on one image. "cold" runs quantize_lab
+from k-means++ every time; "warm" seeds each run with the previous palette.
+Compactness is the mean squared Lab distance of pixels to their center
+(lower is better) so the quality cost of the shortcut is visible.
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+from backend.potrace_color_converter.preprocess import (
+    edge_preserving_smooth,
+    quantize_lab,
+    upscale_rgba,
+)
+from benchmarks.common import load_rgba, timed
+
+SESSION = (8, 10, 6, 8, 12, 8, 7)
+
+
+def compactness(rgb, labels, centers_rgb):
+    opaque = labels >= 0
+    lab = cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB).astype(np.float32)[opaque]
+    centers_lab = cv2.cvtColor(centers_rgb.reshape(1, -1, 3), cv2.COLOR_RGB2LAB).reshape(-1, 3)
+    return float(((lab - centers_lab[labels[opaque]].astype(np.float32)) ** 2).sum(axis=1).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("image", nargs="?")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--upscale", type=int, default=3)
+    args = parser.parse_args()
+
+    rgb, alpha = load_rgba(args.image, args.size)
+    rgb, alpha = upscale_rgba(rgb, alpha, args.upscale)
+    rgb = edge_preserving_smooth(rgb, "bilateral", 15, 20)
+    opaque = alpha >= 128
+
+    totals = {"cold": 0.0, "warm": 0.0}
+    previous = None
+    print(f"{'k':>3} {'cold s':>8} {'warm s':>8} {'cold err':>9} {'warm err':>9}")
+    for k in SESSION:
+        (cold_labels, cold_centers), cold_s = timed(quantize_lab, rgb, opaque, k)
+        (warm_labels, warm_centers), warm_s = timed(
+            quantize_lab, rgb, opaque, k, initial_centers=previous
+        )
+        previous = warm_centers
+        totals["cold"] += cold_s
+        totals["warm"] += warm_s
+        print(
+            f"{k:>3} {cold_s:8.3f} {warm_s:8.3f} "
+            f"{compactness(rgb, cold_labels, cold_centers):9.2f} "
+            f"{compactness(rgb, warm_labels, warm_centers):9.2f}"
+        )
+    print(f"session total: cold {totals['cold']:.3f}s, warm {totals['warm']:.3f}s "
+          f"({totals['cold'] / totals['warm']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -93,26 +93,160 @@ export async function convertColorSVG(
   })
 }
 
+// Searches vtracer parameters for the highest-fidelity SVG within the budget
+export async function autoTuneColorSVG(
+  image: string,
+  budget: { max_paths?: number; max_bytes?: number },
+  settings?: ColorSVGSettings
+): Promise<{
+  filename: string
+  settings: ColorSVGSettings
+  paths: number
+  bytes: number
+  fidelity: number
+  met_budget: boolean
+  evaluated: { preview: number; full: number }
+}> {
+  return request("/color-svg/auto-tune", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ image, ...budget, settings }),
+  })
+}
+
 export async function checkVtracer(): Promise<{ available: boolean }> {
   return request("/color-svg/check-vtracer")
 }
 
-// Color SVG (precision / potrace) conversion
+// Color SVG (precision / potrace) conversion. With deadlineSeconds the server
+// downgrades settings (listed in downgrades) to finish within the deadline.
 export async function convertPotraceColor(
   image: string,
-  settings?: PotraceColorSettings
-): Promise<{ filename: string }> {
+  settings?: PotraceColorSettings,
+  deadlineSeconds?: number
+): Promise<{
+  filename: string
+  downgrades: string[]
+  estimated_seconds: number | null
+}> {
   return request("/potrace-color/convert", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ image, settings, deadline_seconds: deadlineSeconds }),
+  })
+}
+
+// Streaming variant: onPartial receives the SVG received so far (closed off so
+// it renders) after each layer arrives, largest layer first.
+export async function convertPotraceColorStream(
+  image: string,
+  settings: PotraceColorSettings | undefined,
+  onPartial: (svg: string) => void
+): Promise<{ filename: string }> {
+  const res = await fetch(`${BASE}/potrace-color/convert-stream`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ image, settings }),
   })
+  if (!res.ok || !res.body) {
+    const err = await res.json().catch(() => ({ detail: res.statusText }))
+    throw new Error(err.detail || "Conversion failed")
+  }
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader()
+  let svg = ""
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+    svg += value
+    onPartial(svg.includes("</svg>") ? svg : `${svg}</g></svg>`)
+  }
+  return { filename: res.headers.get("X-Output-Filename") ?? "" }
 }
 
 export async function checkPotraceColor(): Promise<{ available: boolean }> {
   return request("/potrace-color/check")
 }
 
+// Run several engines on one image concurrently and compare their output
+export type CompareEngine = "silhouette" | "vtracer" | "potrace_color"
+
+export interface CompareResult {
+  engine: CompareEngine
+  filename?: string
+  error?: string
+  seconds: number
+  paths?: number
+  nodes?: number
+  bytes?: number
+}
+
+export async function compareEngines(
+  image: string,
+  engines?: CompareEngine[],
+  settings?: Partial<Record<CompareEngine, Record<string, unknown>>>
+): Promise<{ results: CompareResult[]; decode_seconds: number; total_seconds: number }> {
+  return request("/compare", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ image, engines, settings }),
+  })
+}
+
+// Background jobs: submit returns at once (202); follow progress over SSE
+export type JobKind = "background" | "silhouette" | "color_svg" | "potrace_color"
+
+export interface Job {
+  id: string
+  kind: JobKind
+  status: "queued" | "running" | "succeeded" | "failed"
+  stage: string | null
+  step: number | null
+  total: number | null
+  result: { filename: string; downgrades?: string[] } | null
+  error: string | null
+}
+
+export async function submitJob(
+  kind: JobKind,
+  image: string,
+  options?: {
+    settings?: Record<string, unknown>
+    model_type?: string
+    model_name?: string
+    mode?: string
+    deadline_seconds?: number
+  }
+): Promise<Job> {
+  return request("/jobs", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ kind, image, ...options }),
+  })
+}
+
+export async function getJob(id: string): Promise<Job> {
+  return request(`/jobs/${id}`)
+}
+
+// Calls onProgress for each stage (step/total are set while tracing layers)
+// and onDone with the finished job. Returns a function to stop following.
+export function followJob(
+  id: string,
+  onProgress: (stage: string, step: number | null, total: number | null) => void,
+  onDone: (job: Job) => void
+): () => void {
+  const source = new EventSource(`${BASE}/jobs/${id}/events`)
+  source.addEventListener("progress", (e) => {
+    const { stage, step, total } = JSON.parse((e as MessageEvent).data)
+    onProgress(stage, step, total)
+  })
+  source.addEventListener("done", (e) => {
+    source.close()
+    onDone(JSON.parse((e as MessageEvent).data))
+  })
+  return () => source.close()
+}
+
 // WebP conversion — writes into output/webp/ and returns the file info
 export async function exportWebp(
   image: string,
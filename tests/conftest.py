@@ -0,0 +1,13 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.api.app import create_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("INPUT_DIR", str(tmp_path / "input"))
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path / "output"))
+    (tmp_path / "input").mkdir()
+    # No lifespan: its shutdown closes the shared executor pools.
+    return TestClient(create_app())
@@ -0,0 +1,160 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from backend.api import admission as admission_module
+from backend.api.admission import (
+    MAX_RETRY_AFTER_SECONDS,
+    AdmissionController,
+    AdmissionMiddleware,
+    AdmissionRejected,
+)
+from backend.api.scheduler import QueueWaitMiddleware
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(admission_module.time, "monotonic", clock)
+    return clock
+
+
+def test_rejects_beyond_max_depth():
+    controller = AdmissionController({"convert": (2, 0)})
+    tickets = [controller.admit("convert"), controller.admit("convert")]
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("convert")
+
+    assert rejected.value.retry_after >= 1
+    stats = controller.stats()["routes"]["convert"]
+    assert (stats["depth"], stats["admitted"], stats["rejected"]) == (2, 2, 1)
+    tickets[0].release()
+    controller.admit("convert")
+
+
+def test_rejects_beyond_max_work():
+    controller = AdmissionController({"convert": (10, 5.0)})
+    controller.admit("convert").release(2.0)
+    controller.admit("convert")
+    controller.admit("convert")
+
+    # A third 2 s request would make ~6 s of work.
+    with pytest.raises(AdmissionRejected):
+        controller.admit("convert")
+
+
+def test_retry_after_follows_drain_rate(clock):
+    controller = AdmissionController({"convert": (1, 0)})
+    # Three completions 10 s apart: one every 10 s.
+    for _ in range(3):
+        controller.admit("convert").release(1.0)
+        clock.now += 10
+    controller.admit("convert")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("convert")
+
+    assert rejected.value.retry_after == 10
+
+
+def test_retry_after_without_recent_completions_is_one_service_time(clock):
+    controller = AdmissionController({"convert": (1, 0)})
+    controller.admit("convert").release(7.4)
+    clock.now += admission_module.DRAIN_WINDOW_SECONDS + 1
+    controller.admit("convert")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("convert")
+
+    assert rejected.value.retry_after == 8
+
+
+def test_retry_after_is_capped(clock):
+    controller = AdmissionController({"convert": (1, 0)})
+    controller.admit("convert").release(10_000.0)
+    clock.now += admission_module.DRAIN_WINDOW_SECONDS + 1
+    controller.admit("convert")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("convert")
+
+    assert rejected.value.retry_after == MAX_RETRY_AFTER_SECONDS
+
+
+def test_cancelled_ticket_frees_depth_without_a_completion():
+    controller = AdmissionController({"convert": (1, 0)})
+    ticket = controller.admit("convert")
+
+    ticket.cancel()
+    ticket.cancel()
+
+    stats = controller.stats()["routes"]["convert"]
+    assert (stats["depth"], stats["drain_per_second"]) == (0, 0.0)
+    controller.admit("convert")
+
+
+def _guarded_app(controller: AdmissionController, release: asyncio.Event) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/compare")
+    async def compare():
+        await release.wait()
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    app.add_middleware(QueueWaitMiddleware)
+    return app
+
+
+def test_middleware_answers_429_with_retry_after_and_frees_on_completion():
+    controller = AdmissionController({"compare": (1, 0)})
+
+    async def scenario():
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=_guarded_app(controller, release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            first = asyncio.ensure_future(http.post("/api/compare"))
+            await asyncio.sleep(0.05)
+            rejected = await http.post("/api/compare")
+            release.set()
+            completed = await first
+            again = await http.post("/api/compare")
+            return rejected, completed, again
+
+    rejected, completed, again = asyncio.run(scenario())
+
+    assert rejected.status_code == 429
+    assert 1 <= int(rejected.headers["retry-after"]) <= MAX_RETRY_AFTER_SECONDS
+    assert "at capacity" in rejected.json()["detail"]
+    assert completed.status_code == 200
+    assert again.status_code == 200
+    assert controller.stats()["routes"]["compare"]["depth"] == 0
+
+
+def test_middleware_frees_ticket_when_request_is_cancelled():
+    controller = AdmissionController({"compare": (1, 0)})
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=_guarded_app(controller, asyncio.Event()))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            pending = asyncio.ensure_future(http.post("/api/compare"))
+            await asyncio.sleep(0.05)
+            depth = controller.stats()["routes"]["compare"]["depth"]
+            pending.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await pending
+            return depth
+
+    assert asyncio.run(scenario()) == 1
+    assert controller.stats()["routes"]["compare"]["depth"] == 0
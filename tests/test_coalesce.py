@@ -0,0 +1,165 @@
+import asyncio
+import shutil
+import time
+
+import httpx
+from PIL import Image
+
+from backend.api.coalesce import SingleFlight, settings_key
+from backend.color_svg_converter.processor import ColorSVGConverter
+
+
+class _Computation:
+    """A compute() callable that blocks until released and counts calls."""
+
+    def __init__(self, result="svg"):
+        self.result = result
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def _start(flight, compute, key=("a.png", "sha", "{}"), engine="vtracer"):
+    return asyncio.ensure_future(flight.run(engine, key, compute))
+
+
+def test_identical_requests_share_one_computation():
+    async def scenario():
+        flight, compute = SingleFlight(), _Computation()
+        callers = [_start(flight, compute) for _ in range(3)]
+        await asyncio.sleep(0)
+        compute.release.set()
+        return compute, await asyncio.gather(*callers), flight.stats()
+
+    compute, results, stats = asyncio.run(scenario())
+
+    assert compute.calls == 1
+    assert results == ["svg"] * 3
+    assert stats == {"vtracer": {"computed": 1, "coalesced": 2, "in_flight": 0}}
+
+
+def test_different_keys_and_engines_run_separately():
+    async def scenario():
+        flight, compute = SingleFlight(), _Computation()
+        callers = [
+            _start(flight, compute),
+            _start(flight, compute, key=("b.png", "sha", "{}")),
+            _start(flight, compute, key=("a.png", "sha", '{"n": 1}')),
+            _start(flight, compute, engine="potrace_color"),
+        ]
+        await asyncio.sleep(0)
+        compute.release.set()
+        await asyncio.gather(*callers)
+        return compute
+
+    assert asyncio.run(scenario()).calls == 4
+
+
+def test_finished_results_are_not_cached():
+    async def scenario():
+        flight, compute = SingleFlight(), _Computation()
+        compute.release.set()
+        await flight.run("vtracer", ("a.png",), compute)
+        await flight.run("vtracer", ("a.png",), compute)
+        return compute
+
+    assert asyncio.run(scenario()).calls == 2
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flight, compute = SingleFlight(), _Computation(RuntimeError("vtracer failed"))
+        callers = [_start(flight, compute) for _ in range(2)]
+        await asyncio.sleep(0)
+        compute.release.set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert [str(r) for r in results] == ["vtracer failed"] * 2
+
+
+def test_one_caller_cancelling_leaves_the_others_their_result():
+    async def scenario():
+        flight, compute = SingleFlight(), _Computation()
+        leaving, staying = _start(flight, compute), _start(flight, compute)
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        compute.release.set()
+        return compute, leaving, await staying
+
+    compute, leaving, result = asyncio.run(scenario())
+
+    assert leaving.cancelled()
+    assert result == "svg"
+    assert (compute.calls, compute.cancelled) == (1, 0)
+
+
+def test_computation_is_cancelled_once_every_caller_left():
+    async def scenario():
+        flight, compute = SingleFlight(), _Computation()
+        callers = [_start(flight, compute) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.sleep(0.01)
+        cancelled = compute.cancelled
+        # A new identical request starts afresh rather than joining it.
+        compute.release.set()
+        result = await flight.run("vtracer", ("a.png", "sha", "{}"), compute)
+        return cancelled, compute.calls, result
+
+    assert asyncio.run(scenario()) == (1, 2, "svg")
+
+
+def test_settings_key_is_canonical():
+    assert settings_key(None) == settings_key({})
+    assert settings_key({"a": 1, "b": 2}) == settings_key({"b": 2, "a": 1})
+    assert settings_key({"a": 1}) != settings_key({"a": 2})
+
+
+def test_route_keys_on_the_input_file(client, tmp_path, monkeypatch):
+    converted = []
+
+    def slow_convert(self, image_path, settings=None, pool=None, progress=None):
+        converted.append(image_path.name)
+        time.sleep(0.2)
+        output_path = self.output_dir / f"{image_path.stem}_color_vector.svg"
+        output_path.write_text("<svg/>")
+        return output_path
+
+    monkeypatch.setattr(ColorSVGConverter, "convert", slow_convert)
+    Image.new("RGBA", (8, 8), (200, 40, 40, 255)).save(tmp_path / "input" / "a.png")
+    shutil.copy(tmp_path / "input" / "a.png", tmp_path / "input" / "b.png")
+
+    async def convert(names):
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(
+                *(http.post("/api/color-svg/convert", json={"image": n}) for n in names)
+            )
+
+    same = asyncio.run(convert(["a.png", "a.png"]))
+    assert converted == ["a.png"]
+    assert [r.json()["filename"] for r in same] == ["a_color_vector.svg"] * 2
+
+    converted.clear()
+    renamed = asyncio.run(convert(["a.png", "b.png"]))
+    assert sorted(converted) == ["a.png", "b.png"]
+    assert [r.json()["filename"] for r in renamed] == [
+        "a_color_vector.svg",
+        "b_color_vector.svg",
+    ]
+
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import shutil
+
+import httpx
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.color_svg_converter.processor import ColorSVGConverter
+
+pytestmark = pytest.mark.skipif(
+    not ColorSVGConverter.check_vtracer(), reason="vtracer is not installed"
+)
+
+
+def _save_icon(path):
+    rgba = np.zeros((64, 64, 4), dtype=np.uint8)
+    rgba[16:48, 16:48] = (200, 40, 40, 255)
+    Image.fromarray(rgba).save(path)
+
+
+def test_convert_writes_svg(client, tmp_path):
+    _save_icon(tmp_path / "input" / "icon.png")
+
+    res = client.post("/api/color-svg/convert", json={"image": "icon.png"})
+
+    assert res.status_code == 200, res.text
+    assert res.json() == {"filename": "icon_color_vector.svg"}
+    svg = (tmp_path / "output" / "color_svg" / "icon_color_vector.svg").read_text()
+    assert svg.lstrip().startswith("<?xml") or "<svg" in svg
+
+
+def test_convert_missing_image_is_404(client):
+    res = client.post("/api/color-svg/convert", json={"image": "missing.png"})
+
+    assert res.status_code == 404
+
+
+def test_concurrent_identical_files_each_get_output(client, tmp_path):
+    _save_icon(tmp_path / "input" / "a.png")
+    shutil.copy(tmp_path / "input" / "a.png", tmp_path / "input" / "b.png")
+
+    async def convert_both():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(
+                *(http.post("/api/color-svg/convert", json={"image": n}) for n in ("a.png", "b.png"))
+            )
+
+    responses = asyncio.run(convert_both())
+
+    assert [r.json()["filename"] for r in responses] == [
+        "a_color_vector.svg",
+        "b_color_vector.svg",
+    ]
+    for name in ("a", "b"):
+        assert (tmp_path / "output" / "color_svg" / f"{name}_color_vector.svg").exists()
+
+
+def test_convert_batch_reports_each_file(client, tmp_path):
+    _save_icon(tmp_path / "input" / "a.png")
+    _save_icon(tmp_path / "input" / "b.png")
+
+    res = client.post(
+        "/api/color-svg/convert-batch", json={"images": ["a.png", "missing.png", "b.png"]}
+    )
+
+    assert res.status_code == 200
+    results = {r["image"]: r for r in map(json.loads, res.text.splitlines())}
+    assert results["a.png"]["filename"] == "a_color_vector.svg"
+    assert results["b.png"]["filename"] == "b_color_vector.svg"
+    assert "not found" in results["missing.png"]["error"]
+
+
+def test_auto_tune_meets_path_budget(client, tmp_path):
+    _save_icon(tmp_path / "input" / "icon.png")
+
+    res = client.post("/api/color-svg/auto-tune", json={"image": "icon.png", "max_paths": 5})
+
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert body["met_budget"] and body["paths"] <= 5
+    assert (tmp_path / "output" / "color_svg" / body["filename"]).exists()
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import httpx
+from PIL import Image
+
+from backend.color_svg_converter.processor import ColorSVGConverter
+
+CONVERSION_SECONDS = 0.5
+# Well under one conversion: a listing queued behind blocking work on the
+# event loop would take at least that long.
+MAX_LISTING_SECONDS = 0.2
+
+
+def _slow_convert(self, image_path, settings=None, pool=None, progress=None):
+    time.sleep(CONVERSION_SECONDS)
+    output_path = self.output_dir / f"{image_path.stem}_color_vector.svg"
+    output_path.write_text("<svg/>")
+    return output_path
+
+
+def test_listing_stays_fast_while_converting(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(ColorSVGConverter, "convert", _slow_convert)
+    names = [f"icon{i}.png" for i in range(3)]
+    for name in names:
+        Image.new("RGBA", (8, 8), (200, 40, 40, 255)).save(tmp_path / "input" / name)
+
+    async def listing_latencies():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            conversions = [
+                asyncio.ensure_future(http.post("/api/color-svg/convert", json={"image": name}))
+                for name in names
+            ]
+            await asyncio.sleep(0.05)
+            latencies = []
+            while not all(c.done() for c in conversions):
+                start = time.perf_counter()
+                res = await http.get("/api/images/input")
+                latencies.append(time.perf_counter() - start)
+                assert res.status_code == 200
+                await asyncio.sleep(0.02)
+            return latencies, [c.result() for c in conversions]
+
+    latencies, responses = asyncio.run(listing_latencies())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert len(latencies) >= 5
+    assert max(latencies) < MAX_LISTING_SECONDS
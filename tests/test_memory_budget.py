@@ -0,0 +1,63 @@
+import pytest
+
+from backend.core import utils
+from backend.potrace_color_converter.memory_budget import (
+    MemoryBudgetExceeded,
+    conversion_budget_bytes,
+    estimate_peak_bytes,
+    fit_to_budget,
+)
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def budget_mb(monkeypatch):
+    monkeypatch.setattr(utils, "_concurrent_conversions", 1)
+
+    def set_budget(mb):
+        monkeypatch.setenv("POTRACE_COLOR_MEMORY_MB", str(mb))
+
+    return set_budget
+
+
+def test_cache_residency_is_taken_off_the_budget(budget_mb):
+    budget_mb(1024)
+
+    assert conversion_budget_bytes(0) == 1024 * MB
+    assert conversion_budget_bytes(256 * MB) == 768 * MB
+
+
+def test_budget_is_split_across_concurrent_conversions(budget_mb):
+    budget_mb(1024)
+    utils.set_concurrent_conversions(4)
+
+    assert conversion_budget_bytes(0) == 256 * MB
+    assert conversion_budget_bytes(512 * MB) == 128 * MB
+
+
+def test_disabled_budget(budget_mb):
+    budget_mb(0)
+
+    assert conversion_budget_bytes(512 * MB) == 0
+    settings = {"upscale_factor": 4, "n_colors": 16}
+    assert fit_to_budget(8000, 8000, settings, 0) == (settings, [])
+
+
+def test_a_full_cache_leaves_no_room(budget_mb):
+    budget_mb(256)
+
+    budget = conversion_budget_bytes(256 * MB)
+
+    with pytest.raises(MemoryBudgetExceeded):
+        fit_to_budget(64, 64, {"upscale_factor": 1, "n_colors": 2}, budget)
+
+
+def test_downgrades_upscale_before_colors():
+    settings = {"upscale_factor": 4, "n_colors": 8}
+    budget = estimate_peak_bytes(1000, 1000, 2, 8)
+
+    active, downgrades = fit_to_budget(1000, 1000, settings, budget)
+
+    assert (active["upscale_factor"], active["n_colors"]) == (2, 8)
+    assert downgrades == ["upscale_factor 4 -> 2"]
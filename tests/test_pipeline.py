@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from backend.api import pipeline
+from backend.api.pipeline import SOURCE, Op, parse_recipe, run_many, run_recipe
+from backend.api.scheduler import IO
+
+
+class _Recorder:
+    """Stub ops that record the calls they get and how many overlap."""
+
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, src, params, cancel):
+        with self._lock:
+            self.calls.append((src.stem, params["tag"], src))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.seconds)
+            if params["tag"] == "fail":
+                raise RuntimeError("stub failed")
+            out = pipeline.Intermediate(src.image, f"{src.stem}_{params['tag']}")
+            return out, {"stem": out.stem}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = _Recorder()
+    monkeypatch.setattr(
+        pipeline,
+        "OPS",
+        {
+            "grow": Op(IO, {"tag": "grown"}, recorder, produces_image=True),
+            "emit": Op(IO, {"tag": "emitted"}, recorder),
+        },
+    )
+    return recorder
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "icon.png"
+    Image.new("RGBA", (8, 8), (200, 40, 40, 255)).save(path)
+    return path
+
+
+def _ids(steps):
+    return [step.id for step in steps]
+
+
+def test_steps_are_ordered_after_their_inputs(recorder):
+    steps = parse_recipe(
+        {
+            "steps": [
+                {"id": "out", "op": "emit", "input": "b"},
+                {"id": "b", "op": "grow", "input": "a"},
+                {"id": "a", "op": "grow"},
+            ]
+        }
+    )
+
+    assert _ids(steps) == ["a", "b", "out"]
+    assert steps[0].input == SOURCE
+    assert steps[2].params == {"tag": "emitted"}
+
+
+def test_cycle_is_rejected(recorder):
+    recipe = {
+        "steps": [
+            {"id": "a", "op": "grow", "input": "c"},
+            {"id": "b", "op": "grow", "input": "a"},
+            {"id": "c", "op": "grow", "input": "b"},
+        ]
+    }
+
+    with pytest.raises(ValueError, match="cycle: a -> c -> b"):
+        parse_recipe(recipe)
+
+
+def test_self_input_is_a_cycle(recorder):
+    with pytest.raises(ValueError, match="cycle"):
+        parse_recipe({"steps": [{"id": "a", "op": "grow", "input": "a"}]})
+
+
+@pytest.mark.parametrize(
+    "steps, message",
+    [
+        ([{"id": "a", "op": "grow", "input": "missing"}], "unknown input 'missing'"),
+        (
+            [{"id": "a", "op": "emit"}, {"id": "b", "op": "grow", "input": "a"}],
+            "has no image output",
+        ),
+        ([{"id": "a", "op": "sharpen"}], "op must be one of"),
+        ([{"id": "a", "op": "grow", "size": 2}], "unknown parameters"),
+        ([{"id": "a", "op": "grow"}, {"id": "a", "op": "emit"}], "Duplicate step id"),
+        ([{"id": SOURCE, "op": "grow"}], "Step ids"),
+        ([], "at least one step"),
+    ],
+)
+def test_invalid_recipes(recorder, steps, message):
+    with pytest.raises(ValueError, match=message):
+        parse_recipe({"steps": steps})
+
+
+def test_required_parameters(monkeypatch):
+    monkeypatch.setitem(pipeline.OPS, "stub", Op(IO, {"x": pipeline._REQUIRED}, None))
+
+    with pytest.raises(ValueError, match=r"missing parameters \['x'\]"):
+        parse_recipe({"steps": [{"id": "a", "op": "stub"}]})
+
+
+def test_shared_intermediate_is_computed_once(recorder, image):
+    steps = parse_recipe(
+        {
+            "steps": [
+                {"id": "cut", "op": "grow", "tag": "cut"},
+                {"id": "one", "op": "emit", "input": "cut", "tag": "one"},
+                {"id": "two", "op": "emit", "input": "cut", "tag": "two"},
+            ]
+        }
+    )
+
+    result = asyncio.run(run_recipe(steps, image))
+
+    assert result == {
+        "image": "icon.png",
+        "steps": {
+            "cut": {"stem": "icon_cut"},
+            "one": {"stem": "icon_cut_one"},
+            "two": {"stem": "icon_cut_two"},
+        },
+    }
+    assert sorted(tag for _, tag, _ in recorder.calls) == ["cut", "one", "two"]
+    # Both readers got the very same decoded intermediate.
+    readers = [src for stem, _, src in recorder.calls if stem == "icon_cut"]
+    assert len(readers) == 2 and readers[0] is readers[1]
+
+
+def test_failed_step_skips_its_readers_only(recorder, image):
+    steps = parse_recipe(
+        {
+            "steps": [
+                {"id": "bad", "op": "grow", "tag": "fail"},
+                {"id": "after", "op": "emit", "input": "bad"},
+                {"id": "other", "op": "emit"},
+            ]
+        }
+    )
+
+    result = asyncio.run(run_recipe(steps, image))["steps"]
+
+    assert result["bad"] == {"error": "stub failed"}
+    assert result["after"] == {"error": "Skipped: step 'bad' failed"}
+    assert result["other"] == {"stem": "icon_emitted"}
+
+
+def test_missing_image(recorder, tmp_path):
+    steps = parse_recipe({"steps": [{"id": "a", "op": "emit"}]})
+
+    result = asyncio.run(run_recipe(steps, tmp_path / "gone.png"))
+
+    assert result == {"image": "gone.png", "error": "Image not found: gone.png"}
+    assert recorder.calls == []
+
+
+def test_run_many_caps_inputs_in_flight(recorder, image, monkeypatch):
+    monkeypatch.setenv("PIPELINE_MAX_INPUTS", "2")
+    recorder.seconds = 0.05
+    steps = parse_recipe({"steps": [{"id": "a", "op": "emit"}]})
+
+    async def collect():
+        return [result async for result in run_many(steps, [image] * 5)]
+
+    results = asyncio.run(collect())
+
+    assert len(results) == 5
+    assert all(r["steps"]["a"] == {"stem": "icon_emitted"} for r in results)
+    assert recorder.peak == 2
+
+
+def test_max_inputs_is_at_least_one(monkeypatch):
+    monkeypatch.setenv("PIPELINE_MAX_INPUTS", "0")
+    assert pipeline.max_inputs() == 1
+    monkeypatch.delenv("PIPELINE_MAX_INPUTS")
+    assert pipeline.max_inputs() == 4
@@ -0,0 +1,106 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from backend.api import prefork
+from backend.background_remover import models
+
+MODEL_MB = 64
+
+
+class _FakeNvml:
+    def __init__(self, devices):
+        self.devices = devices
+
+    def nvmlInit_v2(self):
+        return 0
+
+    def nvmlDeviceGetCount_v2(self, count):
+        count._obj.value = self.devices
+        return 0
+
+    def nvmlShutdown(self):
+        return 0
+
+
+@pytest.fixture
+def onnxruntime_gpu(monkeypatch):
+    # onnxruntime-gpu names the CUDA provider even on hosts without a GPU.
+    fake = types.SimpleNamespace(
+        get_available_providers=lambda: ["CUDAExecutionProvider", "CPUExecutionProvider"]
+    )
+    monkeypatch.setitem(sys.modules, "onnxruntime", fake)
+    monkeypatch.delenv("CUDA_VISIBLE_DEVICES", raising=False)
+
+
+def test_cuda_unavailable_without_a_device(onnxruntime_gpu, monkeypatch):
+    monkeypatch.setattr(models.ctypes, "CDLL", lambda name: _FakeNvml(0))
+
+    assert not models.cuda_available()
+
+
+def test_cuda_unavailable_without_nvml(onnxruntime_gpu, monkeypatch):
+    def missing(name):
+        raise OSError(name)
+
+    monkeypatch.setattr(models.ctypes, "CDLL", missing)
+
+    assert not models.cuda_available()
+
+
+def test_cuda_available_with_a_device(onnxruntime_gpu, monkeypatch):
+    monkeypatch.setattr(models.ctypes, "CDLL", lambda name: _FakeNvml(1))
+
+    assert models.cuda_available()
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "")
+    assert not models.cuda_available()
+
+
+def _private_kb() -> int:
+    total = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+def _worker_growth_kb() -> int:
+    """Fork a worker that fetches and reads the model; its private memory
+    growth in kB."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            before = _private_kb()
+            float(models.get_model("rembg", "fake").sum())
+            os.write(write_fd, str(_private_kb() - before).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        growth = int(f.read())
+    os.waitpid(pid, 0)
+    return growth
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"),
+    reason="needs fork and /proc/self/smaps_rollup",
+)
+def test_preloaded_model_is_shared_with_workers(monkeypatch):
+    monkeypatch.setattr(
+        models, "_load", lambda model_type, name: np.ones(MODEL_MB << 17, dtype=np.float64)
+    )
+    monkeypatch.setattr(models, "cuda_available", lambda: False)
+    monkeypatch.setattr(models, "_models", {})
+
+    cold = _worker_growth_kb()
+    prefork._preload("rembg:fake")
+    preloaded = _worker_growth_kb()
+
+    assert cold > MODEL_MB * 1024 * 3 // 4
+    assert preloaded < MODEL_MB * 1024 // 8
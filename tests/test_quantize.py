@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from backend.potrace_color_converter import processor as processor_module
+from backend.potrace_color_converter.palette_memory import PaletteMemory
+from backend.potrace_color_converter.preprocess import quantize_histogram, quantize_lab
+from backend.potrace_color_converter.processor import PotraceColorConverter
+from backend.potrace_color_converter.stage_cache import StageCache
+
+
+def _stripes(colors, width=4, height=8):
+    """An image of vertical stripes, one per color, `width` pixels each."""
+    row = np.repeat(np.array(colors, dtype=np.uint8), width, axis=0)
+    return np.repeat(row[None], height, axis=0)
+
+
+COLORS = [
+    (255, 0, 0),
+    (0, 160, 0),
+    (0, 0, 255),
+    (250, 220, 0),
+    (120, 0, 160),
+    (0, 200, 200),
+    (30, 30, 30),
+    (240, 240, 240),
+]
+
+
+@pytest.mark.parametrize("n_colors", [1, 3, 5, 8])
+def test_respects_n_colors(n_colors):
+    rgb = _stripes(COLORS)
+    mask = np.ones(rgb.shape[:2], dtype=bool)
+
+    labels, centers = quantize_histogram(rgb, mask, n_colors)
+
+    assert centers.shape == (n_colors, 3) and centers.dtype == np.uint8
+    assert labels.shape == rgb.shape[:2] and labels.dtype == np.int32
+    # Labels index the palette, with no gaps.
+    assert set(np.unique(labels)) == set(range(n_colors))
+
+
+def test_distinct_colors_are_recovered():
+    rgb = _stripes(COLORS)
+    mask = np.ones(rgb.shape[:2], dtype=bool)
+
+    labels, centers = quantize_histogram(rgb, mask, len(COLORS))
+
+    # Each stripe is one cluster whose center is close to the stripe color.
+    for i, color in enumerate(COLORS):
+        stripe = labels[:, 4 * i : 4 * i + 4]
+        assert np.all(stripe == stripe[0, 0])
+        center = centers[stripe[0, 0]].astype(int)
+        assert np.abs(center - color).max() <= 8
+
+
+def test_fewer_distinct_colors_than_requested():
+    rgb = _stripes(COLORS[:2])
+    mask = np.ones(rgb.shape[:2], dtype=bool)
+
+    labels, centers = quantize_histogram(rgb, mask, 6)
+
+    assert centers.shape == (2, 3)
+    assert set(np.unique(labels)) == {0, 1}
+
+
+def test_single_color():
+    rgb = _stripes([(0, 160, 0)])
+    mask = np.ones(rgb.shape[:2], dtype=bool)
+
+    labels, centers = quantize_histogram(rgb, mask, 4)
+
+    assert centers.shape == (1, 3)
+    assert np.all(labels == 0)
+    assert np.abs(centers[0].astype(int) - (0, 160, 0)).max() <= 8
+
+
+def test_empty_mask():
+    rgb = _stripes(COLORS)
+    mask = np.zeros(rgb.shape[:2], dtype=bool)
+
+    labels, centers = quantize_histogram(rgb, mask, 4)
+
+    assert np.all(labels == -1)
+    assert centers.shape == (4, 3)
+
+
+def test_transparent_pixels_are_unlabeled():
+    rgb = _stripes(COLORS[:2])
+    mask = np.ones(rgb.shape[:2], dtype=bool)
+    mask[:, :2] = False
+
+    labels, _ = quantize_histogram(rgb, mask, 2)
+
+    assert np.all(labels[:, :2] == -1)
+    assert np.all(labels[:, 2:] >= 0)
+
+
+def test_hidden_colors_stay_out_of_the_palette():
+    rgb = _stripes(COLORS[:3])
+    mask = np.ones(rgb.shape[:2], dtype=bool)
+    mask[:, :4] = False
+
+    _, centers = quantize_histogram(rgb, mask, 3)
+
+    assert centers.shape == (2, 3)
+    assert all(np.abs(c.astype(int) - COLORS[0]).max() > 8 for c in centers)
+
+
+def test_warm_start_survives_upstream_setting_changes(monkeypatch):
+    warm_starts = []
+
+    def spy(rgb, opaque_mask, n_colors, initial_centers=None):
+        warm_starts.append(initial_centers is not None)
+        return quantize_lab(rgb, opaque_mask, n_colors, initial_centers=initial_centers)
+
+    monkeypatch.setattr(processor_module, "quantize_lab", spy)
+    monkeypatch.setattr(processor_module, "palette_memory", PaletteMemory())
+    converter = PotraceColorConverter()
+    converter.cache = StageCache(max_bytes=64 * 1024 * 1024)
+    rgb = _stripes(COLORS[:4])
+    alpha = np.full(rgb.shape[:2], 255, dtype=np.uint8)
+    active = {"upscale_factor": 2, "smoothing": "bilateral", "n_colors": 4}
+
+    def run(**settings):
+        size = rgb.shape[1], rgb.shape[0]
+        converter._preprocess(b"", "content", dict(active, **settings), size, (rgb, alpha))
+
+    run(smooth_spatial_radius=5)
+    run(smooth_spatial_radius=9)
+    run(smooth_spatial_radius=9, n_colors=3)
+    run(smooth_spatial_radius=9, upscale_factor=3)
+
+    assert warm_starts == [False, True, True, False]
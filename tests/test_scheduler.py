@@ -0,0 +1,224 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from backend.api import scheduler as scheduler_module
+from backend.api.scheduler import (
+    ACCELERATOR,
+    BATCH,
+    CPU,
+    INTERACTIVE,
+    IO,
+    Scheduler,
+    default_limits,
+    tag_request,
+)
+from backend.core.cancel import Cancelled, CancelToken
+
+# Long enough for a thread that could take a slot to have taken it.
+SETTLE_SECONDS = 0.1
+
+
+def _acquire_in_thread(scheduler, resource, **kwargs):
+    """Start acquiring in a thread. Returns (acquired event, outcome dict)."""
+    acquired = threading.Event()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["slot"] = scheduler.acquire(resource, **kwargs)
+        except Exception as e:
+            outcome["error"] = e
+        acquired.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return acquired, outcome
+
+
+def test_each_class_has_its_own_limit():
+    scheduler = Scheduler({ACCELERATOR: 1, CPU: 2, IO: 1})
+
+    cpu = [scheduler.acquire(CPU), scheduler.acquire(CPU)]
+    io = scheduler.acquire(IO)
+    accelerator = scheduler.acquire(ACCELERATOR)
+
+    stats = scheduler.stats()
+    assert [stats[r]["active"] for r in (ACCELERATOR, CPU, IO)] == [1, 2, 1]
+    for slot in cpu + [io, accelerator]:
+        slot.release()
+    assert all(s["active"] == 0 for s in scheduler.stats().values())
+
+
+def test_acquire_waits_for_a_release():
+    scheduler = Scheduler({CPU: 1, IO: 1})
+    held = scheduler.acquire(CPU)
+
+    acquired, outcome = _acquire_in_thread(scheduler, CPU)
+    assert not acquired.wait(SETTLE_SECONDS)
+    # A full cpu class doesn't hold up io.
+    scheduler.acquire(IO).release()
+    assert scheduler.stats()[CPU]["queued"] == 1
+
+    held.release()
+    assert acquired.wait(1)
+    assert scheduler.stats()[CPU]["active"] == 1
+    outcome["slot"].release()
+
+
+def test_release_is_idempotent():
+    scheduler = Scheduler({CPU: 1})
+    slot = scheduler.acquire(CPU)
+
+    slot.release()
+    slot.release()
+
+    assert scheduler.stats()[CPU]["active"] == 0
+
+
+def test_slot_context_releases_on_error():
+    scheduler = Scheduler({CPU: 1})
+
+    with pytest.raises(RuntimeError):
+        with scheduler.slot(CPU):
+            raise RuntimeError("boom")
+
+    assert scheduler.stats()[CPU]["active"] == 0
+
+
+def test_cancelled_waiter_leaves_queue_without_a_slot():
+    scheduler = Scheduler({CPU: 1})
+    held = scheduler.acquire(CPU)
+    cancel = CancelToken()
+    cancelled, outcome = _acquire_in_thread(scheduler, CPU, cancel=cancel)
+    queued, later = _acquire_in_thread(scheduler, CPU)
+    assert not cancelled.wait(SETTLE_SECONDS)
+
+    cancel.cancel()
+
+    assert cancelled.wait(1)
+    assert isinstance(outcome["error"], Cancelled)
+    assert scheduler.stats()[CPU]["queued"] == 1
+    held.release()
+    assert queued.wait(1)
+    assert scheduler.stats()[CPU]["active"] == 1
+    later["slot"].release()
+
+
+def test_already_cancelled_acquire_raises_when_it_would_wait():
+    scheduler = Scheduler({CPU: 1})
+    held = scheduler.acquire(CPU)
+    cancel = CancelToken()
+    cancel.cancel()
+
+    with pytest.raises(Cancelled):
+        scheduler.acquire(CPU, cancel=cancel)
+
+    held.release()
+    stats = scheduler.stats()[CPU]
+    assert (stats["active"], stats["queued"]) == (0, 0)
+
+
+def test_unknown_resource_class():
+    with pytest.raises(ValueError):
+        Scheduler({CPU: 1}).acquire("gpu")
+
+
+def test_default_limits(monkeypatch):
+    for name in ("ACCELERATOR", "CPU", "IO"):
+        monkeypatch.delenv(f"SCHEDULER_{name}_SLOTS", raising=False)
+    monkeypatch.setattr(scheduler_module, "cpu_budget", lambda: 16)
+    assert default_limits() == {ACCELERATOR: 1, CPU: 4, IO: 8}
+
+    monkeypatch.setattr(scheduler_module, "cpu_budget", lambda: 2)
+    assert default_limits()[CPU] == 2
+
+    monkeypatch.setenv("SCHEDULER_CPU_SLOTS", "6")
+    assert default_limits()[CPU] == 6
+
+
+
+def _service_order(scheduler, requests):
+    """Queue requests, (name, priority, client) in that order, behind a held
+    cpu slot, then free it. Returns the names in the order they got it."""
+    held = scheduler.acquire(CPU, client="holder")
+    order = []
+    threads = []
+
+    def run(name, priority, client):
+        slot = scheduler.acquire(CPU, priority=priority, client=client)
+        order.append(name)
+        slot.release()
+
+    for queued, request in enumerate(requests, start=1):
+        thread = threading.Thread(target=run, args=request)
+        thread.start()
+        threads.append(thread)
+        # One at a time, so the arrival order is fixed.
+        while scheduler.stats()[CPU]["queued"] < queued:
+            time.sleep(0.001)
+    held.release()
+    for thread in threads:
+        thread.join(1)
+    return order
+
+
+def test_interactive_before_batch_and_fair_across_clients():
+    order = _service_order(
+        Scheduler({CPU: 1}),
+        [
+            ("batch-a1", BATCH, "a"),
+            ("a1", INTERACTIVE, "a"),
+            ("a2", INTERACTIVE, "a"),
+            ("a3", INTERACTIVE, "a"),
+            ("b1", INTERACTIVE, "b"),
+            ("batch-b1", BATCH, "b"),
+            ("b2", INTERACTIVE, "b"),
+        ],
+    )
+
+    # b's requests interleave with a's backlog instead of waiting behind
+    # it; batch work runs only once no interactive request is waiting.
+    assert order == ["a1", "b1", "a2", "b2", "a3", "batch-a1", "batch-b1"]
+
+
+def test_client_weights_space_requests():
+    order = _service_order(
+        Scheduler({CPU: 1}, {"a": 2.0}),
+        [
+            ("a1", INTERACTIVE, "a"),
+            ("a2", INTERACTIVE, "a"),
+            ("a3", INTERACTIVE, "a"),
+            ("a4", INTERACTIVE, "a"),
+            ("b1", INTERACTIVE, "b"),
+            ("b2", INTERACTIVE, "b"),
+        ],
+    )
+
+    # Weight 2: two of a's requests per one of b's.
+    assert order == ["a1", "b1", "a2", "a3", "b2", "a4"]
+
+
+def test_tags_come_from_the_request_context():
+    scheduler = Scheduler({CPU: 1})
+
+    def tagged():
+        tag_request(BATCH, "nightly")
+        scheduler.acquire(CPU).release()
+
+    contextvars.copy_context().run(tagged)
+
+    lanes = scheduler.stats()[CPU]["lanes"]
+    assert (lanes[INTERACTIVE]["acquired"], lanes[BATCH]["acquired"]) == (0, 1)
+    with pytest.raises(ValueError):
+        tag_request("urgent")
+
+
+def test_invalid_priority_header_is_400(client):
+    assert client.get("/api/images/input", headers={"X-Priority": "batch"}).status_code == 200
+
+    res = client.get("/api/images/input", headers={"X-Priority": "urgent"})
+
+    assert res.status_code == 400
+    assert "X-Priority" in res.json()["detail"]
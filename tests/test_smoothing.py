@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from backend.core import utils
+from backend.potrace_color_converter import preprocess
+from backend.potrace_color_converter.preprocess import (
+    edge_preserving_smooth,
+    tiled_edge_preserving_smooth,
+)
+
+
+@pytest.fixture
+def cpus(monkeypatch):
+    """Pretend the process may use `n` CPUs and runs `slots` conversions."""
+    monkeypatch.setattr(utils, "_concurrent_conversions", 1)
+
+    def configure(n, slots):
+        monkeypatch.setattr(utils, "cpu_budget", lambda: n)
+        utils.set_concurrent_conversions(slots)
+
+    return configure
+
+
+@pytest.fixture
+def pool_sizes(monkeypatch):
+    sizes = []
+    real = preprocess.ThreadPoolExecutor
+
+    def recording(max_workers):
+        sizes.append(max_workers)
+        return real(max_workers=max_workers)
+
+    monkeypatch.setattr(preprocess, "ThreadPoolExecutor", recording)
+    return sizes
+
+
+def _image(size=96):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("n, slots, share", [(8, 1, 8), (8, 4, 2), (6, 4, 1), (2, 4, 1)])
+def test_cpu_share(cpus, n, slots, share):
+    cpus(n, slots)
+    assert utils.cpu_share() == share
+
+
+def test_auto_workers_use_the_conversion_share(cpus, pool_sizes):
+    cpus(16, 4)
+
+    tiled_edge_preserving_smooth(_image(), "bilateral", 5, 20, workers=0, tile_size=16)
+
+    assert pool_sizes == [4]
+
+
+def test_explicit_workers_are_kept(cpus, pool_sizes):
+    cpus(16, 4)
+
+    tiled_edge_preserving_smooth(_image(), "bilateral", 5, 20, workers=8, tile_size=16)
+
+    assert pool_sizes == [8]
+
+
+def test_tiles_match_the_full_image_call(cpus):
+    cpus(4, 1)
+    rgb = _image()
+
+    tiled = tiled_edge_preserving_smooth(rgb, "bilateral", 5, 20, workers=0, tile_size=32)
+
+    np.testing.assert_array_equal(tiled, edge_preserving_smooth(rgb, "bilateral", 5, 20))
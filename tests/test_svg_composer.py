@@ -0,0 +1,112 @@
+import re
+
+import pytest
+
+from backend.potrace_color_converter.svg_composer import bake_path, parse_transform
+
+# The transform potrace writes on its output group.
+POTRACE = "translate(0,100) scale(0.1,-0.1)"
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+
+
+def _points(d):
+    """Absolute end and control points of path data, in drawing order.
+    A closepath contributes the subpath start it returns to."""
+    tokens = re.findall(rf"[A-Za-z]|{NUMBER}", d)
+    counts = {"m": 2, "l": 2, "h": 1, "v": 1, "c": 6}
+    points = []
+    x = y = start_x = start_y = 0.0
+    cmd = ""
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            cmd = tokens[i]
+            i += 1
+            if cmd in "Zz":
+                x, y = start_x, start_y
+                points.append((x, y))
+                continue
+        lower = cmd.lower()
+        args = [float(v) for v in tokens[i : i + counts[lower]]]
+        i += counts[lower]
+        base_x, base_y = (x, y) if cmd.islower() else (0.0, 0.0)
+        if lower == "h":
+            pairs = [(base_x + args[0], y)]
+        elif lower == "v":
+            pairs = [(x, base_y + args[0])]
+        else:
+            pairs = [(base_x + args[j], base_y + args[j + 1]) for j in range(0, len(args), 2)]
+        points.extend(pairs)
+        x, y = pairs[-1]
+        if lower == "m":
+            start_x, start_y = x, y
+            cmd = "l" if cmd.islower() else "L"
+    return points
+
+
+def _mapped(d, transform):
+    a, b, c, dd, e, f = parse_transform(transform)
+    return [(a * x + c * y + e, b * x + dd * y + f) for x, y in _points(d)]
+
+
+def _assert_round_trip(d, transform, precision):
+    baked = bake_path(d, parse_transform(transform), precision)
+    expected = _mapped(d, transform)
+    actual = _points(baked)
+
+    assert len(actual) == len(expected)
+    # Each point is rounded on its own: the error never exceeds half a unit.
+    tolerance = 0.5 * 10**-precision + 1e-9
+    for (ax, ay), (ex, ey) in zip(actual, expected):
+        assert abs(ax - ex) <= tolerance and abs(ay - ey) <= tolerance
+    return baked
+
+
+@pytest.mark.parametrize(
+    "d",
+    [
+        "M10 20 L130 40 L90 310 Z",
+        "M10 20 l120 20 l-40 270 z",
+        "M10 20 H300 V250 h-45 v-30 Z",
+        "M10 20 C40 90 120 90 150 20 c30 -70 110 -70 140 0 Z",
+        "M10 20 L30 40 50 20 M200 200 l10 10 z m15 0 l25 25 z",
+        "m10 20 30 40 50 20z",
+    ],
+)
+@pytest.mark.parametrize("precision", [0, 1, 2])
+def test_round_trip(d, precision):
+    _assert_round_trip(d, POTRACE, precision)
+
+
+def test_round_trip_through_matrix_and_nested_transforms():
+    transform = "translate(5 7) matrix(0 1 -1 0 40 0) scale(2)"
+    _assert_round_trip("M10 20 C40 90 120 90 150 20 h-30 v15 z", transform, 2)
+
+
+def test_compact_output():
+    baked = bake_path("M10 20 l20 10 l30 -20 l-5 -5 z", parse_transform(POTRACE), 2)
+
+    assert baked == "m1 98l2-1 3 2-.5.5z"
+
+
+def test_zero_length_segments_are_dropped():
+    d = "M10 20 l2 1 l3 -2 c1 1 2 1 3 0 l40 30 z"
+    transform = parse_transform(POTRACE)
+
+    # At 0 decimals the first line and the curve stay within one pixel.
+    assert bake_path(d, transform, 0) == "m1 98l1 0 4-3z"
+    assert bake_path(d, transform, 2) == "m1 98l.2-.1.3.2c.1-.1.2-.1.3 0l4-3z"
+
+
+def test_rounding_error_does_not_accumulate():
+    # Steps of 0.4 px each round to 0 on their own; the path still ends at 5.
+    d = "M0 0" + " l.4 0" * 10 + " l1 0"
+    baked = bake_path(d, parse_transform("scale(1)"), 0)
+
+    assert _points(baked)[-1] == (5.0, 0.0)
+
+
+@pytest.mark.parametrize("d", ["M10 20 A5 5 0 0 1 20 20", "M10 20 L30"])
+def test_rejects_unsupported_or_truncated_paths(d):
+    with pytest.raises(ValueError):
+        bake_path(d, parse_transform(POTRACE), 2)